@@ -4,6 +4,7 @@ Main application package.
 """
 
 from flask import Flask, render_template, json
+from sqlalchemy.engine import make_url
 from werkzeug.exceptions import HTTPException
 import stripe
 
@@ -16,8 +17,25 @@ from .extensions import (
 	csrf,
 	login,
 	stripe_keys,
-	mail
+	mail,
+	migrate,
+	plot_cache,
+	receipt_cache,
+	receipt_disk_cache,
+	hashing,
+	query_profiler,
+	metrics,
+	sqlite_profile,
+	postgres_profile,
+	replica_router,
 )
+from .booking import booking_engine
+from .catalogue import catalogue_cache
+from .email import email_sender, send_emails_command
+from .reports import report_worker, run_reports_command
+from .index_audit import index_audit_command
+from .synthetic import generate_data_command
+from .rollups import rebuild_rollups_command
 
 def create_app(extra_options: dict = {}):
 	"""
@@ -35,22 +53,52 @@ def create_app(extra_options: dict = {}):
 	for option in extra_options:
 		app.config[option] = extra_options[option]
 
+	configure_pool(app)
 	register_extensions(app)
 	register_blueprints(app)
+	register_commands(app)
 	register_error_handlers(app)
 
 	return app
 
+def configure_pool(app):
+	"""
+	Add the DATABASE_POOL sizing to the main database's engine options, unless
+	it is an in-memory SQLite database, whose single shared connection takes no
+	pool options.
+	"""
+	url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+	if url.get_backend_name() == "sqlite" and (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"):
+		return
+	app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+		**(app.config.get("DATABASE_POOL") or {}),
+		**app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+	}
+
 def register_extensions(app):
 	"""
 	Register extensions to our application.
 	"""
 	db.init_app(app)
+	sqlite_profile.init_app(app, db)
+	postgres_profile.init_app(app, db)
+	replica_router.init_app(app, db)
+	migrate.init_app(app, db)
+	query_profiler.init_app(app)
+	metrics.init_app(app)
 	assets.init_app(app)
 	assets.register(bundles)
 	csrf.init_app(app)
 	login.init_app(app)
 	mail.init_app(app)
+	plot_cache.init_app(app)
+	receipt_cache.init_app(app)
+	receipt_disk_cache.init_app(app)
+	catalogue_cache.init_app(app)
+	hashing.init_app(app)
+	booking_engine.init_app(app)
+	email_sender.init_app(app)
+	report_worker.init_app(app)
 	stripe.api_key = stripe_keys['secret_key']
 
 
@@ -61,6 +109,16 @@ def register_blueprints(app):
 	app.register_blueprint(public.views.blueprint)
 	app.register_blueprint(admin.views.blueprint)
 
+def register_commands(app):
+	"""
+	Register CLI commands to our application.
+	"""
+	app.cli.add_command(index_audit_command)
+	app.cli.add_command(generate_data_command)
+	app.cli.add_command(rebuild_rollups_command)
+	app.cli.add_command(run_reports_command)
+	app.cli.add_command(send_emails_command)
+
 def register_error_handlers(app):
 	
 	# Custom error handlers
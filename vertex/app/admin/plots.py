@@ -0,0 +1,215 @@
+# vertex/app/admin/plots.py
+"""
+Plots for the manager analytics pages.
+
+matplotlib and numpy are slow to import, so the views only import this module
+the first time a plot is requested.
+"""
+
+import datetime
+import io
+import os
+
+from flask import current_app
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+import numpy as np
+
+from app import analytics
+
+# Bounding box for the analytics plots, in pixels
+PLOT_MAX_WIDTH = 1000
+PLOT_MAX_HEIGHT = 400
+
+def plot_figure():
+	"""
+	Function to create a matplotlib figure sized to fit the plot bounding box,
+	so it can be rendered straight to its final size without resizing.
+	"""
+	width, height = rcParams['figure.figsize']
+	dpi = min(rcParams['figure.dpi'], PLOT_MAX_WIDTH / width, PLOT_MAX_HEIGHT / height)
+	return Figure(figsize=(width, height), dpi=dpi)
+
+def render_plot(plot_id):
+	"""
+	Function to create and save a plot for manager analytics. Returns the PNG bytes.
+	"""
+	# Define the start and end dates for the past 7 days
+	today = datetime.date.today()
+	one_week_ago = today - datetime.timedelta(days=7)
+	fig = plot_figure()
+
+	# Name of the generated image in static/gen, used by the PDF reports
+	filename = None
+
+	# Facilities Plots
+
+	# Plot for fitness room throughout day
+	if plot_id == 1:
+		axis = fig.add_subplot(1, 1, 1)
+		langs = [str(datetime.time(i)) + "-" + str(datetime.time(i+1)) for i in range(8, 22)]
+		students = np.random.randint(0, 40, size=len(langs))
+		axis.bar(langs,students)
+		axis.set_xticklabels(axis.get_xticklabels(), rotation=30, ha='right')
+
+	# Plot for climbing wall for past one week
+	elif plot_id == 2:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings for climbing wall
+		totals = analytics.facility_totals(since=one_week_ago)
+
+		xs = "general use"
+		ys = totals.get(6, (0, 0))[0]
+		axis.bar(xs, ys)
+		filename = 'climbingwall.png'
+
+	# Plot for fitness room for past one week
+	elif plot_id == 3:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings for fitness room
+		totals = analytics.facility_totals(since=one_week_ago)
+
+		xs = "general use"
+		ys = totals.get(2, (0, 0))[0]
+		axis.bar(xs, ys)
+		filename = 'fitnessroom.png'
+
+	# Plot for sports hall for past one week
+	elif plot_id == 4:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings for sports hall team events and one hour sessions
+		counts = analytics.activity_counts(5, since=one_week_ago)
+
+		xs = ["general use", "1 hour session"]
+		ys = [counts.get("team events", 0), counts.get("1 hour sessions", 0)]
+		axis.bar(xs, ys)
+		filename = 'sportshall.png'
+
+	# Plot for both squash courts over the last week
+	elif plot_id == 5:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings for squash courts 1 and 2
+		totals = analytics.facility_totals(since=one_week_ago)
+
+		xs = ["Squash Court 1", "Squash Court 2"]
+		ys = [totals.get(3, (0, 0))[0], totals.get(4, (0, 0))[0]]
+		axis.bar(xs, ys)
+		filename = 'squash.png'
+
+	# Plot for studio over the last week
+	elif plot_id == 6:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings for the studio general use
+		totals = analytics.facility_totals(since=one_week_ago)
+		
+		xs = ["General Use"]
+		ys = [totals.get(7, (0, 0))[0]]
+		axis.bar(xs, ys)
+		filename = 'studio.png'
+
+	# Plot for swimming over the last week
+	elif plot_id == 7:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings for the swimming pool, by various activites
+		counts = analytics.activity_counts(1, since=one_week_ago)
+		activities = ["general use", "lane swimming", "lessons", "team events"]
+
+		xs = ["General use", "Lane Swimming", "Lessons", "Team Events"]
+		ys = [counts.get(activity, 0) for activity in activities]
+		axis.bar(xs, ys)
+		filename = 'swimming.png'
+
+	# Classes Plots
+	# Plots for all Pilates class bookings in the past week
+	elif plot_id == 8:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings of each pilates class
+		xs, ys = analytics.class_session_counts("Pilates", since=one_week_ago)
+
+		axis.bar(xs, ys)
+		filename = 'pilates.png'
+
+	# Plots for all Aerobics class bookings in the past week
+	elif plot_id == 9:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings of each aerobics class
+		xs, ys = analytics.class_session_counts("Aerobics", since=one_week_ago)
+
+		axis.bar(xs, ys)
+		filename = 'aerobics.png'
+
+	# Plots for all Yoga class bookings in the past week
+	elif plot_id == 10:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Count the bookings of each yoga class
+		xs, ys = analytics.class_session_counts("Yoga", since=one_week_ago)
+
+		axis.bar(xs, ys)
+		filename = 'yoga.png'
+
+	# Membership plot
+
+	elif plot_id == 11:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Find number of active memberships for each type of membership
+		xs, ys = analytics.membership_counts()
+
+		axis.bar(xs, ys)
+		filename = 'membership.png'
+
+	elif plot_id == 12:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Find total price of all active bookings for each type of facility
+		totals = analytics.facility_totals(since=one_week_ago)
+		
+		xs = ["SP", "FR", "SC1", "SC2", "SH", "CW", "S"]
+		ys = [totals.get(facility_id, (0, 0))[1] for facility_id in range(1, 8)]
+		axis.bar(xs, ys, width=0.3)
+		filename = 'facility.png'
+
+	elif plot_id == 13:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Find total price of all active bookings for each type of class
+		revenue = analytics.class_revenue(since=one_week_ago)
+		
+		xs = ["Pilates", "Aerobics", "Yoga"]
+		ys = [revenue.get(name, 0) for name in xs]
+		axis.bar(xs, ys)
+		filename = 'class.png'
+
+	elif plot_id == 14:
+		axis = fig.add_subplot(1, 1, 1)
+
+		# Find total sales of facilities and classes, and the number of team events
+		total_facility_sales, total_class_sales, team_events = analytics.sales_totals()
+		
+		xs = ["Facilities", "Classes", "Team Events"]
+		ys = [total_facility_sales, total_class_sales, team_events*5]
+		axis.bar(xs, ys)
+		filename = 'sales.png'
+
+	# The figure is already sized to fit, so this is the only render pass
+	output = io.BytesIO()
+	FigureCanvas(fig).print_png(output)
+	png = output.getvalue()
+
+	if filename:
+		fpath = os.path.join(current_app.static_folder, 'gen')
+		os.makedirs(fpath, exist_ok=True)
+		with open(os.path.join(fpath, filename), 'wb') as f:
+			f.write(png)
+
+	return png
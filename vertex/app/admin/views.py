@@ -4,8 +4,7 @@ Views for the "admin" blueprint.
 """
 from functools import wraps
 import datetime
-import io
-import os
+import time
 
 from flask import (
 	Blueprint, 
@@ -19,17 +18,10 @@ from flask import (
 	Response,
 	make_response,
 	request,
+	jsonify,
 )
 
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from matplotlib.figure import Figure
-from PIL import Image
-import numpy as np
 import datetime
-from dateutil.relativedelta import relativedelta
-
-from io import BytesIO
-from xhtml2pdf import pisa
 
 from flask_login import login_user, current_user, logout_user
 
@@ -49,8 +41,15 @@ from .forms import (
 	NewDiscount
 )
 
-from app import models
+from sqlalchemy.exc import IntegrityError
+
+from app import models, analytics
 from app.models import db
+from app.extensions import plot_cache, hashing, metrics
+from app.discounts import discount_table
+from app.reports import request_report
+from app.routing import read_only
+from app.catalogue import catalogue_cache
 
 blueprint = Blueprint("admin", __name__, static_folder="../static")
 
@@ -111,9 +110,31 @@ def login():
 
 	return render_template("manager_login.html", title="Manager Login | Vertex", user=current_user, form=form)
 
+@blueprint.route("/admin/metrics/hashing", methods=["GET"])
+@manager_login_required
+def hashing_metrics():
+	"""
+	Route for password hashing pool metrics (hash latency, queue wait, rejections), as JSON.
+	"""
+	return jsonify(hashing.metrics())
+
+@blueprint.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+	"""
+	Route for Prometheus to scrape the app's metrics. Open to managers, and to
+	requests from this machine if METRICS_ALLOW_LOCALHOST is set (so keep it off
+	behind a reverse proxy on the same host).
+	"""
+	local = request.remote_addr in ("127.0.0.1", "::1")
+	if not (local and current_app.config.get("METRICS_ALLOW_LOCALHOST")):
+		if current_user.is_anonymous or current_user.user_type != "manager":
+			abort(401)
+	return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # Views related to admin user management
 @blueprint.route("/admin/users", methods=["GET"])
 @manager_login_required
+@read_only
 def users():
 	"""
 	Route to manager view users page.
@@ -149,6 +170,10 @@ def delete_user(id):
 		for booking in class_bookings:
 			db.session.delete(booking)
 
+		memberships = models.ActiveMemberships.query.where(models.ActiveMemberships.user_id == id).all()
+		for membership in memberships:
+			db.session.delete(membership)
+
 		db.session.delete(target)
 		try:
 			db.session.commit()
@@ -275,6 +300,7 @@ def edit_name(id):
 # Views related to admin facility management
 @blueprint.route("/admin/facilities", methods=["GET"])
 @manager_login_required
+@read_only
 def facilities():
 	"""
 	Display facility information to the manager.
@@ -319,6 +345,7 @@ def edit_facility(id):
 			db.session.add(facility)
 			try:
 				db.session.commit()
+				catalogue_cache.invalidate("facilities")
 				flash(f"Edited facility {id}: " + ", ".join(changes), "success")
 				current_app.logger.info("Facility ID " + str(id) + " edited successfully on " + str(datetime.datetime.now()))
 			except Exception as e:
@@ -352,6 +379,7 @@ def delete_facility(id):
 
 		try:
 			db.session.commit()
+			catalogue_cache.invalidate("facilities")
 			flash(f"Facility {id} deleted.", category="success")
 			current_app.logger.info("Facility ID " + str(id) + " deleted successfully on " + str(datetime.datetime.now()))
 			return redirect(url_for("admin.facilities"))
@@ -366,6 +394,7 @@ def delete_facility(id):
 # Views related to admin class management
 @blueprint.route("/admin/classes", methods=["GET"])
 @manager_login_required
+@read_only
 def classes():
 	"""
 	Display class information to the manager.
@@ -410,6 +439,7 @@ def edit_class(id):
 			db.session.add(target)
 			try:
 				db.session.commit()
+				catalogue_cache.invalidate("classes")
 				flash(f"Edited class {id}: " + ", ".join(changes), "success")
 				current_app.logger.info("Class ID " + str(id) + " edited successfully on " + str(datetime.datetime.now()))
 			except Exception as e:
@@ -442,6 +472,7 @@ def delete_class(id):
 
 		try:
 			db.session.commit()
+			catalogue_cache.invalidate("classes")
 			flash(f"Class {id} deleted.", category="success")
 			current_app.logger.info("Class ID " + str(id) + " deleted successfully on " + str(datetime.datetime.now()))
 			return redirect(url_for("admin.classes"))
@@ -456,6 +487,7 @@ def delete_class(id):
 # Views related to admin membership management
 @blueprint.route("/admin/memberships", methods=["GET"])
 @manager_login_required
+@read_only
 def memberships():
 	"""
 	Display memberships information to the manager.
@@ -499,6 +531,7 @@ def edit_membership(id):
 			db.session.add(target)
 			try:
 				db.session.commit()
+				catalogue_cache.invalidate("memberships")
 				flash(f"Edited membership scheme {id}: " + ", ".join(changes), "success")
 				current_app.logger.info("Membership ID " + str(id) + " edited successfully on " + str(datetime.datetime.now()))
 			except Exception as e:
@@ -530,6 +563,7 @@ def delete_membership(id):
 		db.session.delete(target)
 		try:
 			db.session.commit()
+			catalogue_cache.invalidate("memberships")
 			flash(f"Membership scheme {id} deleted.", category="success")
 			current_app.logger.info("Membership ID " + str(id) + " deleted successfully on " + str(datetime.datetime.now()))
 			return redirect(url_for("admin.memberships"))
@@ -545,6 +579,7 @@ def delete_membership(id):
 # Views related to admin discount management
 @blueprint.route("/admin/discount", methods=["GET"])
 @manager_login_required
+@read_only
 def discount():
 	"""
 	Display discount information to the manager.
@@ -588,6 +623,7 @@ def edit_discount(id):
 			db.session.add(target)
 			try:
 				db.session.commit()
+				discount_table.invalidate()
 				flash(f"Edited discount scheme {id}: " + ", ".join(changes), "success")
 				current_app.logger.info("Discount ID " + str(id) + " successfully edited at " + str(datetime.datetime.now()))
 			except Exception as e:
@@ -615,6 +651,7 @@ def delete_discount(id):
 		db.session.delete(target)
 		try:
 			db.session.commit()
+			discount_table.invalidate()
 			flash(f"Discount scheme {id} deleted.", category="success")
 			current_app.logger.info("Discount ID " + str(id) + " deleted at " + str(datetime.datetime.now()))
 			return redirect(url_for("admin.discount"))
@@ -661,7 +698,8 @@ def new_user():
 			return redirect(url_for("admin.users"))
 		except Exception as e:
 			db.session.rollback()
-			if "UNIQUE constraint failed" in e.__str__() and "users.email" in e.__str__():
+			# Checked after the fact, as each database words its unique constraint errors differently
+			if isinstance(e, IntegrityError) and models.Users.query.where(models.Users.email == new.email).first():
 				flash("That email is already in use", "warning")
 			else:
 				current_app.logger.error(f"Database error in new user creation: {repr(e)}")
@@ -694,6 +732,7 @@ def new_facility():
 
 		try:
 			db.session.commit()
+			catalogue_cache.invalidate("facilities")
 			flash(f"New facility created: ID {new.id}", "success")
 			return redirect(url_for("admin.facilities"))
 		except Exception as e:
@@ -723,6 +762,7 @@ def new_class():
 
 		try:
 			db.session.commit()
+			catalogue_cache.invalidate("classes")
 			flash(f"New class created: ID {new.id}", "success")
 			return redirect(url_for("admin.classes"))
 		except Exception as e:
@@ -749,6 +789,7 @@ def new_membership():
 		db.session.add(new_membership)
 		try:
 			db.session.commit()
+			catalogue_cache.invalidate("memberships")
 			flash(f"New membership scheme created: ID {new_membership.id}", "success")
 			return redirect(url_for("admin.memberships"))
 		except Exception as e:
@@ -775,6 +816,7 @@ def new_discount():
 		db.session.add(new_discount)
 		try:
 			db.session.commit()
+			discount_table.invalidate()
 			flash(f"New discount scheme created: ID {new_discount.id}", "success")
 			current_app.logger.info("Discount ID " + str(new_discount.id) + " created successfully at " + str(datetime.datetime.now()))
 			return redirect(url_for("admin.discount"))
@@ -821,286 +863,34 @@ def sales():
 
 @blueprint.route("/plots/<int:plot_id>", methods=["GET"])
 @manager_login_required
+@read_only
 def plot(plot_id):
 	"""
 	Route to create and save plots for manager analytics.
-	"""
-	# Define the start and end dates for the past 7 days
-	today = datetime.date.today()
-	one_week_ago = today - datetime.timedelta(days=7)
-	fig = Figure()
-	
-	# Define a filepath for the generated images
-	fpath = os.path.join('app', 'static', 'gen')
-
-	# Facilities Plots
-
-	# Plot for fitness room throughout day
-	if plot_id == 1:
-		axis = fig.add_subplot(1, 1, 1)
-		langs = [str(datetime.time(i)) + "-" + str(datetime.time(i+1)) for i in range(8, 22)]
-		students = np.random.randint(0, 40, size=len(langs))
-		axis.bar(langs,students)
-		axis.set_xticklabels(axis.get_xticklabels(), rotation=30, ha='right')
-
-	# Plot for climbing wall for past one week
-	elif plot_id == 2:
-		axis = fig.add_subplot(1, 1, 1)
-
-		# Find all of the bookings for climbing wall
-		climbing = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 6 and models.FacilityBookings.date > one_week_ago).all()
-
-		xs = "general use"
-		ys = len(climbing)
-		axis.bar(xs, ys)
-		fig.savefig(fname=os.path.join(fpath, 'climbingwall.png'))
-
-	# Plot for fitness room for past one week
-	elif plot_id == 3:
-		axis = fig.add_subplot(1, 1, 1)
-
-		# Find all of the bookings for fitness room
-		fitness = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 2 and models.FacilityBookings.date > one_week_ago).all()
-
-		xs = "general use"
-		ys = len(fitness)
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'fitnessroom.png'))
-
-	# Plot for sports hall for past one week
-	elif plot_id == 4:
-		axis = fig.add_subplot(1, 1, 1)
-
-		# find all of the bookings for sports hall general use
-		generaluse = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 5, models.FacilityBookings.activity == "team events", models.FacilityBookings.date > one_week_ago).all()
-		
-		# find all of the bookings for sports hall one hour sessions
-		hoursessions = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 5, models.FacilityBookings.activity == "1 hour sessions", models.FacilityBookings.date > one_week_ago).all()
-
-		xs = ["general use", "1 hour session"]
-		ys = [len(generaluse), len(hoursessions)]
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'sportshall.png'))
-
-	# Plot for both squash courts over the last week
-	elif plot_id == 5:
-		axis = fig.add_subplot(1, 1, 1)
-
-		# find all of the bookings for squash court 1
-		court1 = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 3, models.FacilityBookings.date > one_week_ago).all()
-		
-		# find all of the bookings for squash court 2
-		court2 = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 4, models.FacilityBookings.date > one_week_ago).all()
-
-		xs = ["Squash Court 1", "Squash Court 2"]
-		ys = [len(court1), len(court2)]
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'squash.png'))
-
-	# Plot for studio over the last week
-	elif plot_id == 6:
-		axis = fig.add_subplot(1, 1, 1)
-
-		# Find all of the bookings for the studio general use
-		studio = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 7, models.FacilityBookings.date > one_week_ago).all()
-		
-		xs = ["General Use"]
-		ys = [len(studio)]
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'studio.png'))
-
-	# Plot for swimming over the last week
-	elif plot_id == 7:
-		axis = fig.add_subplot(1, 1, 1)
-
-		# Find all of the bookings for the swimming pool, by various activites
-		general_use = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 1, models.FacilityBookings.activity == "general use", models.FacilityBookings.date > one_week_ago).all()
-		lane_swimming = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 1, models.FacilityBookings.activity == "lane swimming", models.FacilityBookings.date > one_week_ago).all()
-		lessons = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 1, models.FacilityBookings.activity == "lessons", models.FacilityBookings.date > one_week_ago).all()
-		team_events = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 1, models.FacilityBookings.activity == "team events", models.FacilityBookings.date > one_week_ago).all()
-
-		xs = ["General use", "Lane Swimming", "Lessons", "Team Events"]
-		ys = [len(general_use), len(lane_swimming),len(lessons),len(team_events)]
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'swimming.png'))
-
-	# Classes Plots
-	# Plots for all Pilates class bookings in the past week
-	elif plot_id == 8:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find all pilates classes
-		all_pilates = models.Classes.query.where(models.Classes.name == "Pilates" and models.Classes.date > one_week_ago)
-		for pilates_class in all_pilates:
-			pilates_bookings = models.ClassBookings.query.where(models.ClassBookings.class_id == pilates_class.id).all()
-			xs.append(str(pilates_class.start) + " " + pilates_class.name)
-			ys.append(len(pilates_bookings))
-
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'pilates.png'))
-
-	# Plots for all Aerobics class bookings in the past week
-	elif plot_id == 9:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find all aerobics classes
-		all_aerobics = models.Classes.query.where(models.Classes.name == "Aerobics" and models.Classes.date > one_week_ago)
-		for aerobics_class in all_aerobics:
-			aerobics_bookings = models.ClassBookings.query.where(models.ClassBookings.class_id == aerobics_class.id).all()
-			xs.append(str(aerobics_class.start) + " " + aerobics_class.name)
-			ys.append(len(aerobics_bookings))
-
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'aerobics.png'))
-
-	# Plots for all Yoga class bookings in the past week
-	elif plot_id == 10:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find all yoga classes
-		all_yoga = models.Classes.query.where(models.Classes.name == "Yoga" and models.Classes.date > one_week_ago)
-		for yoga_class in all_yoga:
-			yoga_bookings = models.ClassBookings.query.where(models.ClassBookings.class_id == yoga_class.id).all()
-			xs.append(str(yoga_class.start) + " " + yoga_class.name)
-			ys.append(len(yoga_bookings))
-
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'yoga.png'))
-
-	# Membership plot
-
-	elif plot_id == 11:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find number of active memberships for each type of membership
-		types_of_memberships = models.Memberships.query.all()
-		for membership_type in types_of_memberships:
-			active = models.ActiveMemberships.query.where(models.ActiveMemberships.membership_id == membership_type.id).all()
-			xs.append(membership_type.name)
-			ys.append(len(active))
-
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'membership.png'))
-
-	elif plot_id == 12:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find total price of all active bookings for each type of facility
-		swim = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 1, models.FacilityBookings.date > one_week_ago).all()
-		fitroom = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 2, models.FacilityBookings.date > one_week_ago).all()
-		court1 = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 3, models.FacilityBookings.date > one_week_ago).all()
-		court2 = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 4, models.FacilityBookings.date > one_week_ago).all()
-		sporthall = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 5, models.FacilityBookings.date > one_week_ago).all()
-		climbing = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 6, models.FacilityBookings.date > one_week_ago).all()
-		studio = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 7, models.FacilityBookings.date > one_week_ago).all()
-		
-		xs = ["SP", "FR", "SC1", "SC2", "SH", "CW", "S"]
-		ys = [len(swim)*5, len(fitroom)*5, len(court1)*5, len(court2)*5, len(sporthall)*5, len(climbing)*5, len(studio)*5]
-		axis.bar(xs, ys, width=0.3)
-		fig.savefig(os.path.join(fpath, 'facility.png'))
-
-	elif plot_id == 13:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find total price of all active bookings for each type of class
-		pilates_total = 0
-		pilates = models.Classes.query.where(models.Classes.name == "Pilates" and models.Classes.date > one_week_ago)
-		for pilates_class in pilates:
-			pilates_bookings = models.ClassBookings.query.where(models.ClassBookings.class_id == pilates_class.id).all()
-			pilates_total += len(pilates_bookings) * pilates_class.price
-
-		aerobics_total = 0
-		aerobics = models.Classes.query.where(models.Classes.name == "Aerobics" and models.Classes.date > one_week_ago)
-		for aerobics_class in aerobics:
-			aerobics_bookings = models.ClassBookings.query.where(models.ClassBookings.class_id == aerobics_class.id).all()
-			aerobics_total += len(aerobics_bookings) * aerobics_class.price
-
-		yoga_total = 0
-		yoga = models.Classes.query.where(models.Classes.name == "Yoga" and models.Classes.date > one_week_ago)
-		for yoga_class in yoga:
-			yoga_bookings = models.ClassBookings.query.where(models.ClassBookings.class_id == yoga_class.id).all()
-			yoga_total += len(yoga_bookings) * yoga_class.price
-
-		aerobics = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 2, models.FacilityBookings.date > one_week_ago).all()
-		yoga = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 3, models.FacilityBookings.date > one_week_ago).all()
-		
-		xs = ["Pilates", "Aerobics", "Yoga"]
-		ys = [pilates_total, aerobics_total, yoga_total]
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'class.png'))
-
-	elif plot_id == 14:
-		axis = fig.add_subplot(1, 1, 1)
-		xs=[]
-		ys=[]
-
-		# Find total price of all active bookings for each type of facility
-		total_facility_sales = 0
-		total_class_sales = 0
-
-		all_facility_bookings = models.FacilityBookings.query.all()
-		for facility_booking in all_facility_bookings:
-			total_facility_sales += facility_booking.price
-
-		all_classes = models.Classes.query.all()
-		for each_class in all_classes:
-			total_class_sales += len(each_class.bookings) * each_class.price
-
-		all_team_events = models.TeamEvents.query.all()
-		
-		xs = ["Facilities", "Classes", "Team Events"]
-		ys = [total_facility_sales, total_class_sales, len(all_team_events)*5]
-		axis.bar(xs, ys)
-		fig.savefig(os.path.join(fpath, 'sales.png'))
-
-	output = io.BytesIO()
-	FigureCanvas(fig).print_png(output)
-
-	# Open the image using PIL
-	img = Image.open(io.BytesIO(output.getvalue()))
-
-	# Set the maximum width and height for the image
-	max_width = 1000
-	max_height = 400
-
-	# Get the image size
-	width, height = img.size
-
-	# Calculate the new size of the image while preserving its aspect ratio
-	if width > max_width:
-		ratio = max_width / width
-		new_width = max_width
-		new_height = int(height * ratio)
-	else:
-		new_width = width
-		new_height = height
-
-	if new_height > max_height:
-		ratio = max_height / new_height
-		new_height = max_height
-		new_width = int(new_width * ratio)
-
-	# Resize the image
-	img = img.resize((new_width, new_height), Image.ANTIALIAS)
+	Rendered plots are cached until the underlying data changes.
+	"""
+	# The ETag changes whenever the analytics data changes, or the cache TTL
+	# window rolls over (to pick up changes made by other worker processes)
+	etag = f"plot-{plot_id}-{analytics.data_version}"
+	if plot_cache.ttl:
+		etag += f"-{int(time.time() // plot_cache.ttl)}"
+
+	# The browser already has this version of the plot
+	if request.if_none_match.contains(etag):
+		response = Response(status=304)
+		response.set_etag(etag)
+		return response
 
-	# Save the image to a BytesIO object
-	output = io.BytesIO()
-	img.save(output, format='PNG')
-	output.seek(0)
+	png = plot_cache.get(etag)
+	if png is None:
+		from . import plots # Imported on first use, matplotlib is slow to import
+		png = plots.render_plot(plot_id)
+		plot_cache.set(etag, png)
 
-	return Response(output.getvalue(), mimetype='image/png')
+	response = Response(png, mimetype='image/png')
+	response.set_etag(etag)
+	response.headers['Cache-Control'] = 'private, no-cache'
+	return response
 
 @blueprint.route("/admin/logout", methods=["GET"])
 def logout():
@@ -1116,17 +906,7 @@ def download_sales():
 	"""
 	Route for manager to download PDF report for sales.
 	"""
-	html = render_template("manager_sales_report.html")
-
-	# Generate the PDF
-	pdf = generate_admin_pdf(html)
-	current_app.logger.info("PDF Sales Report generated at " + str(datetime.datetime.now()))
-
-	# Return the PDF as a response
-	response = make_response(pdf)
-	response.headers['Content-Type'] = 'application/pdf'
-	response.headers['Content-Disposition'] = 'attachment; filename="report_sales.pdf"'
-	return response
+	return queue_report("sales")
 
 @blueprint.route('/download_facilities')
 @manager_login_required
@@ -1134,17 +914,7 @@ def download_facilities():
 	"""
 	Route for manager to download PDF report for facilities.
 	"""
-	html = render_template("manager_facilities_report.html", date_from = datetime.date.today() - relativedelta(weeks=1), date_to = datetime.date.today())
-
-	# Generate the PDF
-	pdf = generate_admin_pdf(html)
-	current_app.logger.info("PDF Facilities Report generated at " + str(datetime.datetime.now()))
-
-	# Return the PDF as a response
-	response = make_response(pdf)
-	response.headers['Content-Type'] = 'application/pdf'
-	response.headers['Content-Disposition'] = 'attachment; filename="report_facilities.pdf"'
-	return response
+	return queue_report("facilities")
 
 @blueprint.route('/download_classes')
 @manager_login_required
@@ -1152,17 +922,7 @@ def download_classes():
 	"""
 	Route for manager to download PDF report for classes.
 	"""
-	html = render_template("manager_classes_report.html", date_from = datetime.date.today() - relativedelta(weeks=1), date_to = datetime.date.today())
-
-	# Generate the PDF
-	pdf = generate_admin_pdf(html)
-	current_app.logger.info("PDF Classes Report generated at " + str(datetime.datetime.now()))
-
-	# Return the PDF as a response
-	response = make_response(pdf)
-	response.headers['Content-Type'] = 'application/pdf'
-	response.headers['Content-Disposition'] = 'attachment; filename="report_classes.pdf"'
-	return response
+	return queue_report("classes")
 
 @blueprint.route('/download_memberships')
 @manager_login_required
@@ -1170,40 +930,45 @@ def download_memberships():
 	"""
 	Route for manager to download PDF report for memberships.
 	"""
-	html = render_template("manager_membership_report.html", graph_url=os.path.join('app','static', 'images', 'membership.png'))
-
-	# Generate the PDF
-	pdf = generate_admin_pdf(html)
-	current_app.logger.info("PDF Membership Report generated at " + str(datetime.datetime.now()))
+	return queue_report("memberships")
 
-	# Return the PDF as a response
-	response = make_response(pdf)
-	response.headers['Content-Type'] = 'application/pdf'
-	response.headers['Content-Disposition'] = 'attachment; filename="report_memberships.pdf"'
-	return response
+def queue_report(kind):
+	"""
+	Function to ask the report worker for a PDF report, and send the manager to
+	a page that waits for it.
+	"""
+	job = request_report(kind, current_user.id)
+	return redirect(url_for("admin.report", job_id=job.id))
 
-def generate_admin_pdf(html):
+@blueprint.route('/admin/reports/<int:job_id>')
+@manager_login_required
+def report(job_id):
 	"""
-	Function to generate PDF from HTML file.
+	Route for manager to check on a PDF report, as a page that reloads until the
+	report is ready, or as JSON.
 	"""
-	# Create a BytesIO object to hold the PDF data
-	pdf_buffer = BytesIO()
+	job = db.session.get(models.ReportJobs, job_id)
+	if job is None:
+		abort(404)
 
-	# Create a PDF object using the BytesIO object as its "file."
-	pdf = pisa.CreatePDF(BytesIO(html.encode("UTF-8")), pdf_buffer)
+	download = url_for("admin.download_report", job_id=job.id) if job.status == "done" else None
+	if request.accept_mimetypes.best == "application/json":
+		return jsonify({"id": job.id, "kind": job.kind, "status": job.status, "error": job.error, "download": download})
 
-	# Check if the PDF generation was successful
-	if not pdf.err:
-		# Get the value of the BytesIO buffer
-		pdf_value = pdf_buffer.getvalue()
-		pdf_buffer.close()
-		# Return the PDF data as a response
-		response = make_response(pdf_value)
-		response.headers['Content-Type'] = 'application/pdf'
-		response.headers['Content-Disposition'] = 'attachment; filename="report.pdf"'
-		return response
-	else:
-		# Handle the case where PDF generation failed
-		pdf_buffer.close()
-		current_app.logger.info("PDF Facilities Report generated at " + str(datetime.datetime.now()))
-		flash("Error generating PDF: " + str(pdf.err))
+	retry = url_for(f"admin.download_{job.kind}")
+	return render_template("manager_report.html", title="Report - Manager View | Vertex", job=job, download=download, retry=retry)
+
+@blueprint.route('/admin/reports/<int:job_id>/download')
+@manager_login_required
+def download_report(job_id):
+	"""
+	Route for manager to download a finished PDF report.
+	"""
+	job = db.session.get(models.ReportJobs, job_id)
+	if job is None or job.status != "done":
+		abort(404)
+
+	response = make_response(job.pdf)
+	response.headers['Content-Type'] = 'application/pdf'
+	response.headers['Content-Disposition'] = f'attachment; filename="report_{job.kind}.pdf"'
+	return response
@@ -0,0 +1,153 @@
+# vertex/app/analytics.py
+"""
+Analytics query layer for the manager analytics pages.
+
+Every function here issues a single aggregate query (one GROUP BY) and hands
+back plain Python values, so the plots never load booking rows into ORM objects.
+Totals are read from the daily rollup tables (see app/rollups.py) rather than
+from the bookings themselves.
+"""
+
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import Session
+
+from .cache import DataVersion
+from .models import (
+	db,
+	database_reset,
+	Classes,
+	ClassBookings,
+	FacilityBookings,
+	Memberships,
+	ActiveMemberships,
+	TeamEvents,
+	FacilityDailyTotals,
+	ClassDailyTotals,
+	MembershipTotals,
+)
+
+# Version of the data behind the analytics plots. Bumped whenever a booking,
+# membership or the classes they refer to change, and used to key the plot cache.
+data_version = DataVersion()
+
+ANALYTICS_MODELS = (FacilityBookings, ClassBookings, ActiveMemberships, Classes, Memberships, TeamEvents)
+
+# Changes are noted when a session flushes, and the version only bumped once the
+# transaction commits, so a plot drawn in between isn't cached as the new version
+
+@event.listens_for(Session, "after_flush")
+def _collect_analytics_changes(session, flush_context):
+	if any(isinstance(obj, ANALYTICS_MODELS) for obj in (*session.new, *session.dirty, *session.deleted)):
+		session.info["analytics_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _apply_analytics_changes(session):
+	if session.info.pop("analytics_changed", False):
+		data_version.bump()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_analytics_changes(session):
+	session.info.pop("analytics_changed", None)
+
+database_reset.connect(data_version.bump, weak=False)
+
+def facility_totals(since=None):
+	"""
+	Returns {facility_id: (bookings, revenue)} for every facility with bookings.
+	If since is given, only bookings dated after it are counted.
+	"""
+	stmt = select(
+		FacilityDailyTotals.facility_id,
+		func.sum(FacilityDailyTotals.bookings),
+		func.sum(FacilityDailyTotals.revenue),
+	).group_by(FacilityDailyTotals.facility_id).having(func.sum(FacilityDailyTotals.bookings) > 0)
+
+	if since is not None:
+		stmt = stmt.where(FacilityDailyTotals.date > since)
+
+	return {facility_id: (count, revenue) for facility_id, count, revenue in db.session.execute(stmt)}
+
+def activity_counts(facility_id, since=None):
+	"""
+	Returns {activity: bookings} for a single facility.
+	If since is given, only bookings dated after it are counted.
+	"""
+	stmt = select(
+		FacilityDailyTotals.activity,
+		func.sum(FacilityDailyTotals.bookings),
+	).where(FacilityDailyTotals.facility_id == facility_id) \
+	 .group_by(FacilityDailyTotals.activity) \
+	 .having(func.sum(FacilityDailyTotals.bookings) > 0)
+
+	if since is not None:
+		stmt = stmt.where(FacilityDailyTotals.date > since)
+
+	return {activity: count for activity, count in db.session.execute(stmt)}
+
+def class_session_counts(name, since=None):
+	"""
+	Returns (labels, counts) with one entry per class session of the given name,
+	in class id order. Sessions without bookings are included with a count of 0.
+	"""
+	stmt = select(
+		Classes.start,
+		Classes.name,
+		func.count(ClassBookings.id),
+	).outerjoin(ClassBookings, ClassBookings.class_id == Classes.id) \
+	 .where(Classes.name == name) \
+	 .group_by(Classes.id) \
+	 .order_by(Classes.id)
+
+	if since is not None:
+		stmt = stmt.where(Classes.date > since)
+
+	labels = []
+	counts = []
+	for start, class_name, count in db.session.execute(stmt):
+		labels.append(str(start) + " " + class_name)
+		counts.append(count)
+	return labels, counts
+
+def class_revenue(since=None):
+	"""
+	Returns {class name: revenue}, where revenue is the class price summed over
+	every booking. If since is given, only classes dated after it are counted.
+	"""
+	stmt = select(
+		ClassDailyTotals.name,
+		func.sum(ClassDailyTotals.revenue),
+	).group_by(ClassDailyTotals.name).having(func.sum(ClassDailyTotals.bookings) > 0)
+
+	if since is not None:
+		stmt = stmt.where(ClassDailyTotals.date > since)
+
+	return {name: revenue for name, revenue in db.session.execute(stmt)}
+
+def membership_counts():
+	"""
+	Returns (labels, counts) with the number of active memberships for each
+	membership type, in membership id order.
+	"""
+	stmt = select(
+		Memberships.name,
+		func.coalesce(MembershipTotals.active, 0),
+	).outerjoin(MembershipTotals, MembershipTotals.membership_id == Memberships.id) \
+	 .order_by(Memberships.id)
+
+	labels = []
+	counts = []
+	for name, count in db.session.execute(stmt):
+		labels.append(name)
+		counts.append(count)
+	return labels, counts
+
+def sales_totals():
+	"""
+	Returns (facility revenue, class revenue, number of team events) across all
+	time, computed in a single round trip.
+	"""
+	facility_sales = select(func.coalesce(func.sum(FacilityDailyTotals.revenue), 0)).scalar_subquery()
+	class_sales = select(func.coalesce(func.sum(ClassDailyTotals.revenue), 0)).scalar_subquery()
+	team_events = select(func.count(TeamEvents.id)).scalar_subquery()
+
+	return tuple(db.session.execute(select(facility_sales, class_sales, team_events)).one())
@@ -0,0 +1,378 @@
+# vertex/app/booking.py
+"""
+Booking engine for classes and facilities.
+
+Keeps an in-memory index of the bookings for each facility and day, so capacity
+checks don't have to scan the bookings table, and commits bookings in a way that
+is safe when several requests compete for the last place.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+import random
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, update, func, event, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .models import db, database_reset, Classes, ClassBookings, Facilities, FacilityBookings
+from .extensions import metrics
+
+class CapacityError(ValueError):
+	"""
+	Raised when a booking would take a class or facility over its capacity.
+	"""
+
+class BookingContentionError(RuntimeError):
+	"""
+	Raised when a booking still conflicts with other bookings after every retry.
+	"""
+
+class _VersionConflict(Exception):
+	"""
+	Another booking was committed between reading and claiming a version.
+	"""
+
+def to_minutes(time):
+	"""
+	Converts a datetime.time to minutes past midnight.
+	"""
+	return time.hour * 60 + time.minute
+
+class DayIndex:
+	"""
+	Interval index of the bookings for one facility on one day.
+
+	Start and end times (in minutes) are kept in two sorted arrays, so the number
+	of bookings overlapping [start, end) is found with two binary searches.
+	"""
+	def __init__(self):
+		self.starts = []
+		self.ends = []
+		self.bookings = {} # booking id -> (start, end)
+
+	def add(self, booking_id: int, start: int, end: int):
+		"""
+		Add a booking to the index. Adding the same booking twice has no effect.
+		"""
+		if booking_id in self.bookings:
+			return
+		self.bookings[booking_id] = (start, end)
+		insort(self.starts, start)
+		insort(self.ends, end)
+
+	def remove(self, booking_id: int):
+		"""
+		Remove a booking from the index, if present.
+		"""
+		interval = self.bookings.pop(booking_id, None)
+		if interval is None:
+			return
+		start, end = interval
+		del self.starts[bisect_left(self.starts, start)]
+		del self.ends[bisect_left(self.ends, end)]
+
+	def overlapping(self, start: int, end: int):
+		"""
+		Number of bookings overlapping [start, end), in O(log n).
+		"""
+		# Bookings that start before the end, minus those that also finish by the start
+		return bisect_left(self.starts, end) - bisect_right(self.ends, start)
+
+	def peak(self, start: int, end: int):
+		"""
+		Largest number of bookings in the facility at any one time during [start, end).
+		"""
+		changes = []
+		for booking_start, booking_end in self.bookings.values():
+			if booking_start < end and booking_end > start:
+				changes.append((max(booking_start, start), 1))
+				changes.append((min(booking_end, end), -1))
+
+		# At equal times, process departures before arrivals (intervals are half-open)
+		changes.sort()
+		peak = current = 0
+		for _, change in changes:
+			current += change
+			peak = max(peak, current)
+		return peak
+
+	def __len__(self):
+		return len(self.bookings)
+
+class FacilityBookingEngine:
+	"""
+	Answers capacity questions for facility bookings.
+
+	Each (facility, day) index is built lazily from the database the first time
+	it is needed, and then kept up to date as bookings are committed or deleted.
+	"""
+	def __init__(self):
+		self._days = {}
+		self._versions = {} # facility id -> booking_version the index is up to date with
+		self._lock = threading.RLock()
+
+	def init_app(self, app):
+		"""
+		Register the engine with an app. Starts with an empty index.
+		"""
+		app.extensions["booking_engine"] = self
+		self.clear()
+
+	def clear(self, *args, **kwargs):
+		"""
+		Drop the whole index. It will be rebuilt from the database on demand.
+		"""
+		with self._lock:
+			self._days.clear()
+			self._versions.clear()
+
+	def invalidate(self, facility_id: int):
+		"""
+		Drop the index for every day of a facility.
+		"""
+		with self._lock:
+			for key in [key for key in self._days if key[0] == facility_id]:
+				del self._days[key]
+			self._versions.pop(facility_id, None)
+
+	def sync(self, facility_id: int, version: int):
+		"""
+		Make sure the index for a facility reflects the given booking_version.
+		If the facility changed behind our back (e.g. in another process), its
+		days are dropped and rebuilt from the database.
+		"""
+		with self._lock:
+			if self._versions.get(facility_id) != version:
+				self.invalidate(facility_id)
+				self._versions[facility_id] = version
+
+	def advance(self, facility_id: int, old_version: int, new_version: int):
+		"""
+		Record that this process moved a facility from old_version to new_version,
+		with the change already applied to the index.
+		"""
+		with self._lock:
+			if self._versions.get(facility_id) == old_version:
+				self._versions[facility_id] = new_version
+
+	def day(self, facility_id: int, date):
+		"""
+		Returns the DayIndex for a facility on a date, building it from the database if needed.
+		"""
+		key = (facility_id, date)
+		with self._lock:
+			index = self._days.get(key)
+			if index is None:
+				index = DayIndex()
+				rows = db.session.execute(
+					select(FacilityBookings.id, FacilityBookings.start, FacilityBookings.end)
+					.where(FacilityBookings.facility_id == facility_id, FacilityBookings.date == date)
+				)
+				for booking_id, start, end in rows:
+					index.add(booking_id, to_minutes(start), to_minutes(end))
+				self._days[key] = index
+			return index
+
+	def occupancy(self, facility_id: int, date, start, end):
+		"""
+		Largest number of people booked into a facility at any time during [start, end).
+		"""
+		with self._lock:
+			return self.day(facility_id, date).peak(to_minutes(start), to_minutes(end))
+
+	def check_capacity(self, facility, date, start, end):
+		"""
+		Raises CapacityError if one more booking of facility during [start, end)
+		would exceed its capacity.
+		"""
+		start, end = to_minutes(start), to_minutes(end)
+		with self._lock:
+			index = self.day(facility.id, date)
+
+			# Fast path: even if every overlapping booking were at the same time, there's room
+			if index.overlapping(start, end) < facility.capacity:
+				return
+
+			if index.peak(start, end) >= facility.capacity:
+				raise CapacityError(f"{facility.name} is fully booked at that time")
+
+	def apply(self, changes):
+		"""
+		Apply committed changes to any days already in the index. Changes are
+		(action, facility_id, date, booking_id, start, end) tuples, where action is
+		"add", "remove", "invalidate" (the facility) or "clear" (everything).
+		"""
+		with self._lock:
+			for action, facility_id, date, booking_id, start, end in changes:
+				if action == "clear":
+					self.clear()
+					continue
+				if action == "invalidate":
+					self.invalidate(facility_id)
+					continue
+
+				index = self._days.get((facility_id, date))
+				if index is None:
+					continue # Will be built from the database when needed
+				if action == "add":
+					index.add(booking_id, start, end)
+				else:
+					index.remove(booking_id)
+
+booking_engine = FacilityBookingEngine()
+
+# Committing bookings. Contention is serialised per class or facility:
+# the class/facility row is read with SELECT ... FOR UPDATE where the database
+# supports it, and its booking_version is then bumped with a compare-and-swap.
+# On SQLite, which ignores FOR UPDATE, the compare-and-swap fails if another
+# booking got in first, and the whole transaction is retried.
+
+def _lock_row(model, id: int):
+	"""
+	Read a class or facility row for update, bypassing any stale copy in the session.
+	"""
+	return db.session.execute(
+		select(model).where(model.id == id).with_for_update().execution_options(populate_existing=True)
+	).scalar_one_or_none()
+
+def _claim_version(model, id: int, version: int):
+	"""
+	Bump a row's booking_version, if it still has the version we read.
+	"""
+	result = db.session.execute(
+		update(model)
+		.where(model.id == id, model.booking_version == version)
+		.values(booking_version=version + 1)
+		.execution_options(synchronize_session=False)
+	)
+	if result.rowcount != 1:
+		raise _VersionConflict()
+
+def _is_lock_error(e: OperationalError):
+	# SQLite's "database is locked", and PostgreSQL's deadlock, serialization
+	# failure and lock_timeout errors
+	message = str(e)
+	return any(text in message for text in ("locked", "deadlock", "could not serialize", "lock timeout"))
+
+def _with_retries(attempt):
+	"""
+	Run attempt() until it commits, rolling back and backing off between tries.
+	"""
+	max_attempts = current_app.config.get("BOOKING_MAX_ATTEMPTS", 10)
+	for attempt_number in range(max_attempts):
+		try:
+			return attempt()
+		except _VersionConflict:
+			db.session.rollback()
+		except OperationalError as e:
+			db.session.rollback()
+			if not _is_lock_error(e):
+				raise
+		except Exception:
+			db.session.rollback()
+			raise
+
+		# Randomised exponential backoff, so competing requests spread out
+		time.sleep(random.uniform(0, 0.005 * 2 ** attempt_number))
+
+	raise BookingContentionError("Too many people are booking right now, please try again")
+
+def book_class(user_id: int, class_id: int):
+	"""
+	Book a user into a class and commit. Raises LookupError if there is no such
+	class, CapacityError if it is full, or BookingContentionError.
+	"""
+	def attempt():
+		target = _lock_row(Classes, class_id)
+		if target is None:
+			raise LookupError(f"No class with id {class_id}")
+
+		booked = db.session.execute(
+			select(func.count(ClassBookings.id)).where(ClassBookings.class_id == class_id)
+		).scalar_one()
+		if booked >= target.capacity:
+			raise CapacityError(f"{target.name} is fully booked")
+
+		_claim_version(Classes, class_id, target.booking_version)
+		booking = ClassBookings(user_id=user_id, class_id=class_id)
+		db.session.add(booking)
+		db.session.commit()
+		return booking
+
+	booking = _with_retries(attempt)
+	metrics.inc("vertex_bookings_created_total", kind="class")
+	return booking
+
+def book_facility(user_id: int, facility_id: int, activity: str, price: int, date, start, end):
+	"""
+	Book a user into a facility and commit. Raises LookupError if there is no such
+	facility, CapacityError if it is full at that time, or BookingContentionError.
+	"""
+	def attempt():
+		facility = _lock_row(Facilities, facility_id)
+		if facility is None:
+			raise LookupError(f"No facility with id {facility_id}")
+
+		version = facility.booking_version
+		booking_engine.sync(facility_id, version)
+		booking_engine.check_capacity(facility, date, start, end)
+
+		_claim_version(Facilities, facility_id, version)
+		booking = FacilityBookings(user_id=user_id, facility_id=facility_id, activity=activity, price=price, date=date, start=start, end=end)
+		db.session.add(booking)
+		db.session.commit()
+
+		# The commit already added the booking to the index
+		booking_engine.advance(facility_id, version, version + 1)
+		return booking
+
+	booking = _with_retries(attempt)
+	metrics.inc("vertex_bookings_created_total", kind="facility")
+	return booking
+
+# Keep the index in step with the database. Changes are collected when a session
+# flushes, and only applied to the index once the transaction commits.
+
+def _change(action, booking):
+	# Read the loaded values directly, so an expired object doesn't trigger a query mid-flush
+	values = inspect(booking).dict
+	if not all(key in values for key in ("id", "facility_id", "date", "start", "end")):
+		return ("clear", None, None, None, None, None)
+	return (action, values["facility_id"], values["date"], values["id"], to_minutes(values["start"]), to_minutes(values["end"]))
+
+@event.listens_for(Session, "after_flush")
+def _collect_booking_changes(session, flush_context):
+	changes = session.info.setdefault("facility_booking_changes", [])
+	for obj in session.new:
+		if isinstance(obj, FacilityBookings):
+			changes.append(_change("add", obj))
+	for obj in session.dirty:
+		if isinstance(obj, FacilityBookings):
+			changes.append(_change("invalidate", obj))
+	for obj in session.deleted:
+		if isinstance(obj, FacilityBookings):
+			changes.append(_change("remove", obj))
+
+@event.listens_for(Session, "after_commit")
+def _apply_booking_changes(session):
+	changes = session.info.pop("facility_booking_changes", None)
+	if changes:
+		booking_engine.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_booking_changes(session):
+	session.info.pop("facility_booking_changes", None)
+
+@event.listens_for(FacilityBookings, "after_delete")
+def _bump_facility_version(mapper, connection, target):
+	# Cancellations free up space, so other processes must rebuild their index
+	connection.execute(
+		update(Facilities.__table__)
+		.where(Facilities.__table__.c.id == target.facility_id)
+		.values(booking_version=Facilities.__table__.c.booking_version + 1)
+	)
+
+database_reset.connect(booking_engine.clear, weak=False)
@@ -0,0 +1,302 @@
+# vertex/app/cache.py
+"""
+Small caching helpers shared by the views.
+"""
+
+from collections import OrderedDict
+import hashlib
+import itertools
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+
+class LRUCache:
+	"""
+	Thread-safe least-recently-used cache with an optional time-to-live.
+
+	Sizes can be read from the app config with init_app(), using the config
+	prefix given, e.g. PLOT_CACHE_SIZE and PLOT_CACHE_TTL for "PLOT_CACHE".
+	"""
+	def __init__(self, max_entries: int = 128, ttl: float = None, config_prefix: str = None):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.config_prefix = config_prefix
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def init_app(self, app):
+		"""
+		Read the cache size and time-to-live from the app config, if set.
+		"""
+		if self.config_prefix:
+			self.max_entries = app.config.get(self.config_prefix + "_SIZE", self.max_entries)
+			self.ttl = app.config.get(self.config_prefix + "_TTL", self.ttl)
+		self.clear()
+
+	def get(self, key, default=None):
+		"""
+		Returns the cached value for key, or default if missing or expired.
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return default
+
+			value, stored_at = entry
+			if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+				del self._entries[key]
+				return default
+
+			self._entries.move_to_end(key)
+			return value
+
+	def set(self, key, value):
+		"""
+		Stores value under key, evicting the least recently used entries if full.
+		"""
+		with self._lock:
+			self._entries[key] = (value, time.monotonic())
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def delete(self, key):
+		"""
+		Removes key from the cache if present.
+		"""
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def clear(self):
+		"""
+		Empties the cache.
+		"""
+		with self._lock:
+			self._entries.clear()
+
+	def __contains__(self, key):
+		return self.get(key) is not None
+
+	def __len__(self):
+		return len(self._entries)
+
+class DiskCache:
+	"""
+	Cache of bytes values in files under a directory, shared by every process
+	using the same directory. Once the files add up to more than max_bytes, the
+	least recently used are deleted.
+
+	The directory and size can be read from the app config with init_app(),
+	using the config prefix given, e.g. RECEIPT_DISK_CACHE_DIR and
+	RECEIPT_DISK_CACHE_MAX_BYTES for "RECEIPT_DISK_CACHE". Without a directory
+	nothing is cached.
+	"""
+	def __init__(self, directory: str = None, max_bytes: int = 64 * 1024 * 1024, config_prefix: str = None):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.config_prefix = config_prefix
+		self._bytes = None # Size of the files, counted the first time one is written
+		self._lock = threading.Lock()
+
+	def init_app(self, app):
+		"""
+		Read the cache directory and size from the app config, if set.
+		"""
+		if self.config_prefix:
+			self.directory = app.config.get(self.config_prefix + "_DIR", self.directory)
+			self.max_bytes = app.config.get(self.config_prefix + "_MAX_BYTES", self.max_bytes)
+		self._bytes = None
+
+	def _path(self, key):
+		return os.path.join(self.directory, hashlib.sha256(str(key).encode()).hexdigest())
+
+	def get(self, key, default=None):
+		"""
+		Returns the cached value for key, or default if missing.
+		"""
+		if not self.directory:
+			return default
+
+		path = self._path(key)
+		try:
+			with open(path, "rb") as f:
+				value = f.read()
+			os.utime(path) # Mark it recently used
+		except FileNotFoundError: # Missing, or evicted between reading and marking it
+			return default
+		return value
+
+	def set(self, key, value: bytes):
+		"""
+		Stores value under key, evicting the least recently used files if full.
+		"""
+		if not self.directory:
+			return
+
+		os.makedirs(self.directory, exist_ok=True)
+		# Written to a temporary file and moved into place, so other processes
+		# never read half a file
+		fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		with os.fdopen(fd, "wb") as f:
+			f.write(value)
+		os.replace(temporary, self._path(key))
+
+		with self._lock:
+			if self._bytes is None:
+				self._bytes = sum(size for path, size, used in self._files())
+			else:
+				self._bytes += len(value)
+			if self._bytes > self.max_bytes:
+				self._evict()
+
+	def _files(self):
+		"""
+		Returns (path, size, last used) of every cached file.
+		"""
+		files = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(".tmp"):
+				continue
+			try:
+				stat = entry.stat()
+			except FileNotFoundError:
+				continue
+			files.append((entry.path, stat.st_size, stat.st_mtime))
+		return files
+
+	def _evict(self):
+		"""
+		Delete the least recently used files until the rest fit in max_bytes.
+		Sizes are recounted from the directory, as other processes write to it too.
+		"""
+		files = sorted(self._files(), key=lambda file: file[2])
+		self._bytes = sum(size for path, size, used in files)
+		for path, size, used in files:
+			if self._bytes <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			self._bytes -= size
+
+	def clear(self):
+		"""
+		Deletes every cached file.
+		"""
+		if not self.directory or not os.path.isdir(self.directory):
+			return
+		with self._lock:
+			for path, size, used in self._files():
+				try:
+					os.remove(path)
+				except FileNotFoundError:
+					pass
+			self._bytes = 0
+
+class RedisCache:
+	"""
+	Cache kept in Redis, or a Redis-compatible server such as Valkey, and shared
+	by every process using it. Values are pickled, and expire after ttl seconds.
+
+	The server and time-to-live can be read from the app config with init_app(),
+	using the config prefix given, e.g. CATALOGUE_CACHE_URL and CATALOGUE_CACHE_TTL
+	for "CATALOGUE_CACHE". Needs the redis package (pip install redis).
+
+	The cache is only ever a copy, so if the server can't be reached lookups miss
+	and nothing is stored, rather than failing the request.
+	"""
+	def __init__(self, url: str = None, ttl: float = None, prefix: str = "vertex:", config_prefix: str = None):
+		self.url = url
+		self.ttl = ttl
+		self.prefix = prefix
+		self.config_prefix = config_prefix
+		self._client = None
+
+	def init_app(self, app):
+		"""
+		Read the server and time-to-live from the app config, if set, and connect.
+		"""
+		if self.config_prefix:
+			self.url = app.config.get(self.config_prefix + "_URL", self.url)
+			self.ttl = app.config.get(self.config_prefix + "_TTL", self.ttl)
+		self._logger = app.logger
+		import redis # Only needed when a Redis cache is configured
+		self._errors = redis.RedisError
+		self._client = redis.Redis.from_url(self.url, socket_timeout=1)
+
+	def _call(self, method, *args, default=None, **kwargs):
+		try:
+			return getattr(self._client, method)(*args, **kwargs)
+		except self._errors as e:
+			self._logger.warning(f"Redis cache unavailable: {e!r}")
+			return default
+
+	def get(self, key, default=None):
+		"""
+		Returns the cached value for key, or default if missing or expired.
+		"""
+		value = self._call("get", self.prefix + str(key))
+		return default if value is None else pickle.loads(value)
+
+	def set(self, key, value):
+		"""
+		Stores value under key, for ttl seconds.
+		"""
+		self._call("set", self.prefix + str(key), pickle.dumps(value), ex=int(self.ttl) if self.ttl else None)
+
+	def delete(self, key):
+		"""
+		Removes key from the cache if present.
+		"""
+		self._call("delete", self.prefix + str(key))
+
+	def counter(self, key):
+		"""
+		Current value of a counter stored under key (which doesn't expire), or 0.
+		"""
+		return int(self._call("get", self.prefix + str(key)) or 0)
+
+	def incr(self, key):
+		"""
+		Adds one to the counter stored under key, and returns its new value.
+		"""
+		return self._call("incr", self.prefix + str(key), default=0)
+
+	def clear(self):
+		"""
+		Deletes every key with this cache's prefix.
+		"""
+		keys = self._call("keys", self.prefix + "*", default=[])
+		if keys:
+			self._call("delete", *keys)
+
+class DataVersion:
+	"""
+	Monotonic version counter for a set of tables. Bump it whenever the data
+	changes and use str(version) in cache keys and ETags.
+
+	The string form includes a token unique to this process, so versions
+	from different worker processes never compare equal.
+	"""
+	def __init__(self):
+		self._token = uuid.uuid4().hex[:8]
+		self._counter = itertools.count(1)
+		self._value = next(self._counter)
+
+	def bump(self, *args, **kwargs):
+		"""
+		Move to a new version. Accepts and ignores any arguments so it can be
+		used directly as an event listener.
+		"""
+		self._value = next(self._counter)
+
+	@property
+	def value(self):
+		return self._value
+
+	def __str__(self):
+		return f"{self._token}-{self._value}"
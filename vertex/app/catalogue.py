@@ -0,0 +1,100 @@
+# vertex/app/catalogue.py
+"""
+Cache-aside layer for the class and facility catalogues shown on /classes and
+/facilities.
+
+The catalogues only change when a manager adds, edits or deletes a class or a
+facility, so the prepared listings are cached and each admin view that changes
+one calls catalogue_cache.invalidate(). Every catalogue has a version number,
+part of each cache key, and invalidating moves it on, so older entries are never
+read again and drop out of the cache by themselves. The membership schemes are
+versioned the same way, for the ETags of the membership pages (see
+app/conditional.py).
+
+By default the cache is in memory (CATALOGUE_CACHE_SIZE entries), and other
+worker processes see a change within CATALOGUE_CACHE_TTL seconds. With
+CATALOGUE_CACHE_URL set to a Redis server, the entries and the version numbers
+are shared, and every process sees changes straight away.
+"""
+
+import time
+
+from .cache import LRUCache, RedisCache, DataVersion
+from .extensions import metrics
+from .models import database_reset
+from .routing import primary_reads
+
+CATALOGUES = ("classes", "facilities", "memberships")
+
+class CatalogueCache:
+	"""
+	Cache of prepared catalogue listings, with one version number per catalogue.
+	"""
+	def __init__(self):
+		self.backend = LRUCache(config_prefix="CATALOGUE_CACHE")
+		self._versions = {name: DataVersion() for name in CATALOGUES}
+
+	def init_app(self, app):
+		"""
+		Pick the in-memory or Redis backend from the app config.
+		"""
+		app.extensions["catalogue_cache"] = self
+		if app.config.get("CATALOGUE_CACHE_URL"):
+			self.backend = RedisCache(config_prefix="CATALOGUE_CACHE", prefix="vertex:catalogue:")
+		else:
+			self.backend = LRUCache(config_prefix="CATALOGUE_CACHE")
+		self.backend.init_app(app)
+
+	def version(self, name: str):
+		"""
+		Current version of a catalogue, as a string for cache keys and ETags.
+		"""
+		if isinstance(self.backend, RedisCache):
+			return str(self.backend.counter(f"{name}:version"))
+		# Other processes' changes aren't seen here, so the version also moves on
+		# every TTL seconds
+		if self.backend.ttl:
+			return f"{self._versions[name]}-{int(time.time() // self.backend.ttl)}"
+		return str(self._versions[name])
+
+	def get_or_load(self, name: str, key, load):
+		"""
+		Returns the cached listing of a catalogue for key (e.g. the query
+		parameters of the page), calling load() and caching its result on a miss.
+		load() always reads from the main database.
+		"""
+		cache_key = f"{name}:{self.version(name)}:{key}"
+		value = self.backend.get(cache_key)
+		if value is not None:
+			metrics.inc("vertex_catalogue_cache_total", catalogue=name, result="hit")
+			return value
+
+		metrics.inc("vertex_catalogue_cache_total", catalogue=name, result="miss")
+		# From the main database, as a lagging replica's listing would be kept (and
+		# given an ETag) as the current version
+		with primary_reads():
+			value = load()
+		self.backend.set(cache_key, value)
+		return value
+
+	def invalidate(self, *names):
+		"""
+		Drop the cached listings of the catalogues named, or all of them.
+		"""
+		for name in names or CATALOGUES:
+			if isinstance(self.backend, RedisCache):
+				self.backend.incr(f"{name}:version")
+			else:
+				self._versions[name].bump()
+
+	def clear(self, *args, **kwargs):
+		"""
+		Drop every cached listing. Accepts and ignores any arguments so it can be
+		used directly as a signal receiver.
+		"""
+		self.invalidate()
+		self.backend.clear()
+
+catalogue_cache = CatalogueCache()
+
+database_reset.connect(catalogue_cache.clear, weak=False)
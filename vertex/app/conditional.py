@@ -0,0 +1,81 @@
+# vertex/app/conditional.py
+"""
+HTTP conditional GET for pages that change much less often than they are
+viewed.
+
+A view decorated with @conditional(version) gets an ETag made from version(),
+a cheap query or counter standing for the data the page shows, along with the
+logged-in user and the page templates. When the browser (or a proxy) already
+has that version of the page, the response is a 304 Not Modified, and the page
+isn't rendered at all.
+
+Pages are sent with Cache-Control: private, no-cache, so browsers check with
+the app before reusing them, and shared caches don't keep them.
+
+Pages with flashed messages waiting to be shown get no ETag, as the messages
+are only shown once.
+"""
+
+from functools import wraps
+import hashlib
+import os
+
+from flask import current_app, request, session, make_response, Response
+from flask_login import current_user
+
+# Digest of the templates in each template folder, so pages are rendered again
+# when a template changes
+_template_digests = {}
+
+def templates_digest():
+	"""
+	Digest of every template the app renders, computed once per process.
+	"""
+	folder = os.path.join(current_app.root_path, current_app.template_folder)
+	digest = _template_digests.get(folder)
+	if digest is None:
+		hash = hashlib.sha256()
+		for root, dirs, files in sorted(os.walk(folder)):
+			for name in sorted(files):
+				with open(os.path.join(root, name), "rb") as f:
+					hash.update(f.read())
+		digest = _template_digests[folder] = hash.hexdigest()[:16]
+	return digest
+
+def page_etag(version):
+	"""
+	ETag of the current page, for data at the given version.
+	"""
+	user = f"{current_user.get_id()}-{current_user.user_type}" if current_user.is_authenticated else "anonymous"
+	parts = [request.endpoint, templates_digest(), user, *(str(part) for part in version)]
+	return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+def conditional(version):
+	"""
+	Decorator for views whose page only changes when version() does. version()
+	returns a tuple of values, such as a catalogue version or a count and last
+	timestamp of the user's bookings.
+
+	Used as follows:
+	@conditional(lambda: (catalogue_cache.version("facilities"),))
+	def facilities():
+		...
+	"""
+	def decorator(func):
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+				return func(*args, **kwargs)
+
+			etag = page_etag(version())
+			if request.if_none_match.contains(etag):
+				response = Response(status=304)
+			else:
+				response = make_response(func(*args, **kwargs))
+				if response.status_code != 200:
+					return response
+			response.set_etag(etag)
+			response.headers["Cache-Control"] = "private, no-cache"
+			return response
+		return wrapper
+	return decorator
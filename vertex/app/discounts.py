@@ -0,0 +1,101 @@
+# vertex/app/discounts.py
+"""
+Discount resolution for payments. A customer's discount depends on how many
+sessions (class and facility bookings) they have in the next two weeks.
+
+The discount schemes are cached in memory, sorted by session_number, and
+dropped whenever a scheme is added, edited or deleted.
+"""
+
+from bisect import bisect_right
+import datetime
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, func, event
+
+from .models import db, database_reset, Discounts, Classes, ClassBookings, FacilityBookings
+
+# How far ahead booked sessions count towards a discount
+WINDOW = datetime.timedelta(weeks=2)
+
+def session_count_query(user_id: int, today: datetime.date = None):
+	"""
+	Statement counting a user's class and facility bookings from today until two
+	weeks from now.
+	"""
+	today = today or datetime.date.today()
+	until = today + WINDOW
+
+	classes = select(func.count(ClassBookings.id)) \
+		.join(Classes, Classes.id == ClassBookings.class_id) \
+		.where(ClassBookings.user_id == user_id, Classes.date >= today, Classes.date < until) \
+		.scalar_subquery()
+	facilities = select(func.count(FacilityBookings.id)) \
+		.where(FacilityBookings.user_id == user_id, FacilityBookings.date >= today, FacilityBookings.date < until) \
+		.scalar_subquery()
+
+	return select(classes + facilities)
+
+def session_count(user_id: int):
+	"""
+	Number of sessions a user has booked in the next two weeks, in one query.
+	"""
+	return db.session.execute(session_count_query(user_id)).scalar()
+
+class DiscountTable:
+	"""
+	In-memory copy of the discounts table, sorted by session_number so the scheme
+	for a number of sessions is one binary search away.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._schemes = None
+		self._thresholds = []
+		self._loaded_at = 0
+
+	def invalidate(self, *args, **kwargs):
+		"""
+		Drop the cached schemes. They are reloaded on the next lookup.
+		"""
+		with self._lock:
+			self._schemes = None
+
+	def _load(self):
+		rows = db.session.execute(
+			select(Discounts.id, Discounts.name, Discounts.value, Discounts.session_number)
+		)
+		# Where two schemes share a threshold, the larger discount sorts last and wins
+		schemes = sorted(
+			({"id": id, "name": name, "value": value, "session_number": session_number} for id, name, value, session_number in rows),
+			key=lambda scheme: (scheme["session_number"], scheme["value"], scheme["id"])
+		)
+		return schemes, [scheme["session_number"] for scheme in schemes]
+
+	def resolve(self, sessions: int, ttl: int = None):
+		"""
+		The scheme with the highest session_number no greater than sessions, or None
+		if no scheme applies. The cache is reloaded if it is older than ttl seconds,
+		to pick up changes made by other processes.
+		"""
+		with self._lock:
+			if self._schemes is None or (ttl and time.time() - self._loaded_at > ttl):
+				self._schemes, self._thresholds = self._load()
+				self._loaded_at = time.time()
+			schemes, thresholds = self._schemes, self._thresholds
+
+		position = bisect_right(thresholds, sessions)
+		return schemes[position - 1] if position else None
+
+discount_table = DiscountTable()
+
+for mapper_event in ("after_insert", "after_update", "after_delete"):
+	event.listen(Discounts, mapper_event, discount_table.invalidate)
+database_reset.connect(discount_table.invalidate, weak=False)
+
+def discount_for(user_id: int):
+	"""
+	The discount scheme that applies to a user's next payment, or None.
+	"""
+	return discount_table.resolve(session_count(user_id), ttl=current_app.config.get("DISCOUNT_CACHE_TTL"))
@@ -1,20 +1,240 @@
 # vertex/app/public/email.py
 
+import datetime
+import os
+import smtplib
+import threading
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
 from flask_mail import Message
-import config 
-from app.extensions import mail
+from sqlalchemy import select, update, and_, or_
+import config
+from app.extensions import mail, db
+from app.models import EmailOutbox
 
+# A claimed email whose sender hasn't finished with it after this long is assumed
+# to belong to a sender that died, and is claimed again
+STALE_CLAIM = datetime.timedelta(minutes=10)
 
-def send_email(recipient, subject, email_template):
+
+def make_message(recipient, subject, email_template):
     """
-    Sends email to recipient, having a subject and template as entered in arguments.
+    Builds the message for an email to recipient.
     """
-    # Define the email message
-    msg = Message(
+    return Message(
         subject,
         recipients = [recipient],
         html = email_template,
         sender = config.MAIL_DEFAULT_SENDER)
-    
+
+
+def send_email(recipient, subject, email_template):
+    """
+    Sends email to recipient, having a subject and template as entered in arguments.
+    This blocks on the SMTP server, so requests should use queue_email() instead.
+    """
     # Send the email
-    mail.send(msg)
\ No newline at end of file
+    mail.send(make_message(recipient, subject, email_template))
+
+
+def queue_email(recipient, subject, email_template):
+    """
+    Adds an email to the outbox and commits, without talking to the SMTP server.
+    The background sender delivers it shortly after.
+    """
+    db.session.add(EmailOutbox(recipient, subject, email_template))
+    db.session.commit()
+    email_sender.wake(current_app._get_current_object())
+
+
+class EmailSender:
+    """
+    Delivers emails from the outbox in batches, each batch over a single SMTP
+    connection. Failed emails are retried with exponential backoff.
+
+    A background thread drains the outbox whenever an email is queued, and
+    every EMAIL_OUTBOX_POLL_INTERVAL seconds to pick up retries. It is started
+    by the first request a process handles (or the first email queued), so
+    emails left in the outbox by a restart are still sent. `flask send-emails`
+    drains it by hand, e.g. from cron where the app runs without the thread.
+    """
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        """
+        Register the sender with an app.
+        """
+        app.extensions["email_sender"] = self
+
+        if not self.enabled(app):
+            return
+
+        @app.before_request
+        def start_email_sender():
+            # Picks up whatever a previous process left in the outbox
+            if self._thread is None or not self._thread.is_alive():
+                self.wake(app)
+
+    def enabled(self, app):
+        """
+        Whether an app runs the background thread. EMAIL_OUTBOX_WORKER turns it
+        on or off; left as None, it is off when testing, so tests never send
+        real emails.
+        """
+        enabled = app.config.get("EMAIL_OUTBOX_WORKER")
+        if enabled is None:
+            return not (app.testing or "PYTEST_CURRENT_TEST" in os.environ)
+        return enabled
+
+    def wake(self, app):
+        """
+        Ask the background thread to drain the outbox, starting it if needed.
+        """
+        if not self.enabled(app):
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, args=(app,), name="email-sender", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self):
+        """
+        Stop the background thread, letting it finish the batch it is sending.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join()
+
+    def _run(self, app):
+        while True:
+            self._wakeup.wait(app.config["EMAIL_OUTBOX_POLL_INTERVAL"])
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            with app.app_context():
+                try:
+                    self.drain_all()
+                except Exception:
+                    app.logger.exception("Email sender failed to drain the outbox")
+
+    def drain_all(self):
+        """
+        Send batches until no due emails are left. Returns (sent, failed) in total.
+        """
+        batch_size = current_app.config["EMAIL_OUTBOX_BATCH_SIZE"]
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = self.drain(batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < batch_size:
+                return total_sent, total_failed
+
+    def drain(self, batch_size=None):
+        """
+        Claim one batch of due emails and send it over one SMTP connection.
+        Returns (sent, failed), where failed emails may still be retried later.
+        """
+        if batch_size is None:
+            batch_size = current_app.config["EMAIL_OUTBOX_BATCH_SIZE"]
+
+        now = datetime.datetime.now()
+        batch = self._claim(batch_size, now)
+        if not batch:
+            return 0, 0
+
+        sent = failed = 0
+        try:
+            with mail.connect() as connection:
+                for email in batch:
+                    try:
+                        connection.send(make_message(email.recipient, email.subject, email.html))
+                    except (smtplib.SMTPException, OSError) as e:
+                        self._failed(email, e, now)
+                        failed += 1
+                        continue
+                    email.status = "sent"
+                    email.sent_at = datetime.datetime.now()
+                    sent += 1
+        except (smtplib.SMTPException, OSError) as e:
+            # Couldn't connect (or the connection dropped): retry whatever wasn't sent
+            for email in batch:
+                if email.status == "sending":
+                    self._failed(email, e, now)
+                    failed += 1
+
+        db.session.commit()
+        if sent or failed:
+            current_app.logger.info(f"Email sender: sent {sent}, failed {failed}")
+        return sent, failed
+
+    def _claim(self, batch_size, now):
+        """
+        Mark up to batch_size due emails as ours and return them.
+        """
+        due = or_(
+            and_(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == "sending", EmailOutbox.claimed_at < now - STALE_CLAIM),
+        )
+        ids = db.session.execute(
+            select(EmailOutbox.id).where(due).order_by(EmailOutbox.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return []
+
+        # Only rows still due are claimed, so a sender running in another process
+        # that picked the same ids gets whichever of them we didn't
+        claim = uuid.uuid4().hex
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids), due)
+            .values(status="sending", claim=claim, claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        return db.session.execute(
+            select(EmailOutbox).where(EmailOutbox.claim == claim, EmailOutbox.status == "sending").order_by(EmailOutbox.id)
+        ).scalars().all()
+
+    def _failed(self, email, error, now):
+        """
+        Record a failed attempt, and schedule a retry unless out of attempts.
+        """
+        email.attempts += 1
+        email.last_error = repr(error)[:255]
+        if email.attempts >= current_app.config["EMAIL_OUTBOX_MAX_ATTEMPTS"]:
+            email.status = "failed"
+            current_app.logger.warning(f"Giving up on email {email.id} to {email.recipient}: {email.last_error}")
+            return
+
+        delay = current_app.config["EMAIL_OUTBOX_RETRY_DELAY"] * 2 ** (email.attempts - 1)
+        email.status = "pending"
+        email.next_attempt_at = now + datetime.timedelta(seconds=delay)
+
+
+email_sender = EmailSender()
+
+
+@click.command("send-emails")
+@with_appcontext
+def send_emails_command():
+    """
+    Send every email in the outbox that is due.
+    """
+    sent, failed = email_sender.drain_all()
+    click.echo(f"Sent {sent} emails, {failed} failed")
@@ -9,6 +9,15 @@ from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
 import os
 from flask_mail import Mail
+from flask_migrate import Migrate
+
+from .cache import LRUCache, DiskCache
+from .hashing import HashingService
+from .profiling import QueryProfiler
+from .metrics import Metrics
+from .sqlite import SQLiteProfile
+from .postgres import PostgresProfile
+from .routing import RoutingSession, ReplicaRouter
 
 bundles = {
 	'js_all': Bundle(
@@ -27,8 +36,21 @@ stripe_keys = {
 
 
 
-db = SQLAlchemy()
+# Read-only views read from the replica bind, when there is one (see app/routing.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 assets = Environment()
 csrf = CSRFProtect()
 login = LoginManager()
-mail = Mail()
\ No newline at end of file
+mail = Mail()
+# Migrations live in vertex/migrations, wherever flask is run from. Batch mode lets
+# Alembic alter SQLite tables (by copying them), which SQLite can't do in place.
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations"), render_as_batch=True)
+plot_cache = LRUCache(config_prefix="PLOT_CACHE")
+receipt_cache = LRUCache(config_prefix="RECEIPT_CACHE")
+receipt_disk_cache = DiskCache(config_prefix="RECEIPT_DISK_CACHE")
+hashing = HashingService()
+query_profiler = QueryProfiler()
+metrics = Metrics()
+sqlite_profile = SQLiteProfile()
+postgres_profile = PostgresProfile()
+replica_router = ReplicaRouter()
@@ -0,0 +1,166 @@
+# vertex/app/hashing.py
+"""
+Password hashing service.
+
+Argon2 is deliberately slow and memory hungry, so hashing is run on a bounded
+pool of worker threads (argon2-cffi releases the GIL while hashing). At most
+HASHING_WORKERS hashes run at once, and at most HASHING_MAX_QUEUE more may wait
+for a worker. Past that, HashingBusyError is raised and the request gets a 503,
+instead of every worker piling onto the CPU during a login storm.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import statistics
+import threading
+import time
+
+from flask import render_template
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+
+class HashingBusyError(RuntimeError):
+	"""
+	Raised when the hashing pool and its queue are full.
+	"""
+
+class HashingService:
+	"""
+	Runs Argon2 hashing and verification on a bounded thread pool, and keeps
+	metrics on hash latency and queue wait. Works with or without init_app.
+	"""
+	SAMPLES = 1000 # Recent timings kept for the metrics percentiles
+
+	def __init__(self, hasher: PasswordHasher = None, max_workers: int = None, max_queue: int = 32):
+		self.hasher = hasher or PasswordHasher()
+		self.max_workers = max_workers or os.cpu_count() or 1
+		self.max_queue = max_queue
+
+		self._lock = threading.Lock()
+		self._executor = None
+		self._in_flight = 0
+		self._completed = 0
+		self._rejected = 0
+		self._waits = deque(maxlen=self.SAMPLES)
+		self._latencies = deque(maxlen=self.SAMPLES)
+
+	def init_app(self, app):
+		"""
+		Configure the pool from HASHING_WORKERS and HASHING_MAX_QUEUE, and turn
+		HashingBusyError into a 503.
+		"""
+		app.extensions["hashing"] = self
+		with self._lock:
+			self.max_workers = app.config.get("HASHING_WORKERS") or os.cpu_count() or 1
+			self.max_queue = app.config.get("HASHING_MAX_QUEUE", self.max_queue)
+			if self._executor is not None:
+				self._executor.shutdown(wait=False)
+				self._executor = None
+
+		def busy(e):
+			"""
+			Error handler for when too many passwords are being hashed at once.
+			"""
+			return render_template("custom_error_page.html", name="Too busy, please try again"), 503, {"Retry-After": "1"}
+
+		app.register_error_handler(HashingBusyError, busy)
+
+	def hash(self, password: str):
+		"""
+		Hash a password with Argon2id.
+		"""
+		return self._call(self.hasher.hash, password)
+
+	def hash_many(self, passwords):
+		"""
+		Hash several passwords at once, spread over the pool's workers. Returns the
+		hashes in the same order.
+		"""
+		futures = [self._submit(self.hasher.hash, password) for password in passwords]
+		return [future.result() for future in futures]
+
+	def verify(self, hash: str, password: str):
+		"""
+		Returns True if password matches hash, False otherwise.
+		"""
+		try:
+			return self._call(self.hasher.verify, hash, password)
+		except VerifyMismatchError:
+			return False
+
+	def check_needs_rehash(self, hash: str):
+		"""
+		Returns True if hash was made with outdated parameters. Cheap, so not pooled.
+		"""
+		return self.hasher.check_needs_rehash(hash)
+
+	def _call(self, fn, *args):
+		"""
+		Run fn(*args) on the pool and wait for the result.
+		"""
+		return self._submit(fn, *args).result()
+
+	def _submit(self, fn, *args):
+		"""
+		Queue fn(*args) on the pool, returning a future.
+		"""
+		with self._lock:
+			if self._in_flight >= self.max_workers + self.max_queue:
+				self._rejected += 1
+				raise HashingBusyError("Too many passwords are being hashed right now")
+			self._in_flight += 1
+			if self._executor is None:
+				self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hashing")
+			executor = self._executor
+
+		try:
+			return executor.submit(self._timed, fn, time.perf_counter(), *args)
+		except RuntimeError: # Pool shut down by init_app in the meantime
+			with self._lock:
+				self._in_flight -= 1
+			raise
+
+	def _timed(self, fn, submitted, *args):
+		started = time.perf_counter()
+		try:
+			return fn(*args)
+		finally:
+			finished = time.perf_counter()
+			with self._lock:
+				self._in_flight -= 1
+				self._completed += 1
+				self._waits.append(started - submitted)
+				self._latencies.append(finished - started)
+
+	def metrics(self):
+		"""
+		Returns a dictionary of pool metrics. Timings are in seconds, over the
+		most recent SAMPLES hashes.
+		"""
+		with self._lock:
+			waits = sorted(self._waits)
+			latencies = sorted(self._latencies)
+			metrics = {
+				"workers": self.max_workers,
+				"max_queue": self.max_queue,
+				"in_flight": self._in_flight,
+				"queued": max(0, self._in_flight - self.max_workers),
+				"completed": self._completed,
+				"rejected": self._rejected,
+			}
+		metrics["queue_wait"] = _summary(waits)
+		metrics["hash_latency"] = _summary(latencies)
+		return metrics
+
+def _summary(samples):
+	"""
+	Median, 95th percentile and maximum of a sorted list of timings.
+	"""
+	if not samples:
+		return {"p50": None, "p95": None, "max": None}
+	return {
+		"p50": statistics.median(samples),
+		"p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+		"max": samples[-1],
+	}
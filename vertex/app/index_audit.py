@@ -0,0 +1,124 @@
+# vertex/app/index_audit.py
+"""
+Index audit. Runs EXPLAIN QUERY PLAN over the queries on the app's hot paths
+and flags any that scan a whole table instead of using an index.
+
+Run from the vertex directory:
+	flask index-audit
+"""
+
+import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+
+from .user_search import user_search_query
+from .discounts import session_count_query
+from .models import (
+	db,
+	Users,
+	Classes,
+	ClassBookings,
+	FacilityBookings,
+	ActiveMemberships,
+	EmailOutbox,
+	ReportJobs,
+	FacilityDailyTotals,
+	ClassDailyTotals,
+)
+
+def hot_queries():
+	"""
+	Returns (name, statement) pairs for the queries the app runs most. The
+	parameter values don't matter, only the shape of each query.
+	"""
+	today = datetime.date.today()
+	return [
+		("user by email", select(Users).where(Users.email == "john@doe.com")),
+		("users by type", select(Users).where(Users.user_type == "employee")),
+		("user search", user_search_query("jo")),
+		("class bookings of a user", select(ClassBookings).where(ClassBookings.user_id == 1)),
+		("bookings of a class", select(func.count(ClassBookings.id)).where(ClassBookings.class_id == 1)),
+		("facility bookings of a user", select(FacilityBookings).where(FacilityBookings.user_id == 1)),
+		("facility bookings on a day", select(FacilityBookings).where(FacilityBookings.facility_id == 1, FacilityBookings.date == today)),
+		("facility totals since a date", select(FacilityDailyTotals.facility_id, func.sum(FacilityDailyTotals.bookings))
+			.where(FacilityDailyTotals.date > today).group_by(FacilityDailyTotals.facility_id)),
+		("activity totals of a facility", select(FacilityDailyTotals.activity, func.sum(FacilityDailyTotals.bookings))
+			.where(FacilityDailyTotals.facility_id == 1, FacilityDailyTotals.date > today).group_by(FacilityDailyTotals.activity)),
+		("class revenue since a date", select(ClassDailyTotals.name, func.sum(ClassDailyTotals.revenue))
+			.where(ClassDailyTotals.date > today).group_by(ClassDailyTotals.name)),
+		("classes from a date", select(Classes).where(Classes.date >= today)),
+		("class listing page", select(Classes).where(Classes.date >= today)
+			.order_by(Classes.date, Classes.start, Classes.id).limit(100)),
+		("classes by name", select(Classes).where(Classes.name == "Yoga")),
+		("memberships of a user", select(ActiveMemberships).where(ActiveMemberships.user_id == 1)),
+		("sessions in the next two weeks", session_count_query(1)),
+		("due emails", select(EmailOutbox.id).where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= datetime.datetime.now())),
+		("recent reports of a kind", select(ReportJobs).where(ReportJobs.kind == "sales", ReportJobs.created_at >= datetime.datetime.now())
+			.order_by(ReportJobs.created_at.desc()).limit(1)),
+		("pending reports", select(ReportJobs.id).where(ReportJobs.status == "pending").order_by(ReportJobs.created_at).limit(1)),
+	]
+
+def explain(statement):
+	"""
+	Returns the lines of SQLite's query plan for a statement.
+	"""
+	dialect = db.engine.dialect
+	compiled = statement.compile(dialect=dialect)
+
+	# Convert values the way SQLAlchemy would (e.g. times to strings), since the
+	# statement is run as raw SQL
+	params = []
+	for name in compiled.positiontup:
+		value = compiled.params[name]
+		process = compiled.binds[name].type.dialect_impl(dialect).bind_processor(dialect)
+		params.append(process(value) if process else value)
+
+	rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), tuple(params))
+	return [row[-1] for row in rows]
+
+def is_full_scan(line: str):
+	"""
+	True for a plan line that reads every row of a table.
+	"""
+	# "SCAN users" is a full scan; "SCAN users USING INDEX ..." walks an index
+	# instead, and "SCAN anon_1" reads back a subquery's rows rather than a table
+	words = line.split()
+	return words[0] == "SCAN" and words[1] in db.metadata.tables and "INDEX" not in line
+
+def audit():
+	"""
+	Returns (name, plan lines, flagged) for every hot query. Queries that can't
+	run are flagged, with the error as their plan.
+	"""
+	results = []
+	for name, statement in hot_queries():
+		try:
+			plan = explain(statement)
+		except OperationalError as e: # E.g. a table the database hasn't been migrated to have yet
+			results.append((name, [str(e.orig)], True))
+			continue
+		results.append((name, plan, any(is_full_scan(line) for line in plan)))
+	return results
+
+@click.command("index-audit")
+@with_appcontext
+def index_audit_command():
+	"""
+	Flag hot queries that do full table scans.
+	"""
+	if db.engine.dialect.name != "sqlite":
+		raise click.ClickException("index-audit reads SQLite query plans, and this database is " + db.engine.dialect.name)
+
+	flagged = 0
+	for name, plan, full_scan in audit():
+		flagged += full_scan
+		click.echo(("FULL SCAN  " if full_scan else "ok         ") + name)
+		for line in plan:
+			click.echo("           " + line)
+
+	if flagged:
+		raise click.ClickException(f"{flagged} queries do full table scans")
+	click.echo("No full table scans")
@@ -0,0 +1,235 @@
+# vertex/app/metrics.py
+"""
+Application metrics in the Prometheus text format, served at /metrics.
+
+Counters and histograms are sharded per thread: each thread only ever writes
+to its own shard, so recording needs no locks, and a scrape adds the shards up.
+Shards of threads that have exited are folded into a retired total, so
+thread-per-request servers don't accumulate them.
+
+Gauges whose value lives elsewhere (the email outbox, report jobs, the database
+pool, the hashing pool) are read by collector functions when scraped.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+import time
+
+from flask import g, request
+
+# Request latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels, extra: str = ""):
+	parts = [f'{name}="{_escape(value)}"' for name, value in labels] + ([extra] if extra else [])
+	return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value):
+	return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Shard:
+	"""
+	One thread's counters and histograms.
+	"""
+	def __init__(self, buckets: int):
+		self.thread = threading.current_thread()
+		self.counters = defaultdict(float)
+		# (name, labels) -> [count per bucket, ..., count over the last bucket, sum]
+		self.histograms = defaultdict(lambda: [0] * (buckets + 2))
+
+class Metrics:
+	"""
+	Registry of counters, gauges and histograms. Works with or without init_app;
+	init_app also times every request and registers the app's own gauges.
+	"""
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		self.buckets = tuple(buckets)
+		self._local = threading.local()
+		self._lock = threading.Lock() # Only taken to add a shard, and when scraping
+		self._shards = []
+		self._retired = _Shard(len(self.buckets))
+		self._descriptions = {}
+		self._collectors = []
+
+	def describe(self, name: str, type: str, help: str):
+		"""
+		Set the type (counter, gauge or histogram) and help text of a metric.
+		"""
+		self._descriptions[name] = (type, help)
+
+	def collector(self, func):
+		"""
+		Register a function returning (name, labels dict, value) gauge samples,
+		called on every scrape.
+		"""
+		self._collectors.append(func)
+		return func
+
+	def _shard(self):
+		shard = getattr(self._local, "shard", None)
+		if shard is None:
+			shard = self._local.shard = _Shard(len(self.buckets))
+			with self._lock:
+				self._shards.append(shard)
+		return shard
+
+	def inc(self, name: str, amount: float = 1, **labels):
+		"""
+		Add amount to a counter (or gauge, if amount can be negative).
+		"""
+		self._shard().counters[(name, tuple(sorted(labels.items())))] += amount
+
+	def observe(self, name: str, value: float, **labels):
+		"""
+		Record a value in a histogram.
+		"""
+		counts = self._shard().histograms[(name, tuple(sorted(labels.items())))]
+		counts[bisect_left(self.buckets, value)] += 1
+		counts[-1] += value
+
+	def _totals(self):
+		"""
+		Sum every shard, retiring the shards of threads that have exited.
+		"""
+		with self._lock:
+			live = []
+			for shard in self._shards:
+				if shard.thread.is_alive():
+					live.append(shard)
+				else:
+					self._merge(self._retired, shard)
+			self._shards = live
+
+			totals = _Shard(len(self.buckets))
+			for shard in [self._retired] + live:
+				self._merge(totals, shard)
+		return totals
+
+	@staticmethod
+	def _merge(into: _Shard, shard: _Shard):
+		# Copy first: the owning thread may add keys while we read
+		for key, value in dict(shard.counters).items():
+			into.counters[key] += value
+		for key, counts in dict(shard.histograms).items():
+			merged = into.histograms[key]
+			for i, count in enumerate(list(counts)):
+				merged[i] += count
+
+	def render(self):
+		"""
+		Returns every metric in the Prometheus text exposition format.
+		"""
+		totals = self._totals()
+		samples = defaultdict(list)
+
+		for (name, labels), value in sorted(totals.counters.items()):
+			samples[name].append(f"{name}{_labels(labels)} {_number(value)}")
+
+		for (name, labels), counts in sorted(totals.histograms.items()):
+			cumulative = 0
+			for bound, count in zip(self.buckets + ("+Inf",), counts):
+				cumulative += count
+				le = 'le="' + (_number(bound) if bound != "+Inf" else bound) + '"'
+				samples[name].append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+			samples[name].append(f"{name}_sum{_labels(labels)} {_number(counts[-1])}")
+			samples[name].append(f"{name}_count{_labels(labels)} {cumulative}")
+
+		for collect in self._collectors:
+			for name, labels, value in collect():
+				if value is not None:
+					samples[name].append(f"{name}{_labels(sorted(labels.items()))} {_number(value)}")
+
+		lines = []
+		for name in sorted(samples):
+			if name in self._descriptions:
+				type, help = self._descriptions[name]
+				lines.append(f"# HELP {name} {help}")
+				lines.append(f"# TYPE {name} {type}")
+			lines.extend(samples[name])
+		return "\n".join(lines) + "\n"
+
+	def init_app(self, app):
+		"""
+		Time every request, and register the request, booking, payment, email,
+		database pool and hashing metrics.
+		"""
+		app.extensions["metrics"] = self
+		if not app.config.get("METRICS_ENABLED", True):
+			return
+
+		self.describe("vertex_http_request_duration_seconds", "histogram", "Time to handle a request, by endpoint.")
+		self.describe("vertex_http_requests_total", "counter", "Requests handled, by endpoint and status.")
+		self.describe("vertex_http_requests_in_flight", "gauge", "Requests being handled.")
+		self.describe("vertex_bookings_created_total", "counter", "Class and facility bookings made. Use rate() for bookings per minute.")
+		self.describe("vertex_payment_attempts_total", "counter", "Stripe charges attempted, by outcome.")
+		self.describe("vertex_receipt_cache_total", "counter", "PDF receipts downloaded, by where they were found.")
+		self.describe("vertex_catalogue_cache_total", "counter", "Class and facility listings served, by catalogue and whether they were cached.")
+		self.describe("vertex_email_outbox", "gauge", "Emails in the outbox, by status.")
+		self.describe("vertex_report_jobs", "gauge", "PDF report jobs, by status.")
+		self.describe("vertex_db_pool_connections", "gauge", "Database pool connections, by database and state.")
+		self.describe("vertex_hashing", "gauge", "Password hashing pool state and recent timings in seconds.")
+
+		app.before_request(self._start)
+		app.after_request(self._status)
+		app.teardown_request(self._finish)
+
+		if not self._collectors:
+			# Imported here, as these modules import the extensions module
+			from .extensions import db, hashing
+			from .models import EmailOutbox, ReportJobs
+			from sqlalchemy import select, func
+
+			@self.collector
+			def email_outbox():
+				rows = db.session.execute(select(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status))
+				counts = {"pending": 0, "sending": 0, "failed": 0, **dict(rows.all())}
+				return [("vertex_email_outbox", {"status": status}, count) for status, count in counts.items()]
+
+			@self.collector
+			def report_jobs():
+				rows = db.session.execute(select(ReportJobs.status, func.count(ReportJobs.id)).group_by(ReportJobs.status))
+				counts = {"pending": 0, "running": 0, "done": 0, "failed": 0, **dict(rows.all())}
+				return [("vertex_report_jobs", {"status": status}, count) for status, count in counts.items()]
+
+			@self.collector
+			def db_pool():
+				states = {"size": "size", "checked_in": "checkedin", "checked_out": "checkedout", "overflow": "overflow"}
+				samples = []
+				# One set per database, "main" or the replica's bind key
+				for bind, engine in db.engines.items():
+					pool = engine.pool
+					# Not every pool class (e.g. SQLite's in-memory pools) keeps these counts
+					samples.extend(("vertex_db_pool_connections", {"bind": bind or "main", "state": state}, getattr(pool, method)())
+						for state, method in states.items() if hasattr(pool, method))
+				return samples
+
+			@self.collector
+			def hashing_pool():
+				stats = hashing.metrics()
+				samples = [("vertex_hashing", {"stat": stat}, stats[stat]) for stat in ("workers", "in_flight", "queued", "completed", "rejected")]
+				for timing in ("queue_wait", "hash_latency"):
+					for quantile, value in stats[timing].items():
+						samples.append(("vertex_hashing", {"stat": timing, "quantile": quantile}, value))
+				return samples
+
+	def _start(self):
+		g.metrics_start = time.perf_counter()
+		self.inc("vertex_http_requests_in_flight")
+
+	def _status(self, response):
+		g.metrics_status = response.status_code
+		return response
+
+	def _finish(self, exception=None):
+		start = g.pop("metrics_start", None)
+		if start is None:
+			return
+		endpoint = request.endpoint or "unmatched" # One label for every 404, not one per URL
+		status = g.pop("metrics_status", 500)
+		self.inc("vertex_http_requests_in_flight", -1)
+		self.inc("vertex_http_requests_total", endpoint=endpoint, method=request.method, status=status)
+		self.observe("vertex_http_request_duration_seconds", time.perf_counter() - start, endpoint=endpoint, method=request.method)
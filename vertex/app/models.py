@@ -3,13 +3,20 @@
 from __future__ import annotations # Must stay at start of file
 
 import datetime
+import warnings
 
 from sqlalchemy import (
 	ForeignKey,
 	String,
 	Boolean,
 	Integer,
+	Text,
+	LargeBinary,
+	Index,
+	JSON,
 	select,
+	insert,
+	func,
 )
 
 from sqlalchemy.orm import (
@@ -18,17 +25,16 @@ from sqlalchemy.orm import (
 	relationship,
 )
 
-from sqlalchemy.dialects.mysql import JSON
+from sqlalchemy.dialects.postgresql import JSONB
 
 from flask_login import UserMixin, login_manager
 
 from typing import List
 from sqlalchemy_json import mutable_json_type
 
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
+from blinker import Namespace
 
-from .extensions import db, login
+from .extensions import db, login, hashing
 
 """
 Cheat sheet on password hashing:
@@ -39,90 +45,132 @@ https://pypi.org/project/argon2-cffi/
 https://argon2-cffi.readthedocs.io/en/stable/api.html
 """
 
+# JSON on every database, stored as binary JSONB on PostgreSQL
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 @login.user_loader
 def load_user(id):
 	return Users.query.where(Users.id == id).first()
 
-ph = PasswordHasher() # Password hasher from Argon2
+# Signal sent after the database is reset, so in-memory caches can be dropped
+signals = Namespace()
+database_reset = signals.signal("database-reset")
 
 def reset_database():
 	"""
 	Reset the database to empty. Useful for testing.
 	"""
-	db.reflect()
-	db.drop_all()
-	db.create_all()
+	# End the session's transaction first, as PostgreSQL won't drop tables it has read
+	db.session.close()
+	# Only the main database. A replica (see app/routing.py) gets its data from it
+	with warnings.catch_warnings():
+		# Indexes on expressions, like lower(email) on users, can't be reflected,
+		# but are dropped with their tables anyway
+		warnings.filterwarnings("ignore", "Skipped unsupported reflection of expression-based index")
+		db.reflect(bind_key=None)
+	db.drop_all(bind_key=None)
+	db.create_all(bind_key=None)
+	database_reset.send()
+
+# Hashes of the fixture users' passwords, computed once per process. Argon2 is
+# slow on purpose, and tests repopulate the database dozens of times.
+_fixture_hashes = {}
+
+def fixture_hashes(passwords):
+	"""
+	Returns a dictionary of password -> hash. Passwords not hashed before are
+	hashed together on the hashing pool.
+	"""
+	missing = sorted(set(passwords) - set(_fixture_hashes))
+	_fixture_hashes.update(zip(missing, hashing.hash_many(missing)))
+	return {password: _fixture_hashes[password] for password in passwords}
+
+def bulk_insert(model, rows, batch_size: int = 10000):
+	"""
+	Insert rows (dictionaries of column values) with one executemany per batch,
+	without committing. Column defaults still apply, but ORM events don't fire.
+	Returns the number of rows inserted.
+	"""
+	count = 0
+	batch = []
+	for row in rows:
+		batch.append(row)
+		if len(batch) == batch_size:
+			db.session.execute(insert(model), batch)
+			count += len(batch)
+			batch = []
+	if batch:
+		db.session.execute(insert(model), batch)
+		count += len(batch)
+	return count
 
 def populate_database():
 	"""
 	Populate the database with some default values. Useful for testing.
+	Everything is bulk inserted in one transaction.
 
 	NOTE: Be wary of changing any of the default values. Tests may rely on them.
 	"""
 	if not db.session.execute(select(Users)).first(): # Only populate if Users is empty
+		def user(email, password, firstname, lastname, date_of_birth, user_type="user", is_member=False, **extra):
+			return dict(email=email, password=password, firstname=firstname, lastname=lastname, date_of_birth=date_of_birth, user_type=user_type, is_member=is_member, **extra)
+
 		users = [
-			Users("john@doe.com", "Lemonade!1", "John", "Doe", datetime.date(1990, 1, 1), user_type="user", is_member=False), # User
-			Users("alice@doe.com", "Lemonade!1", "Alice", "Doe", datetime.date(2000, 5, 12), user_type="user", is_member=False), # User
-			Users("rick@jordan.com", "Lemonade!1", "Rick", "Jordan", datetime.date(1990, 1, 1), user_type="manager", is_member=False), # Admin
-			Users("lily@poole.com", "Lemonade!1", "Lily", "Poole", datetime.date(1995, 2, 8), user_type="employee", is_member=False), # Non-admin
+			user("john@doe.com", "Lemonade!1", "John", "Doe", datetime.date(1990, 1, 1), user_type="user", is_member=False), # User
+			user("alice@doe.com", "Lemonade!1", "Alice", "Doe", datetime.date(2000, 5, 12), user_type="user", is_member=False), # User
+			user("rick@jordan.com", "Lemonade!1", "Rick", "Jordan", datetime.date(1990, 1, 1), user_type="manager", is_member=False), # Admin
+			user("lily@poole.com", "Lemonade!1", "Lily", "Poole", datetime.date(1995, 2, 8), user_type="employee", is_member=False), # Non-admin
 
 			# User to test views for a customer who is already a member
-			Users(email='member@email.com', password='Member12345', firstname='Member',lastname='User',date_of_birth=datetime.date(1992, 1, 1),user_type='user',is_member=True),
+			user(email='member@email.com', password='Member12345', firstname='Member',lastname='User',date_of_birth=datetime.date(1992, 1, 1),user_type='user',is_member=True),
+
+			# Users to test email confirmation tokens, in the order they have always
+			# been added in, so they keep their IDs
+			user("expiredtokenuser@email.com", "expiredtokenuser", "Expiredtoken", "User", datetime.date(1990, 4, 4), is_confirmed=False, confirmed_on=None),
+			user("invalidtokenuser@email.com", "invalidtokenuser", "Invalidtoken", "User", datetime.date(1990, 5, 5), is_confirmed=False, confirmed_on=None),
+			user("confirmeduser@email.com", "confirmeduser", "Confirmed", "User", datetime.date(1990, 2, 2), is_confirmed=True, confirmed_on=datetime.date(2023, 2, 2)),
 		]
 
+		# Users sharing a password share its hash
+		hashes = fixture_hashes([u["password"] for u in users])
 		for u in users:
-			db.session.add(u)
-
-		# User to test invalid email confirmation token
-		invalidtokenuser = Users(email="invalidtokenuser@email.com", password="invalidtokenuser", firstname="Invalidtoken", lastname="User", date_of_birth=datetime.date(1990, 5, 5), user_type="user", is_member = False)
-		invalidtokenuser.is_confirmed = False
-		invalidtokenuser.confirmed_on = None
+			u["password"] = hashes[u["password"]]
 
-		confirmed_user = Users(email="confirmeduser@email.com", password="confirmeduser", firstname="Confirmed", lastname="User", date_of_birth=datetime.date(1990, 2, 2), user_type="user")
-		confirmed_user.is_confirmed = True
-		confirmed_user.confirmed_on = datetime.date(2023, 2, 2)
-
-		expired_token_user = Users(email="expiredtokenuser@email.com", password="expiredtokenuser", firstname="Expiredtoken", lastname="User", date_of_birth=datetime.date(1990, 4, 4), user_type="user")
-		expired_token_user.is_confirmed = False
-		expired_token_user.confirmed_on = None
-		
-		db.session.add(expired_token_user)
-		db.session.add(invalidtokenuser)
-		db.session.add(confirmed_user)
+		bulk_insert(Users, users)
 	
 	if not db.session.execute(select(TeamEvents)).first(): # Only populate if TeamEvents is empty
-		team_events = [ 
+		bulk_insert(TeamEvents, [
 			# Swimming at 8am for 2 hours every Friday
-			TeamEvents("Swimming", datetime.time(8), 2, "Friday"),
-			TeamEvents("Swimming", datetime.time(8), 2, "Sunday"),
-			TeamEvents("Sports hall", datetime.time(7), 2, "Thursday"),
-			TeamEvents("Sports hall", datetime.time(9), 2, "Saturday")
-		]
-
-		for t in team_events:
-			db.session.add(t)
+			dict(name="Swimming", start=datetime.time(8), duration=2, day="Friday"),
+			dict(name="Swimming", start=datetime.time(8), duration=2, day="Sunday"),
+			dict(name="Sports hall", start=datetime.time(7), duration=2, day="Thursday"),
+			dict(name="Sports hall", start=datetime.time(9), duration=2, day="Saturday"),
+		])
 	
 	today = datetime.date.today()
 	start_date = today + datetime.timedelta(days=(7 - today.weekday()))
 
 	if not db.session.execute(select(Classes)).first():
-		# Add 10 weeks of classes 
-		for i in range(0, 10):
-			# Number of days to add on from original set of classes
-			delta = datetime.timedelta(days=7*i)
-
-			# Pilates every Monday from start_date
-			db.session.add(Classes("Pilates", datetime.time(18), 1, start_date + delta, price=25))
-			# Aerobics every Tuesday from start_date
-			db.session.add(Classes("Aerobics", datetime.time(10), 1, start_date + datetime.timedelta(days=1) + delta, price=20))
-			# Aerobics every Thursday from start_date
-			db.session.add(Classes("Aerobics", datetime.time(19), 1, start_date + datetime.timedelta(days=3) + delta, price=20))
-			# Aerobics every Saturday from start_date
-			db.session.add(Classes("Aerobics", datetime.time(10), 1, start_date + datetime.timedelta(days=5) + delta, price=20))
-			# Yoga every Friday from start_date
-			db.session.add(Classes("Yoga", datetime.time(19), 1, start_date + datetime.timedelta(days=4) + delta, price=10))
-			# Yoga every Sunday from start_date
-			db.session.add(Classes("Yoga", datetime.time(9), 1, start_date + datetime.timedelta(days=6) + delta, price=10))
+		def weekly_classes():
+			# Add 10 weeks of classes 
+			for i in range(0, 10):
+				# Number of days to add on from original set of classes
+				delta = datetime.timedelta(days=7*i)
+
+				# Pilates every Monday from start_date
+				yield dict(name="Pilates", start=datetime.time(18), duration=1, date=start_date + delta, price=25)
+				# Aerobics every Tuesday from start_date
+				yield dict(name="Aerobics", start=datetime.time(10), duration=1, date=start_date + datetime.timedelta(days=1) + delta, price=20)
+				# Aerobics every Thursday from start_date
+				yield dict(name="Aerobics", start=datetime.time(19), duration=1, date=start_date + datetime.timedelta(days=3) + delta, price=20)
+				# Aerobics every Saturday from start_date
+				yield dict(name="Aerobics", start=datetime.time(10), duration=1, date=start_date + datetime.timedelta(days=5) + delta, price=20)
+				# Yoga every Friday from start_date
+				yield dict(name="Yoga", start=datetime.time(19), duration=1, date=start_date + datetime.timedelta(days=4) + delta, price=10)
+				# Yoga every Sunday from start_date
+				yield dict(name="Yoga", start=datetime.time(9), duration=1, date=start_date + datetime.timedelta(days=6) + delta, price=10)
+
+		bulk_insert(Classes, weekly_classes())
 
 	
 	if not db.session.execute(select(Facilities)).first(): # Only populate if Facilities is empty
@@ -134,7 +182,6 @@ def populate_database():
 			"ACTIVITY NAME": ACTIVITY_PRICE,
 		}
 		"""
-  
 		initialPrices = {
 			"Swimming pool": {
 				"general use": 5,
@@ -163,42 +210,45 @@ def populate_database():
 			}
 		}
 		
-		facilities = [
+		def facility(name, capacity, open=datetime.time(8), close=datetime.time(22), session_duration=0, activities={}):
+			return dict(name=name, capacity=capacity, open=open, close=close, session_duration=session_duration, activities=activities)
+
+		bulk_insert(Facilities, [
 			# Swimming pool with a capacity of 30, open from 8am to 8pm, no sessions
-			Facilities("Swimming pool", 30, datetime.time(8), datetime.time(20), activities=initialPrices["Swimming pool"]),
+			facility("Swimming pool", 30, datetime.time(8), datetime.time(20), activities=initialPrices["Swimming pool"]),
 			# Fitness room with a capacity of 35, open for gym opening times, no sessions
-			Facilities("Fitness room", 35, activities=initialPrices["Fitness room"]),
+			facility("Fitness room", 35, activities=initialPrices["Fitness room"]),
 			# Squash court 1 with a capacity of 4, open for gym opening times, sessions of an hour
-			Facilities("Squash court 1", 4, session_duration = 1, activities=initialPrices["Squash court 1"]),
-			Facilities("Squash court 2", 4, session_duration = 1, activities=initialPrices["Squash court 2"]),
-			Facilities("Sports hall", 45, session_duration = 1, activities=initialPrices["Sports hall"]),
-			Facilities("Climbing wall", 22, datetime.time(10), datetime.time(20), activities=initialPrices["Climbing wall"]),
-			Facilities("Studio", 25, activities=initialPrices["Studio"])
-		]
-
-
-		for f in facilities:
-			db.session.add(f)
+			facility("Squash court 1", 4, session_duration = 1, activities=initialPrices["Squash court 1"]),
+			facility("Squash court 2", 4, session_duration = 1, activities=initialPrices["Squash court 2"]),
+			facility("Sports hall", 45, session_duration = 1, activities=initialPrices["Sports hall"]),
+			facility("Climbing wall", 22, datetime.time(10), datetime.time(20), activities=initialPrices["Climbing wall"]),
+			facility("Studio", 25, activities=initialPrices["Studio"]),
+		])
 
 	if not db.session.execute(select(Memberships)).first(): # Only populate if Memberships is empty
-		db.session.add(Memberships(name= "The Monthly Membership", price= 35, months=1))
-		db.session.add(Memberships(name= "The Annual Membership", price= 300, months=12))
+		bulk_insert(Memberships, [
+			dict(name= "The Monthly Membership", price= 35, months=1),
+			dict(name= "The Annual Membership", price= 300, months=12),
+		])
 
-	already_member = Users.query.where(Users.email=='member@email.com').first()
-	existing_membership = Memberships.query.first()
+	already_member = db.session.execute(select(Users.id).where(Users.email=='member@email.com')).scalar()
+	existing_membership = db.session.execute(select(Memberships.id).order_by(Memberships.id)).scalar()
 	if not db.session.execute(select(ActiveMemberships)).first(): # Only populate if ActiveMemberships is empty
-		activememberships = [
-			ActiveMemberships(user_id=already_member.id, membership_id= existing_membership.id, member_from=datetime.date(2023, 3, 10),member_till=datetime.date(2024, 3, 10))
-		]
-
-		for m in activememberships:
-			db.session.add(m)
+		bulk_insert(ActiveMemberships, [
+			dict(user_id=already_member, membership_id= existing_membership, member_from=datetime.date(2023, 3, 10),member_till=datetime.date(2024, 3, 10)),
+		])
 
 	if not db.session.execute(select(Discounts)).first(): # Only populate if Discounts is empty
 		# Adding discount scheme as specified in the project backlog
-		db.session.add(Discounts(name="Three Sessions, 35 off", value=35, session_number=3))
+		bulk_insert(Discounts, [dict(name="Three Sessions, 35 off", value=35, session_number=3)])
 
+	# The bulk inserts bypassed the ORM events that keep the rollups and in-memory
+	# caches in step
+	from .rollups import rebuild_rollups
+	rebuild_rollups()
 	db.session.commit()
+	database_reset.send()
 	
 '''
 	if not db.session.execute(select(ClassBookings)).first(): # Only populate if ClassBookings is empty
@@ -238,6 +288,16 @@ class Users(UserMixin, db.Model):
 	date_of_birth: Mapped[datetime.date] = mapped_column()
 	user_type: Mapped[str] = mapped_column(String(10), default="user")
 	# Options: "user" --> User type, "employee" --> Employee type, "manager" --> Manager type
+
+	__table_args__ = (
+		# Users are looked up by type, and employees search customers by the start
+		# of their email or name in any case, so the lower case of each of those is
+		# indexed within a user type
+		Index("ix_users_user_type_lower_email", user_type, func.lower(email)),
+		Index("ix_users_user_type_lower_firstname", user_type, func.lower(firstname)),
+		Index("ix_users_user_type_lower_lastname", user_type, func.lower(lastname)),
+	)
+
 	payment_customer_id: Mapped[str] = mapped_column(String(255), nullable=True)
 	payment_card_id: Mapped[str] = mapped_column(String(255), nullable=True)
 
@@ -265,7 +325,7 @@ class Users(UserMixin, db.Model):
 			raise ValueError("date of birth cannot be in the future")
 		
 		self.email = email
-		self.password = ph.hash(password) # Hash the password with Argon2 before insertion 
+		self.password = hashing.hash(password) # Hash the password with Argon2 before insertion 
 		self.firstname = firstname
 		self.lastname = lastname
 		self.date_of_birth = date_of_birth
@@ -274,14 +334,13 @@ class Users(UserMixin, db.Model):
 	
 	def verify_password(self, password: str):
 		"""
-		Verifies if a user's password is correct. Throws argon2.exceptions.VerifyMismatchError
-		if password is incorrect. Rehashes the password if need be (will require committing
-		to the database after changes made). Returns True if password is correct.
+		Verifies if a user's password is correct. Returns False if password is incorrect.
+		Rehashes the password if need be (will require committing to the database after
+		changes made). Returns True if password is correct. Throws HashingBusyError if
+		too many passwords are being hashed at once.
 		"""
 
-		try:
-			ph.verify(self.password, password) # Throws exception if password is wrong
-		except VerifyMismatchError:
+		if not hashing.verify(self.password, password):
 			return False
 
 		"""
@@ -290,8 +349,8 @@ class Users(UserMixin, db.Model):
 		correct (during login), we check if the password needs rehashing. If it does,
 		let's rehash it.
 		"""
-		if ph.check_needs_rehash(self.password):
-			self.password = ph.hash(password) # Will require committing to the database
+		if hashing.check_needs_rehash(self.password):
+			self.password = hashing.hash(password) # Will require committing to the database
 		
 		# Password is correct and rehashed
 		return True
@@ -300,7 +359,7 @@ class Users(UserMixin, db.Model):
 		"""
 		Resets a users password to a given value. Hashes with argon2id.
 		"""
-		self.password = ph.hash(new_password)
+		self.password = hashing.hash(new_password)
 
 	def get_dict(self, password: bool = False):
 		"""
@@ -361,17 +420,25 @@ class Classes(UserMixin, db.Model):
 	Date, time, and duration are all stored separately.
 	"""
 	__tablename__ = "classes"
+	__table_args__ = (
+		# The class listing filters on date and orders by date and start time
+		Index("ix_classes_date_start", "date", "start"),
+	)
 
 	id: Mapped[int] = mapped_column(primary_key=True)
-	name: Mapped[int] = mapped_column(String(20))
+	name: Mapped[int] = mapped_column(String(20), index=True)
 	start: Mapped[datetime.time] = mapped_column()
 	duration: Mapped[int] = mapped_column()
 	date: Mapped[datetime.date] = mapped_column()
 	price: Mapped[int] = mapped_column()
+	capacity: Mapped[int] = mapped_column(default=25)
+
+	# Bumped on every booking, so concurrent bookings can detect each other
+	booking_version: Mapped[int] = mapped_column(default=0)
 
-	bookings: Mapped[List["ClassBookings"]] = relationship()
+	bookings: Mapped[List["ClassBookings"]] = relationship(back_populates="class_")
 
-	def __init__(self, name: str, start: datetime.time, duration: int, date: datetime.date, price: int):
+	def __init__(self, name: str, start: datetime.time, duration: int, date: datetime.date, price: int, capacity: int = 25):
 		"""
 		Initialise a class entry.
 		"""
@@ -380,6 +447,7 @@ class Classes(UserMixin, db.Model):
 		self.duration = duration
 		self.date = date
 		self.price = price
+		self.capacity = capacity
 
 	def get_dict(self):
 		"""
@@ -415,7 +483,10 @@ class Facilities(UserMixin, db.Model):
 	close: Mapped[datetime.time] = mapped_column(default=datetime.time(22))
 	capacity: Mapped[int] = mapped_column()
 	session_duration: Mapped[int] = mapped_column(default=0)
-	activities: Mapped[str] = mapped_column(JSON) # {"general use": 5, "1 hour session": 10}
+	activities: Mapped[str] = mapped_column(JSONType) # {"general use": 5, "1 hour session": 10}
+
+	# Bumped on every booking or cancellation, so concurrent bookings can detect each other
+	booking_version: Mapped[int] = mapped_column(default=0)
 
 	def __init__(self, name: str, capacity: int, open: datetime.time = datetime.time(8), close: datetime.time = datetime.time(22), session_duration: int = 0, activities: object = {}):
 		"""
@@ -458,10 +529,12 @@ class ClassBookings(UserMixin, db.Model):
 	__tablename__ = "classbookings"
 
 	id: Mapped[int] = mapped_column(primary_key=True)
-	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-	class_id: Mapped[int] = mapped_column(ForeignKey("classes.id"))
+	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+	class_id: Mapped[int] = mapped_column(ForeignKey("classes.id"), index=True)
 	timestamp: Mapped[datetime.datetime] = mapped_column()
 
+	class_: Mapped["Classes"] = relationship(back_populates="bookings")
+
 	def __init__(self, user_id: int, class_id: int):
 		"""
 		Initialise a class booking entry. Datetime entry is automatic.
@@ -483,17 +556,25 @@ class FacilityBookings(UserMixin, db.Model):
 	alongside a timestamp.
 	"""
 	__tablename__ = "facilitybookings"
+	__table_args__ = (
+		# Capacity checks and the booking index look up a facility's bookings for a day,
+		# the analytics count a facility's bookings per activity over a date range
+		Index("ix_facilitybookings_facility_id_date", "facility_id", "date"),
+		Index("ix_facilitybookings_facility_id_activity_date", "facility_id", "activity", "date"),
+	)
 
 	id: Mapped[int] = mapped_column(primary_key=True)
-	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 	facility_id: Mapped[int] = mapped_column(ForeignKey("facilities.id"))
-	activity: Mapped[int] = mapped_column()
+	activity: Mapped[str] = mapped_column(String(50))
 	price: Mapped[int] = mapped_column()
 	start: Mapped[datetime.time] = mapped_column()
 	end: Mapped[datetime.time] = mapped_column()
 	date: Mapped[datetime.date] = mapped_column()
 	timestamp: Mapped[datetime.datetime] = mapped_column()
 
+	facility: Mapped["Facilities"] = relationship()
+
 	def __init__(self, user_id: int, facility_id: int, activity: str, price: int, date: datetime.date, start: datetime.time, end: datetime.time):
 		"""
 		Initialise a facility booking entry. Datetime entry is automatic.
@@ -560,7 +641,7 @@ class ActiveMemberships(UserMixin, db.Model):
 	__tablename__ = "activememberships"
 
 	id: Mapped[int] = mapped_column(primary_key=True)
-	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 	membership_id: Mapped[int] = mapped_column(ForeignKey("memberships.id"))
 	member_from: Mapped[datetime.date] = mapped_column(default=None, nullable=True)
 	member_till: Mapped[datetime.date] = mapped_column(default=None, nullable=True)
@@ -622,4 +703,148 @@ class Discounts(UserMixin, db.Model):
 		"""
 		Representation string for a discount scheme.
 		"""
-		return f"<Discount scheme {self.id}: {self.value}% off if {self.session_number} sessions booked>"
\ No newline at end of file
+		return f"<Discount scheme {self.id}: {self.value}% off if {self.session_number} sessions booked>"
+
+class EmailOutbox(UserMixin, db.Model):
+	"""
+	Table of emails waiting to be sent. Requests only add rows here; the
+	background sender in app/email.py delivers them.
+	"""
+	__tablename__ = "emailoutbox"
+	__table_args__ = (
+		# The sender looks for due emails by status and time
+		Index("ix_emailoutbox_status_next_attempt_at", "status", "next_attempt_at"),
+	)
+
+	id: Mapped[int] = mapped_column(primary_key=True)
+	recipient: Mapped[str] = mapped_column(String(100))
+	subject: Mapped[str] = mapped_column(String(255))
+	html: Mapped[str] = mapped_column(Text)
+
+	status: Mapped[str] = mapped_column(String(10), default="pending")
+	# Options: "pending" --> Waiting to be sent, "sending" --> Claimed by a sender,
+	# "sent" --> Delivered to the SMTP server, "failed" --> Gave up after too many attempts
+
+	attempts: Mapped[int] = mapped_column(default=0)
+	next_attempt_at: Mapped[datetime.datetime] = mapped_column(default=datetime.datetime.now)
+	last_error: Mapped[str] = mapped_column(String(255), nullable=True)
+
+	# Random token of the sender that claimed the email, so two senders never send it twice
+	claim: Mapped[str] = mapped_column(String(32), nullable=True)
+	claimed_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
+
+	created_at: Mapped[datetime.datetime] = mapped_column(default=datetime.datetime.now)
+	sent_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
+
+	def __init__(self, recipient: str, subject: str, html: str):
+		"""
+		Initialise an outbox entry.
+		"""
+		self.recipient = recipient
+		self.subject = subject
+		self.html = html
+
+	def __repr__(self):
+		"""
+		Representation string for an outbox entry.
+		"""
+		return f"<Email {self.id} to {self.recipient}: {self.status}>"
+
+class ReportJobs(db.Model):
+	"""
+	Table of PDF reports requested by managers. Requests only add rows here; the
+	background worker in app/reports.py renders them and stores the PDF.
+	"""
+	__tablename__ = "reportjobs"
+	__table_args__ = (
+		# Requests look for a recent report of the same kind to reuse
+		Index("ix_reportjobs_kind_created_at", "kind", "created_at"),
+		# The worker looks for jobs to run by status
+		Index("ix_reportjobs_status_created_at", "status", "created_at"),
+	)
+
+	id: Mapped[int] = mapped_column(primary_key=True)
+	kind: Mapped[str] = mapped_column(String(20))
+	# Options: "sales", "facilities", "classes", "memberships"
+	requested_by: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+
+	status: Mapped[str] = mapped_column(String(10), default="pending")
+	# Options: "pending" --> Waiting for the worker, "running" --> Claimed by a worker,
+	# "done" --> PDF ready to download, "failed" --> Couldn't be rendered
+	error: Mapped[str] = mapped_column(String(255), nullable=True)
+
+	# Random token of the worker that claimed the job, so two workers never render it twice
+	claim: Mapped[str] = mapped_column(String(32), nullable=True)
+	claimed_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
+
+	created_at: Mapped[datetime.datetime] = mapped_column(default=datetime.datetime.now)
+	finished_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
+
+	# Only loaded when downloaded, not every time the status is polled
+	pdf: Mapped[bytes] = mapped_column(LargeBinary, nullable=True, deferred=True)
+
+	def __init__(self, kind: str, requested_by: int = None):
+		"""
+		Initialise a report job.
+		"""
+		self.kind = kind
+		self.requested_by = requested_by
+
+	def __repr__(self):
+		"""
+		Representation string for a report job.
+		"""
+		return f"<Report {self.id} ({self.kind}): {self.status}>"
+
+# Daily rollups for manager analytics and reports, kept up to date as bookings
+# and memberships change (see app/rollups.py)
+
+class FacilityDailyTotals(db.Model):
+	"""
+	Table of facility bookings and revenue per facility, activity and day.
+	"""
+	__tablename__ = "facilitydailytotals"
+
+	facility_id: Mapped[int] = mapped_column(primary_key=True)
+	activity: Mapped[str] = mapped_column(String(50), primary_key=True)
+	date: Mapped[datetime.date] = mapped_column(primary_key=True, index=True)
+	bookings: Mapped[int] = mapped_column(default=0)
+	revenue: Mapped[int] = mapped_column(default=0)
+
+	def __repr__(self):
+		"""
+		Representation string for a facility daily total.
+		"""
+		return f"<Facility {self.facility_id} {self.activity} on {self.date}: {self.bookings} bookings, {self.revenue} revenue>"
+
+class ClassDailyTotals(db.Model):
+	"""
+	Table of class bookings and revenue per class name and day.
+	"""
+	__tablename__ = "classdailytotals"
+
+	name: Mapped[str] = mapped_column(String(20), primary_key=True)
+	date: Mapped[datetime.date] = mapped_column(primary_key=True, index=True)
+	bookings: Mapped[int] = mapped_column(default=0)
+	revenue: Mapped[int] = mapped_column(default=0)
+
+	def __repr__(self):
+		"""
+		Representation string for a class daily total.
+		"""
+		return f"<Class {self.name} on {self.date}: {self.bookings} bookings, {self.revenue} revenue>"
+
+class MembershipTotals(db.Model):
+	"""
+	Table of the number of active memberships of each membership type.
+	"""
+	__tablename__ = "membershiptotals"
+
+	membership_id: Mapped[int] = mapped_column(primary_key=True)
+	active: Mapped[int] = mapped_column(default=0)
+
+	def __repr__(self):
+		"""
+		Representation string for a membership total.
+		"""
+		return f"<Membership {self.membership_id}: {self.active} active>"
@@ -0,0 +1,26 @@
+# vertex/app/pdf.py
+"""
+PDF generation for receipts and manager reports.
+
+xhtml2pdf pulls in reportlab, PIL and friends, which are slow to import, so the
+views only import this module the first time a PDF is requested.
+"""
+
+from io import BytesIO
+
+from xhtml2pdf import pisa
+
+class PDFError(Exception):
+	"""
+	Raised when xhtml2pdf can't convert a page.
+	"""
+
+def html_to_pdf(html: str):
+	"""
+	Converts an HTML string to a PDF. Returns the PDF bytes.
+	"""
+	pdf_buffer = BytesIO()
+	pisa_status = pisa.CreatePDF(html, dest=pdf_buffer, encoding='utf-8')
+	if pisa_status.err:
+		raise PDFError('Error converting HTML to PDF: %s' % pisa_status.err)
+	return pdf_buffer.getvalue()
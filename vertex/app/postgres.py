@@ -0,0 +1,45 @@
+# vertex/app/postgres.py
+"""
+PostgreSQL session settings, applied to every connection the app opens.
+
+statement_timeout cancels runaway queries, lock_timeout stops a booking
+waiting forever on a row another transaction has locked, and
+idle_in_transaction_session_timeout closes connections left in an open
+transaction. The settings are set by POSTGRES_SETTINGS in config.py.
+
+To run the app (or the tests) against PostgreSQL, install the driver
+(psycopg2-binary, in requirements.txt) and set DATABASE_URL.
+"""
+
+from sqlalchemy import event
+
+class PostgresProfile:
+	"""
+	Sets POSTGRES_SETTINGS on each new connection, when the app's database is
+	PostgreSQL. Other databases are left alone.
+	"""
+	def init_app(self, app, db):
+		"""
+		Register the settings with the engines of an app. Call after db.init_app().
+		"""
+		# The main database and the replica, if there is one
+		with app.app_context():
+			engines = [engine for engine in db.engines.values() if engine.dialect.name == "postgresql"]
+		if not engines:
+			return
+
+		settings = dict(app.config.get("POSTGRES_SETTINGS") or {})
+		app.extensions["postgres_profile"] = settings
+		if not settings:
+			return
+
+		def apply_settings(dbapi_connection, connection_record):
+			cursor = dbapi_connection.cursor()
+			for name, value in settings.items():
+				cursor.execute(f"SET {name} = '{value}'")
+			cursor.close()
+			# SET is undone if its transaction rolls back, so commit it
+			dbapi_connection.commit()
+
+		for engine in engines:
+			event.listen(engine, "connect", apply_settings)
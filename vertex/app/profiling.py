@@ -0,0 +1,119 @@
+# vertex/app/profiling.py
+"""
+Per-request query profiling. Counts the SQL statements each request runs and
+times them, and reports the totals in a Server-Timing header, which browser dev
+tools show under the request's timing tab:
+
+	Server-Timing: db;desc="12 queries";dur=4.1, app;dur=18.6
+
+Requests slower than SLOW_REQUEST_MS, or running more than SLOW_REQUEST_QUERIES
+statements, are logged along with the statements that took the most time.
+"""
+
+from collections import defaultdict
+import time
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class RequestProfile:
+	"""
+	Statements run during one request, with their durations in seconds.
+	"""
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.queries = []
+
+	@property
+	def query_count(self):
+		return len(self.queries)
+
+	@property
+	def db_time(self):
+		return sum(duration for statement, duration in self.queries)
+
+	def elapsed(self):
+		return time.perf_counter() - self.start
+
+	def worst_statements(self, limit: int = 10):
+		"""
+		Returns (statement, times run, total seconds) for the statements that took
+		the most time overall, so a statement repeated per row stands out.
+		"""
+		totals = defaultdict(lambda: [0, 0.0])
+		for statement, duration in self.queries:
+			totals[statement][0] += 1
+			totals[statement][1] += duration
+		return sorted(((statement, count, total) for statement, (count, total) in totals.items()), key=lambda item: -item[2])[:limit]
+
+def _current_profile():
+	# The background email sender and CLI commands have an app context but no profile
+	try:
+		return g.get("query_profile")
+	except RuntimeError: # Outside any app context
+		return None
+
+# The start time is kept on the statement's execution context rather than the
+# connection, so a statement that raises leaves nothing behind for the next one
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+	if context is not None and _current_profile() is not None:
+		context.vertex_query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+	profile = _current_profile()
+	start = getattr(context, "vertex_query_start", None)
+	if profile is not None and start is not None:
+		profile.queries.append((statement, time.perf_counter() - start))
+
+class QueryProfiler:
+	"""
+	Extension that profiles every request when QUERY_PROFILING is on.
+	"""
+	_listening = False
+
+	def init_app(self, app):
+		app.extensions["query_profiler"] = self
+		if not app.config.get("QUERY_PROFILING", True):
+			return
+
+		# Listen on every engine, so it doesn't matter which one a query goes to
+		if not QueryProfiler._listening:
+			event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+			event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+			QueryProfiler._listening = True
+
+		app.before_request(self._start)
+		app.after_request(self._finish)
+
+	def _start(self):
+		g.query_profile = RequestProfile()
+
+	def _finish(self, response):
+		profile = g.pop("query_profile", None)
+		if profile is None:
+			return response
+
+		elapsed = profile.elapsed()
+		response.headers.add(
+			"Server-Timing",
+			f'db;desc="{profile.query_count} queries";dur={profile.db_time * 1000:.1f}, app;dur={elapsed * 1000:.1f}'
+		)
+		self._log_if_slow(profile, elapsed)
+		return response
+
+	def _log_if_slow(self, profile, elapsed):
+		slow_ms = current_app.config.get("SLOW_REQUEST_MS")
+		slow_queries = current_app.config.get("SLOW_REQUEST_QUERIES")
+		too_slow = slow_ms is not None and elapsed * 1000 > slow_ms
+		too_many = slow_queries is not None and profile.query_count > slow_queries
+		if not (too_slow or too_many):
+			return
+
+		lines = [
+			f"Slow request {request.method} {request.full_path.rstrip('?')}: {elapsed * 1000:.1f} ms, "
+			f"{profile.query_count} queries taking {profile.db_time * 1000:.1f} ms"
+		]
+		for statement, count, total in profile.worst_statements():
+			lines.append(f"  {count}x {total * 1000:.1f} ms: " + " ".join(statement.split()))
+		current_app.logger.warning("\n".join(lines))
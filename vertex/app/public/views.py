@@ -4,14 +4,17 @@ Views for the "public" blueprint.
 """
 import os
 import datetime
+import hashlib
 from .. import models
 import stripe
-from ..extensions import stripe_keys
+from ..extensions import stripe_keys, metrics, receipt_cache, receipt_disk_cache
 import datetime
 from dateutil.relativedelta import relativedelta
 
 from flask_login import current_user, login_required
+from sqlalchemy import select, func, and_, or_
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 
 from flask import (
 	Blueprint,
@@ -23,14 +26,9 @@ from flask import (
 	abort,
 	url_for,
 	make_response,
+	jsonify,
 )
 
-from reportlab.pdfgen import canvas
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate
-from reportlab.lib.styles import getSampleStyleSheet
-from xhtml2pdf import pisa
 
 from .forms import (
 	UserLogin,
@@ -57,8 +55,15 @@ from flask_login import (
 import datetime
 from dateutil.relativedelta import relativedelta
 
+from ..booking import book_class, book_facility, CapacityError, BookingContentionError
+from ..user_search import search_users
+from ..discounts import discount_for
+from ..routing import read_only
+from ..catalogue import catalogue_cache
+from ..conditional import conditional
+
 # For the email confirmation
-from app.email import send_email
+from app.email import queue_email
 from app.token import generate_token, confirm_token
 from flask import app
 from app.models import ClassBookings, Classes
@@ -205,13 +210,10 @@ def sign_up():
 				# Render template for confirmation page, pass in url
 				email_html_template = render_template('email_template.html', confirm_url=confirm_url)
 
-				# Define parts of email and send the email
+				# Define parts of email and queue the email, the background sender delivers it
 				email_subject = 'Vertex Sports | Confirm Email'
-				if "PYTEST_CURRENT_TEST" not in os.environ:
-					send_email(recipient=new_user.email, subject=email_subject, email_template=email_html_template)
-					current_app.logger.info("Sent confirmation email to user ID " + str(new_user.id) + " at " + str(datetime.datetime.now()))
-				else:
-					current_app.logger.info("Not sending confirmation email, we're testing...")
+				queue_email(recipient=new_user.email, subject=email_subject, email_template=email_html_template)
+				current_app.logger.info("Queued confirmation email to user ID " + str(new_user.id) + " at " + str(datetime.datetime.now()))
 
 				login_user(new_user, remember=True)
 				current_app.logger.info("Newly created user ID " + str(new_user.id) + " logged in at " + str(datetime.datetime.now()))
@@ -267,7 +269,7 @@ def resend_confirmation():
 	confirm_url = url_for('public.confirm_email', token=token, _external=True)
 	email_html_template = render_template('email_template.html', confirm_url=confirm_url)
 	email_subject = 'Vertex Sports | Confirm Email - Resent'
-	send_email(recipient=current_user.email, subject=email_subject, email_template=email_html_template)
+	queue_email(recipient=current_user.email, subject=email_subject, email_template=email_html_template)
 	
 	# Inform user of new email, take to unconfirmed page
 	flash('A new confirmation email has been sent to your email address.', category = 'success')
@@ -313,6 +315,18 @@ def confirm_email(token):
 
 # PAYMENT VIEWS
 
+def create_charge(**kwargs):
+	"""
+	Create a Stripe charge, counting the attempt and its outcome in the metrics.
+	"""
+	try:
+		charge = stripe.Charge.create(**kwargs)
+	except Exception:
+		metrics.inc("vertex_payment_attempts_total", outcome="error")
+		raise
+	metrics.inc("vertex_payment_attempts_total", outcome="success")
+	return charge
+
 @login_required
 @blueprint.route("/payment/<int:price>", methods=["GET", "POST"])
 def payment(price):
@@ -324,26 +338,13 @@ def payment(price):
 
 	confirm = request.args.get("confirm")
 
-	# Find out how many sessions current user has in the next 2 weeks
-	user_sessions = 0
-
-	user_classes = models.ClassBookings.query.where(models.ClassBookings.user_id == current_user.id)
-	for item in user_classes:
-		user_sessions += 1
-
-	user_facilities = models.FacilityBookings.query.where(models.FacilityBookings.user_id == current_user.id)
-	for item in user_facilities:
-		user_sessions += 1
-
-	# Get all discounts from discounts table
-	all_discounts = models.Discounts.query.where(models.Discounts.session_number <= user_sessions)
-
-	# For each discount in the list, if session_number = no of users sessions, discountvalue/100 * amount
-	for discount in all_discounts:
-		offamount = discount.value / 100 * amount
+	# Apply the discount for the number of sessions current user has in the next 2 weeks
+	discount = discount_for(current_user.id)
+	if discount:
+		offamount = discount["value"] / 100 * amount
 		amount = int(amount - offamount)
 		price=amount/100
-		current_app.logger.info("Discount ID " + str(discount.id) + " applied.")
+		current_app.logger.info("Discount ID " + str(discount["id"]) + " applied.")
 	
 	if current_user.payment_customer_id and current_user.payment_card_id:
 		# The user has already paid for something before and has saved payment details
@@ -361,7 +362,7 @@ def payment(price):
 		customer = stripe.Customer.retrieve(customer_id)
 
 		# charge the returning customer
-		charge = stripe.Charge.create(
+		charge = create_charge(
 			customer=customer.id,
 			source=card_id,
 			amount=amount,
@@ -387,23 +388,10 @@ def charge(amount):
 
 	confirm = request.args.get("confirm")
 
-	# Find out how many sessions current user has in the next 2 weeks
-	user_sessions = 0
-
-	user_classes = models.ClassBookings.query.where(models.ClassBookings.user_id == current_user.id)
-	for item in user_classes:
-		user_sessions += 1
-
-	user_facilities = models.FacilityBookings.query.where(models.FacilityBookings.user_id == current_user.id)
-	for item in user_facilities:
-		user_sessions += 1
-
-	# Get all discounts from discounts table
-	all_discounts = models.Discounts.query.where(models.Discounts.session_number <= user_sessions)
-
-	# For each discount in the list, if session_number = no of users sessions, discountvalue/100 * amount
-	for discount in all_discounts:
-		offamount = discount.value / 100 * amount
+	# Apply the discount for the number of sessions current user has in the next 2 weeks
+	discount = discount_for(current_user.id)
+	if discount:
+		offamount = discount["value"] / 100 * amount
 		amount = int(amount - offamount)
 
 	# Query the database for the current user
@@ -425,7 +413,7 @@ def charge(amount):
 		customer = stripe.Customer.retrieve(customer_id)
 
 		# charge the returning customer
-		charge = stripe.Charge.create(
+		charge = create_charge(
 			customer=customer.id,
 			source=card_id,
 			amount=topay,
@@ -450,7 +438,7 @@ def charge(amount):
 		db.session.commit()
 
 		# charge the newly made customer
-		charge = stripe.Charge.create(
+		charge = create_charge(
 			customer=current_user.payment_customer_id,
 			source=customer.default_source,
 			amount=topay,
@@ -497,7 +485,7 @@ def payment_membership(price):
 		customer = stripe.Customer.retrieve(customer_id)
 
 		# charge the returning customer
-		charge = stripe.Charge.create(
+		charge = create_charge(
 			customer=customer.id,
 			source=card_id,
 			amount=amount,
@@ -512,18 +500,76 @@ def payment_membership(price):
 
 # CLASS RELATED VIEWS
 
+def parse_class_cursor(cursor: str):
+	"""
+	Parses a class listing cursor of the form "date_start_id" (as made by
+	class_cursor) into (date, start, id). Aborts with 400 if it is malformed.
+	"""
+	try:
+		date, start, id = cursor.split("_")
+		return datetime.date.fromisoformat(date), datetime.time.fromisoformat(start), int(id)
+	except ValueError:
+		abort(400)
+
+def class_cursor(c: Classes):
+	"""
+	Cursor pointing just after a class in the listing order.
+	"""
+	return f"{c.date.isoformat()}_{c.start.isoformat()}_{c.id}"
+
+def parse_date_arg(name: str):
+	"""
+	Reads an optional YYYY-MM-DD query parameter. Aborts with 400 if it is malformed.
+	"""
+	value = request.args.get(name)
+	if not value:
+		return None
+	try:
+		return datetime.date.fromisoformat(value)
+	except ValueError:
+		abort(400)
+
 @blueprint.route("/classes", methods=["GET"])
+@read_only
+@conditional(lambda: (catalogue_cache.version("classes"), datetime.date.today()))
 def classes():
 	"""
-	Route to gym classes list page.
+	Route to gym classes list page. Lists upcoming classes in date and start time
+	order, a page at a time. Optional query parameters:
+	from, to: only list classes between these dates (YYYY-MM-DD, inclusive)
+	after: cursor of the last class on the previous page
 	"""
-	# Get classes ordered by class id.
-	classObj = Classes.query.order_by(Classes.id).all()
-	classes = []
-
-	# Get the data from the database.
-	for c in classObj:
-		if c.date >= datetime.datetime.now().date():
+	today = datetime.date.today()
+	date_from = max(parse_date_arg("from") or today, today) # Past classes are never listed
+	date_to = parse_date_arg("to")
+	page_size = current_app.config.get("CLASSES_PAGE_SIZE", 100)
+
+	# Filtering and ordering happen in SQL, on the indexed date column, so the
+	# work done doesn't grow with the number of past classes
+	query = select(Classes).where(Classes.date >= date_from)
+	if date_to is not None:
+		query = query.where(Classes.date <= date_to)
+
+	# Keyset pagination: carry on from the last class on the previous page
+	cursor = request.args.get("after")
+	if cursor:
+		after_date, after_start, after_id = parse_class_cursor(cursor)
+		query = query.where(Classes.date >= after_date, or_(
+			Classes.date > after_date,
+			Classes.start > after_start,
+			and_(Classes.start == after_start, Classes.id > after_id),
+		))
+
+	def load():
+		# Fetch one extra class to find out if there is another page
+		classObj = db.session.execute(
+			query.order_by(Classes.date, Classes.start, Classes.id).limit(page_size + 1)
+		).scalars().all()
+		next_cursor = class_cursor(classObj[page_size - 1]) if len(classObj) > page_size else None
+		classObj = classObj[:page_size]
+
+		classes = []
+		for c in classObj:
 			classes.append(
 				{
 					"id": c.id,
@@ -535,7 +581,23 @@ def classes():
 					"date": c.date,
 				}
 			)
-	return render_template('classes.html', title = "Gym Classes | Vertex", classes=classes)
+		return classes, next_cursor
+
+	# The page is only read from the database when the class catalogue has
+	# changed since it was last cached
+	classes, next_cursor = catalogue_cache.get_or_load("classes", (date_from, date_to, cursor, page_size), load)
+
+	# Links to the next page, and back to the first, keep the date range
+	date_range = {"from": request.args.get("from"), "to": request.args.get("to")}
+	date_range = {key: value for key, value in date_range.items() if value}
+	next_url = url_for("public.classes", after=next_cursor, **date_range) if next_cursor else None
+	first_url = url_for("public.classes", **date_range) if cursor else None
+
+	# Open the calendar at the first class shown, so later pages are visible
+	initial_date = classes[0]["date"] if classes else date_from
+
+	return render_template('classes.html', title = "Gym Classes | Vertex", classes=classes,
+		next_url=next_url, first_url=first_url, initial_date=initial_date)
 
 @blueprint.route('/classes/<int:class_id>', methods=["GET", "POST"])
 def id_class(class_id):
@@ -561,19 +623,21 @@ def id_class(class_id):
 			# 	current_app.logger.info("Class ID " + str(class_id) + " not bookable.")
 			# 	return redirect('/classes')
 		
-			# Create record for this new booking
-			class_booking = ClassBookings(user_id=current_user.id, class_id=int_class_id)
-
-			# Try to update database with this booking record and
-			# Commit changes of this database session to database
+			# Try to create and commit a record for this new booking,
+			# as long as the class isn't already full
 			try:
-				db.session.add(class_booking)
-				db.session.commit()
+				book_class(user_id=current_user.id, class_id=int_class_id)
 		   		# Direct user to class booking payment page on successful booking
 				flash('Successfully booked class. Please proceed to payment.', category="success")
 				current_app.logger.info("User ID " + str(current_user.id) + " booked class ID " + str(class_id) + " successfully.")
 				return redirect('/payment/' + str(target.price))
 
+			# Catching full classes and too many simultaneous bookings
+			except (CapacityError, BookingContentionError) as e:
+				flash(str(e), category="danger")
+				current_app.logger.info("User ID " + str(current_user.id) + " not able to book class ID " + str(class_id) + ": " + str(e))
+				return redirect('/classes')
+
 			# Catching database errors
 			except SQLAlchemyError:
 				flash('Unable to book class.', category="danger")
@@ -599,19 +663,23 @@ def id_class(class_id):
 
 				uid = int(user.id)
 
-				# book the class and add to database
-				class_booking = ClassBookings(user_id=uid, class_id=class_id)
-
+				# book the class and add to database, as long as it isn't already full
 				try:
-					db.session.add(class_booking)
-					db.session.commit()
+					book_class(user_id=uid, class_id=class_id)
 					flash('Booking created!', category='success')
 					current_app.logger.info("User ID " + str(current_user.id) + " booked class ID " + str(class_id) + " successfully by employee ID " + str(current_user.id) + "on behalf.")
 					return redirect('/payment/' + str(classbook.price))
 
-				except Exception as e:
-					flash(f"Error in booking: {e.__repr__()}.", category="danger")
-					current_app.logger.info("User ID " + str(current_user.id) + " unable to book class ID " + str(class_id) + " by employee ID " + str(current_user.id) + "on behalf.")
+				# Catching full classes and too many simultaneous bookings
+				except (CapacityError, BookingContentionError) as e:
+					flash(str(e), category="danger")
+					current_app.logger.info("User ID " + str(uid) + " not able to book class ID " + str(class_id) + " by employee ID " + str(current_user.id) + " on behalf: " + str(e))
+					return redirect("/classes")
+
+				# Catching database errors
+				except SQLAlchemyError:
+					flash('Unable to book class.', category="danger")
+					current_app.logger.info("User ID " + str(uid) + " unable to book class ID " + str(class_id) + " by employee ID " + str(current_user.id) + " on behalf due to database error.")
 					return redirect("/classes")
 		
 		return render_template("confirmation_class.html", title=class_name + " Confirmation", class_name=class_name, class_id=class_id, form=form, current_user=current_user)
@@ -647,20 +715,49 @@ def delete_booking(id):
 	
 	return redirect(url_for("public.bookings"))
 
+def bookings_version():
+	"""
+	Number and latest timestamp of the user's class and facility bookings, read
+	in one query, and the versions of the classes and facilities they are for.
+	"""
+	if not current_user.is_authenticated:
+		return ()
+
+	def stats(model):
+		return (
+			select(func.count(model.id)).where(model.user_id == current_user.id).scalar_subquery(),
+			select(func.max(model.timestamp)).where(model.user_id == current_user.id).scalar_subquery(),
+		)
+
+	row = db.session.execute(select(*stats(ClassBookings), *stats(models.FacilityBookings))).one()
+	return (*row, catalogue_cache.version("classes"), catalogue_cache.version("facilities"))
+
 @blueprint.route("/bookings", methods=["GET"])
+@conditional(bookings_version)
 def bookings():
 	"""
 	Route to user's bookings.
 	"""
-	# Get classes ordered by class id.
-	classbookingsObj = current_user.class_bookings
+	# Get the user's bookings with their classes and facilities loaded in the same query,
+	# so the number of queries doesn't grow with the number of bookings.
+	classbookingsObj = db.session.execute(
+		select(ClassBookings)
+		.where(ClassBookings.user_id == current_user.id)
+		.options(joinedload(ClassBookings.class_))
+		.order_by(ClassBookings.id)
+	).scalars().all()
 	classes = []
-	facilitybookingsObj = current_user.facility_bookings
+	facilitybookingsObj = db.session.execute(
+		select(models.FacilityBookings)
+		.where(models.FacilityBookings.user_id == current_user.id)
+		.options(joinedload(models.FacilityBookings.facility))
+		.order_by(models.FacilityBookings.id)
+	).scalars().all()
 	facilities = []
 
 	# Get the class data from the database.
 	for class_booking in classbookingsObj:
-		c = models.Classes.query.where(models.Classes.id == class_booking.class_id).first()
+		c = class_booking.class_
 		classes.append(
 			{
 				"id": class_booking.id,
@@ -674,7 +771,7 @@ def bookings():
 
 	# Get the facility data from the database.
 	for facility_booking in facilitybookingsObj:
-		f = models.Facilities.query.where(models.Facilities.id == facility_booking.facility_id).first()
+		f = facility_booking.facility
 
 		facilities.append(
 			{
@@ -753,32 +850,39 @@ def remove_facility_bookings(facility_booking_id):
 # FACILITIES RELATED VIEWS
 
 @blueprint.route("/facilities", methods=["GET"])
+@read_only
+@conditional(lambda: (catalogue_cache.version("facilities"),))
 def facilities():
 	"""
 	Route to view all available facilities page.
 	"""
-	# gets the facilities in alphabetical order
-	facilityObjs = Facilities.query.order_by(Facilities.name).all()
-	facilities = []
-
-	for f in facilityObjs:  # loops through each member of the facilities database and adds them to a list
-		activities = f.activities
-		activity_names = []
-		activity_prices = []
-		for activity_name, price in activities.items():
-			activity_names.append(activity_name)
-			activity_prices.append(price)
-			
-		facilities.append({
-			"id": f.id,
-			"name": f.name,
-			"open": f.open,
-			"close": f.close,
-			"capacity": f.capacity,				
-			"activities":activity_names,
-			"prices":activity_prices,
-			"session duration": f.session_duration
-		})
+	def load():
+		# gets the facilities in alphabetical order
+		facilityObjs = Facilities.query.order_by(Facilities.name).all()
+		facilities = []
+
+		for f in facilityObjs:  # loops through each member of the facilities database and adds them to a list
+			activities = f.activities
+			activity_names = []
+			activity_prices = []
+			for activity_name, price in activities.items():
+				activity_names.append(activity_name)
+				activity_prices.append(price)
+				
+			facilities.append({
+				"id": f.id,
+				"name": f.name,
+				"open": f.open,
+				"close": f.close,
+				"capacity": f.capacity,				
+				"activities":activity_names,
+				"prices":activity_prices,
+				"session duration": f.session_duration
+			})
+		return facilities
+
+	# Only read from the database when the facilities have changed since they were cached
+	facilities = catalogue_cache.get_or_load("facilities", "all", load)
 	return render_template('facilities.html', title="Gym Facilities | Vertex", facilities=facilities)
 
 
@@ -790,9 +894,6 @@ def facility_view(facility_id):
 	"""
 	facility = Facilities.query.where(Facilities.id == facility_id).first()
 
-	# user_booked choices
-	userobjs = Users.query.order_by(Users.email).all()
-
 	if facility:
 		facility_name = facility.name
 		# The form details
@@ -863,17 +964,18 @@ def facility_view(facility_id):
 				flash("Cannot end before starting activity", category="danger")
 				return redirect(url_for('public.facility_view', facility_id=facility_id))
 
-			# create new FacilityBooking object
-			facility_booking = models.FacilityBookings(
-				facility_id=facility_id, user_id=uid, activity=activity, price=5, date=date_chosen, start=start_time, end=end_time)
-
-			db.session.add(facility_booking)
-
+			# create and commit the new FacilityBooking, checking the facility
+			# has room for one more person at that time
 			try:
-				db.session.commit()
+				facility_booking = book_facility(
+					facility_id=facility_id, user_id=uid, activity=activity, price=5, date=date_chosen, start=start_time, end=end_time)
 				flash('Booking created!', category='success')
 				current_app.logger.info("Facility booking for " + str(facility_id) + " created successfully on " + str(datetime.datetime.now()))
 				return redirect('/payment/' + str(facility_booking.price))
+			except (CapacityError, BookingContentionError) as e:
+				flash(str(e), category="danger")
+				current_app.logger.info("Facility booking for " + str(facility_id) + " rejected on " + str(datetime.datetime.now()) + ": " + str(e))
+				return redirect(url_for('public.facility_view', facility_id=facility_id))
 			except Exception as e:
 				flash(f"Error in booking: {e.__repr__()}.", category="danger")
 				current_app.logger.info("Facility booking for " + str(facility_id) + " unable to be created on " + str(datetime.datetime.now()))
@@ -885,10 +987,36 @@ def facility_view(facility_id):
 
 	return render_template("confirmation.html", title = facility_name + " Confirmation", facility_name = facility_name, form=form, current_user=current_user)
 	
+@blueprint.route("/users/search", methods=["GET"])
+@login_required
+def user_search():
+	"""
+	Route for employees to look up customers by the start of their email or name,
+	for booking on their behalf. Returns up to 10 matches as JSON.
+	"""
+	if current_user.user_type not in ("employee", "manager"):
+		abort(401)
+
+	prefix = request.args.get("q", "").strip()
+	if len(prefix) < 2:
+		return jsonify([])
+	return jsonify(search_users(prefix, limit=10))
+
 # MEMBERSHIP RELATED VIEWS
 
+def membership_version():
+	"""
+	The user's active membership row, and the version of the membership schemes.
+	"""
+	row = db.session.execute(
+		select(ActiveMemberships.id, ActiveMemberships.membership_id, ActiveMemberships.member_from, ActiveMemberships.member_till)
+		.where(ActiveMemberships.user_id == current_user.id)
+	).first()
+	return (tuple(row) if row else None, catalogue_cache.version("memberships"))
+
 @blueprint.route("/my_memberships", methods=["GET"])
 @login_required
+@conditional(membership_version)
 def my_memberships():
 	"""
 	Route to page displaying memberships of a user.
@@ -905,6 +1033,7 @@ def my_memberships():
 
 @blueprint.route("/new_membership", methods=["GET"])
 @login_required
+@conditional(lambda: (catalogue_cache.version("memberships"),))
 def new_membership():
 	"""
 	Route to page for user to select a new membership.
@@ -1029,32 +1158,51 @@ def download(price, discount):
     """
 	Route to download PDF receipt.
 	"""
-    # Render the HTML template for the PDF
-    html = render_template('receipt_template.html', price=price, discount=discount)
-
     # Return the PDF as a response
-    response = make_response(generate_pdf(html))
+    response = make_response(generate_pdf(price, discount))
     current_app.logger.info("Generated receipt for " + str(current_user.id) + " successfully on " + str(datetime.datetime.now()))
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = 'attachment; filename="receipt.pdf"'
     return response
 
-def generate_pdf(html):
+def generate_pdf(price, discount):
+    """
+	Function to generate a PDF receipt. Receipts only depend on the price and
+	discount, so each is rendered once and then served from memory, or from
+	disk in other worker processes.
+	"""
+    key = receipt_key(price, discount)
+    pdf = receipt_cache.get(key)
+    if pdf is not None:
+        metrics.inc("vertex_receipt_cache_total", result="memory")
+        return pdf
+
+    pdf = receipt_disk_cache.get(key)
+    if pdf is not None:
+        metrics.inc("vertex_receipt_cache_total", result="disk")
+    else:
+        from app.pdf import html_to_pdf # Imported on first use, xhtml2pdf is slow to import
+
+        metrics.inc("vertex_receipt_cache_total", result="miss")
+        pdf = html_to_pdf(render_template('receipt_template.html', price=price, discount=discount))
+        receipt_disk_cache.set(key, pdf)
+
+    receipt_cache.set(key, pdf)
+    return pdf
+
+# Digest of the receipt template by its filename and modification time, so
+# cached receipts are rendered again when the template changes. Only the latest
+# version of each file is kept
+_template_digests = {}
+
+def receipt_key(price, discount):
     """
-	Function to generate PDF from HTML file.
-	"""
-    pdf_buffer = BytesIO()
-    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Convert the HTML to PDF using xhtml2pdf
-    pisa_status = pisa.CreatePDF(html, dest=pdf_buffer, encoding='utf-8')
-    if pisa_status.err:
-        raise Exception('Error converting HTML to PDF: %s' % pisa_status.err)
-
-    # Seek to the beginning and return the PDF as a byte string
-    pdf_buffer.seek(0)
-    pdf = pdf_buffer.read()
-    pdf_buffer.close()
-    return pdf
\ No newline at end of file
+	Function to return the cache key of a receipt.
+	"""
+    filename = current_app.jinja_env.get_template('receipt_template.html').filename
+    mtime = os.path.getmtime(filename)
+    cached = _template_digests.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename, 'rb') as f:
+            cached = _template_digests[filename] = (mtime, hashlib.sha256(f.read()).hexdigest()[:16])
+    return f"receipt-{cached[1]}-{price}-{discount}"
@@ -0,0 +1,244 @@
+# vertex/app/reports.py
+"""
+PDF reports for managers, rendered off the request path.
+
+Asking for a report only adds a row to the report jobs table, or reuses a report
+of the same kind asked for in the last REPORT_DEDUP_WINDOW seconds, and sends
+the manager to a page that waits until it's ready to download. A background
+thread renders pending reports, with freshly drawn plots, and stores each PDF in
+its row. It is started the first time a report is requested.
+
+To render reports in a process of their own instead (with REPORT_WORKER set to
+False), run from the vertex directory:
+	flask run-reports --loop
+"""
+
+import datetime
+import os
+import threading
+import time
+import uuid
+
+import click
+from flask import current_app, render_template
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, delete, and_, or_
+
+from .models import db, ReportJobs
+from .routing import replica_reads
+
+# A claimed report whose worker hasn't finished with it after this long is
+# assumed to belong to a worker that died, and is claimed again
+STALE_CLAIM = datetime.timedelta(minutes=10)
+
+# Template of each kind of report, and the plots (see admin/plots.py) it shows
+REPORTS = {
+	"sales": ("manager_sales_report.html", (12, 13, 14)),
+	"facilities": ("manager_facilities_report.html", (2, 3, 4, 5, 6, 7)),
+	"classes": ("manager_classes_report.html", (8, 9, 10)),
+	"memberships": ("manager_membership_report.html", (11,)),
+}
+
+def request_report(kind: str, user_id: int = None):
+	"""
+	Returns a job for a report of this kind, adding one (and committing) unless
+	one was asked for in the last REPORT_DEDUP_WINDOW seconds and hasn't failed.
+	"""
+	since = datetime.datetime.now() - datetime.timedelta(seconds=current_app.config["REPORT_DEDUP_WINDOW"])
+	job = db.session.execute(
+		select(ReportJobs)
+		.where(ReportJobs.kind == kind, ReportJobs.status != "failed", ReportJobs.created_at >= since)
+		.order_by(ReportJobs.created_at.desc())
+		.limit(1)
+	).scalar()
+
+	if job is None:
+		job = ReportJobs(kind, user_id)
+		db.session.add(job)
+		db.session.commit()
+	# Even for a report already asked for, in case the thread has died since
+	report_worker.wake(current_app._get_current_object())
+	return job
+
+def render_report(kind: str):
+	"""
+	Draws the plots a report shows and converts the report to a PDF. Returns
+	the PDF bytes.
+	"""
+	# Imported on first use, matplotlib and xhtml2pdf are slow to import
+	from .admin import plots
+	from .pdf import html_to_pdf
+
+	template, plot_ids = REPORTS[kind]
+
+	# The reports show the images the plots save to static/gen, by their path on
+	# disk, whatever the working directory. Their data is read from the replica,
+	# if there is one
+	with replica_reads():
+		for plot_id in plot_ids:
+			plots.render_plot(plot_id)
+
+		today = datetime.date.today()
+		html = render_template(
+			template,
+			date_from=today - datetime.timedelta(weeks=1),
+			date_to=today,
+			gen_folder=os.path.join(current_app.static_folder, "gen"),
+		)
+	return html_to_pdf(html)
+
+class ReportWorker:
+	"""
+	Renders pending report jobs one at a time, oldest first.
+
+	A background thread runs them whenever a report is requested, and every
+	REPORT_POLL_INTERVAL seconds to pick up jobs added by other processes.
+	`flask run-reports` runs them by hand.
+	"""
+	def __init__(self):
+		self._wakeup = threading.Event()
+		self._stopping = threading.Event()
+		self._lock = threading.Lock()
+		self._thread = None
+
+	def init_app(self, app):
+		"""
+		Register the worker with an app.
+		"""
+		app.extensions["report_worker"] = self
+
+	def wake(self, app):
+		"""
+		Ask the background thread to run pending reports, starting it if needed.
+		"""
+		if not app.config.get("REPORT_WORKER", not app.testing):
+			return
+
+		with self._lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._stopping.clear()
+				self._thread = threading.Thread(target=self._run, args=(app,), name="report-worker", daemon=True)
+				self._thread.start()
+		self._wakeup.set()
+
+	def stop(self):
+		"""
+		Stop the background thread, letting it finish the report it is rendering.
+		"""
+		with self._lock:
+			thread, self._thread = self._thread, None
+		if thread is not None:
+			self._stopping.set()
+			self._wakeup.set()
+			thread.join()
+
+	def _run(self, app):
+		while True:
+			self._wakeup.wait(app.config["REPORT_POLL_INTERVAL"])
+			self._wakeup.clear()
+			if self._stopping.is_set():
+				return
+			with app.app_context():
+				try:
+					self.run_all()
+				except Exception:
+					app.logger.exception("Report worker failed to run the pending reports")
+
+	def run_all(self):
+		"""
+		Render reports until none are pending, then delete expired ones. Returns
+		(done, failed).
+		"""
+		done = failed = 0
+		while True:
+			job = self.run_next()
+			if job is None:
+				break
+			if job.status == "done":
+				done += 1
+			else:
+				failed += 1
+		self.purge()
+		return done, failed
+
+	def run_next(self):
+		"""
+		Claim and render the oldest pending report. Returns its job, or None if
+		there was nothing to do.
+		"""
+		job = self._claim(datetime.datetime.now())
+		if job is None:
+			return None
+
+		start = time.perf_counter()
+		try:
+			job.pdf = render_report(job.kind)
+		except Exception as e:
+			db.session.rollback()
+			job.status = "failed"
+			job.error = repr(e)[:255]
+			current_app.logger.exception(f"Report {job.id} ({job.kind}) failed")
+		else:
+			job.status = "done"
+			current_app.logger.info(f"Report {job.id} ({job.kind}) rendered in {time.perf_counter() - start:.1f} s")
+		job.finished_at = datetime.datetime.now()
+		db.session.commit()
+		return job
+
+	def _claim(self, now):
+		"""
+		Mark the oldest due report as ours and return it.
+		"""
+		due = or_(
+			ReportJobs.status == "pending",
+			and_(ReportJobs.status == "running", ReportJobs.claimed_at < now - STALE_CLAIM),
+		)
+		while True:
+			job_id = db.session.execute(
+				select(ReportJobs.id).where(due).order_by(ReportJobs.created_at).limit(1)
+			).scalar()
+			if job_id is None:
+				db.session.rollback()
+				return None
+
+			# Only claimed if still due, so a worker in another process that
+			# picked the same job has it to itself. If so, try the next one.
+			claim = uuid.uuid4().hex
+			claimed = db.session.execute(
+				update(ReportJobs)
+				.where(ReportJobs.id == job_id, due)
+				.values(status="running", claim=claim, claimed_at=now)
+				.execution_options(synchronize_session=False)
+			).rowcount
+			db.session.commit()
+			if claimed:
+				return db.session.get(ReportJobs, job_id)
+
+	def purge(self):
+		"""
+		Delete finished reports older than REPORT_RETENTION seconds, and commit.
+		"""
+		expired = datetime.datetime.now() - datetime.timedelta(seconds=current_app.config["REPORT_RETENTION"])
+		db.session.execute(
+			delete(ReportJobs)
+			.where(ReportJobs.status.in_(["done", "failed"]), ReportJobs.finished_at < expired)
+			.execution_options(synchronize_session=False)
+		)
+		db.session.commit()
+
+report_worker = ReportWorker()
+
+@click.command("run-reports")
+@click.option("--loop", is_flag=True, help="Keep checking for new reports every REPORT_POLL_INTERVAL seconds.")
+@with_appcontext
+def run_reports_command(loop):
+	"""
+	Render every pending PDF report.
+	"""
+	while True:
+		done, failed = report_worker.run_all()
+		if done or failed or not loop:
+			click.echo(f"Rendered {done} reports, {failed} failed")
+		if not loop:
+			return
+		time.sleep(current_app.config["REPORT_POLL_INTERVAL"])
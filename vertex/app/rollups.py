@@ -0,0 +1,180 @@
+# vertex/app/rollups.py
+"""
+Daily rollups of bookings, revenue and memberships for manager analytics.
+
+Whenever a session flushes facility or class bookings, active memberships, or
+changes to a class's name, date or price, the matching rollup rows are updated
+in the same transaction with an atomic "add to this row" upsert, so concurrent
+bookings never lose an update. Analytics then add up hundreds of rollup rows
+instead of millions of bookings.
+
+Bulk inserts skip this, so anything that bulk loads bookings calls
+rebuild_rollups() afterwards. To rebuild them from history, run from the vertex
+directory:
+	flask rebuild-rollups
+"""
+
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, delete, insert, func, event, inspect
+from sqlalchemy.dialects import sqlite, postgresql, mysql
+from sqlalchemy.orm import Session
+
+from .models import (
+	db,
+	Classes,
+	ClassBookings,
+	FacilityBookings,
+	ActiveMemberships,
+	FacilityDailyTotals,
+	ClassDailyTotals,
+	MembershipTotals,
+)
+
+def _value(obj, attribute: str, old: bool):
+	"""
+	An attribute's value, or its value before this flush's changes if old.
+	"""
+	if old:
+		history = inspect(obj).attrs[attribute].history
+		if history.deleted:
+			return history.deleted[0]
+	return getattr(obj, attribute)
+
+def _changed(obj, attributes):
+	state = inspect(obj)
+	return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+def _class_key(session, class_id: int, old: bool):
+	"""
+	Returns ((name, date), price) of a class.
+	"""
+	target = session.get(Classes, class_id)
+	return (_value(target, "name", old), _value(target, "date", old)), _value(target, "price", old)
+
+def _contributions(session, obj, old: bool = False):
+	"""
+	Returns (rollup model, key, amounts) for what obj adds to the rollups.
+	"""
+	if isinstance(obj, FacilityBookings):
+		key = (_value(obj, "facility_id", old), _value(obj, "activity", old), _value(obj, "date", old))
+		return [(FacilityDailyTotals, key, {"bookings": 1, "revenue": _value(obj, "price", old) or 0})]
+	if isinstance(obj, ClassBookings):
+		key, price = _class_key(session, _value(obj, "class_id", old), old)
+		return [(ClassDailyTotals, key, {"bookings": 1, "revenue": price or 0})]
+	if isinstance(obj, ActiveMemberships):
+		return [(MembershipTotals, (_value(obj, "membership_id", old),), {"active": 1})]
+	return []
+
+TRACKED = {
+	FacilityBookings: ("facility_id", "activity", "date", "price"),
+	ClassBookings: ("class_id",),
+	ActiveMemberships: ("membership_id",),
+}
+
+@event.listens_for(Session, "before_flush")
+def _collect_rollup_changes(session, flush_context, instances):
+	"""
+	Work out how this flush changes the rollups, before the changes are written.
+	"""
+	deltas = session.info.setdefault("rollup_deltas", defaultdict(lambda: defaultdict(int)))
+
+	def add(contributions, sign):
+		for model, key, amounts in contributions:
+			for column, amount in amounts.items():
+				deltas[(model, key)][column] += sign * amount
+
+	for obj in session.new:
+		add(_contributions(session, obj), 1)
+	for obj in session.deleted:
+		add(_contributions(session, obj, old=True), -1)
+	for obj in session.dirty:
+		if type(obj) in TRACKED and _changed(obj, TRACKED[type(obj)]):
+			add(_contributions(session, obj, old=True), -1)
+			add(_contributions(session, obj), 1)
+		elif isinstance(obj, Classes) and obj.id is not None and _changed(obj, ("name", "date", "price")):
+			# Move the class's existing bookings to its new name, date and price
+			booked = session.execute(select(func.count(ClassBookings.id)).where(ClassBookings.class_id == obj.id)).scalar()
+			for old, sign in ((True, -1), (False, 1)):
+				key, price = _class_key(session, obj.id, old)
+				add([(ClassDailyTotals, key, {"bookings": booked, "revenue": booked * (price or 0)})], sign)
+
+@event.listens_for(Session, "after_flush")
+def _apply_rollup_changes(session, flush_context):
+	"""
+	Write this flush's rollup changes, in the same transaction as the flush.
+	"""
+	deltas = session.info.pop("rollup_deltas", None)
+	if not deltas:
+		return
+	connection = session.connection()
+	for (model, key), amounts in deltas.items():
+		if any(amounts.values()):
+			connection.execute(_add_statement(connection.dialect.name, model, key, amounts))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rollup_changes(session):
+	session.info.pop("rollup_deltas", None)
+
+def _add_statement(dialect: str, model, key: tuple, amounts: dict):
+	"""
+	INSERT of a rollup row that adds amounts to the row instead if it exists.
+	"""
+	key_columns = [column.name for column in model.__table__.primary_key.columns]
+	values = dict(zip(key_columns, key), **amounts)
+
+	if dialect == "mysql":
+		stmt = mysql.insert(model).values(**values)
+		return stmt.on_duplicate_key_update({column: getattr(model, column) + stmt.inserted[column] for column in amounts})
+
+	insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+	stmt = insert(model).values(**values)
+	return stmt.on_conflict_do_update(
+		index_elements=key_columns,
+		set_={column: getattr(model, column) + stmt.excluded[column] for column in amounts},
+	)
+
+def rebuild_rollups():
+	"""
+	Recompute every rollup from the bookings and memberships tables, without
+	committing.
+	"""
+	for model in (FacilityDailyTotals, ClassDailyTotals, MembershipTotals):
+		db.session.execute(delete(model))
+
+	db.session.execute(insert(FacilityDailyTotals).from_select(
+		["facility_id", "activity", "date", "bookings", "revenue"],
+		select(
+			FacilityBookings.facility_id,
+			FacilityBookings.activity,
+			FacilityBookings.date,
+			func.count(FacilityBookings.id),
+			func.coalesce(func.sum(FacilityBookings.price), 0),
+		).group_by(FacilityBookings.facility_id, FacilityBookings.activity, FacilityBookings.date)
+	))
+	db.session.execute(insert(ClassDailyTotals).from_select(
+		["name", "date", "bookings", "revenue"],
+		select(
+			Classes.name,
+			Classes.date,
+			func.count(ClassBookings.id),
+			func.coalesce(func.sum(Classes.price), 0),
+		).join(ClassBookings, ClassBookings.class_id == Classes.id).group_by(Classes.name, Classes.date)
+	))
+	db.session.execute(insert(MembershipTotals).from_select(
+		["membership_id", "active"],
+		select(ActiveMemberships.membership_id, func.count(ActiveMemberships.id)).group_by(ActiveMemberships.membership_id)
+	))
+
+@click.command("rebuild-rollups")
+@with_appcontext
+def rebuild_rollups_command():
+	"""
+	Rebuild the analytics rollups from booking and membership history.
+	"""
+	rebuild_rollups()
+	db.session.commit()
+	for model in (FacilityDailyTotals, ClassDailyTotals, MembershipTotals):
+		click.echo(f"{model.__tablename__}: {db.session.execute(select(func.count()).select_from(model)).scalar()} rows")
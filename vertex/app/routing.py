@@ -0,0 +1,133 @@
+# vertex/app/routing.py
+"""
+Read/write routing between the main database and a read replica.
+
+Views that only read, such as the class and facility listings, the manager
+listings and analytics plots, are marked with @read_only (and PDF reports are
+rendered inside replica_reads()). Their queries go to the "replica" bind in
+SQLALCHEMY_BINDS, set with DATABASE_REPLICA_URL. Everything else, and every
+write, uses the main database.
+
+A replica may lag behind, so after a request writes anything its user's reads go
+to the main database for REPLICA_STICKY_SECONDS, and they see their own booking
+straight away. Reads that are kept beyond the request, like the cached class and
+facility listings (see app/catalogue.py), always use the main database, inside
+primary_reads(). Without a replica configured, everything uses the main database.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+import time
+
+from flask import g, session, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = "replica"
+
+# Key in the (cookie) session of the time until which a user reads from the
+# main database
+STICKY_KEY = "db_primary_until"
+
+def _use_replica():
+	if not has_app_context() or not g.get("db_read_only") or g.get("db_wrote"):
+		return False
+	if has_request_context() and session.get(STICKY_KEY, 0) > time.time():
+		return False
+	return True
+
+class RoutingSession(Session):
+	"""
+	Session that sends reads in read-only views to the replica bind, when there
+	is one. Flushes always go to the main database.
+	"""
+	def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+		if bind is None and not self._flushing and _use_replica():
+			replica = self._db.engines.get(REPLICA_BIND)
+			if replica is not None:
+				return replica
+		return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@contextmanager
+def replica_reads():
+	"""
+	Send reads inside the block to the replica, unless this request has written.
+	"""
+	previous = g.get("db_read_only", False)
+	g.db_read_only = True
+	if not has_request_context(): # e.g. the report worker, where only writes in this block count
+		g.db_wrote = False
+	try:
+		yield
+	finally:
+		g.db_read_only = previous
+
+@contextmanager
+def primary_reads():
+	"""
+	Send reads inside the block to the main database, even in a read-only view.
+	For reads that outlive the request, such as cached listings.
+	"""
+	if not has_app_context(): # Nothing sends reads to the replica there anyway
+		yield
+		return
+	previous = g.get("db_read_only", False)
+	g.db_read_only = False
+	try:
+		yield
+	finally:
+		g.db_read_only = previous
+
+def read_only(func):
+	"""
+	Decorator for views that only read from the database, so their queries can go
+	to the replica.
+
+	Used as follows:
+	@read_only
+	def some_view():
+		...
+	"""
+	@wraps(func)
+	def wrapper(*args, **kwargs):
+		with replica_reads():
+			return func(*args, **kwargs)
+	return wrapper
+
+def _after_flush(session, flush_context):
+	if has_app_context():
+		g.db_wrote = True
+
+class ReplicaRouter:
+	"""
+	Extension that tracks which requests write, and keeps their users reading from
+	the main database for a while afterwards.
+	"""
+	_listening = False
+
+	def init_app(self, app, db):
+		"""
+		Register the router with an app. Call after db.init_app().
+		"""
+		app.extensions["replica_router"] = self
+		with app.app_context():
+			has_replica = REPLICA_BIND in db.engines
+		app.config.setdefault("REPLICA_STICKY_SECONDS", 10)
+
+		# Listen on every session, whichever app it belongs to
+		if not ReplicaRouter._listening:
+			event.listen(Session, "after_flush", _after_flush)
+			ReplicaRouter._listening = True
+
+		@app.before_request
+		def reset_write_flag():
+			g.db_wrote = False
+
+		if not has_replica:
+			return
+
+		@app.after_request
+		def stick_to_primary(response):
+			if g.get("db_wrote"):
+				session[STICKY_KEY] = time.time() + app.config["REPLICA_STICKY_SECONDS"]
+			return response
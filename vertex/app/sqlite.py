@@ -0,0 +1,44 @@
+# vertex/app/sqlite.py
+"""
+SQLite performance profile, applied to every connection the app opens.
+
+With SQLite's defaults a booking being written blocks every reader, and a
+second writer fails straight away with "database is locked". In WAL mode
+readers carry on while one writer writes, and busy_timeout makes other writers
+wait their turn. synchronous=NORMAL is safe in WAL mode and saves an fsync per
+commit. foreign_keys makes SQLite check foreign keys, as other databases do.
+
+The pragmas are set by SQLITE_PRAGMAS in config.py.
+"""
+
+from sqlalchemy import event
+
+class SQLiteProfile:
+	"""
+	Sets SQLITE_PRAGMAS on each new connection, when the database is SQLite.
+	Other databases are left alone.
+	"""
+	def init_app(self, app, db):
+		"""
+		Register the pragmas with the engines of an app. Call after db.init_app().
+		"""
+		# The main database and the replica, if there is one
+		with app.app_context():
+			engines = [engine for engine in db.engines.values() if engine.dialect.name == "sqlite"]
+		if not engines:
+			return
+
+		pragmas = dict(app.config.get("SQLITE_PRAGMAS") or {})
+		app.extensions["sqlite_profile"] = pragmas
+		if not pragmas:
+			return
+
+		def set_pragmas(dbapi_connection, connection_record):
+			cursor = dbapi_connection.cursor()
+			for name, value in pragmas.items():
+				cursor.execute(f"PRAGMA {name} = {value}")
+			cursor.close()
+
+		for engine in engines:
+			event.listen(engine, "connect", set_pragmas)
+
@@ -56,4 +56,36 @@ document.querySelectorAll('.language-link').forEach(function(link) {
       /* Switch to the selected language */
     });
   });
-  
\ No newline at end of file
+  
+
+/* Function for employees to pick a customer by typing the start of their email or name */
+function userTypeahead(inputId, listId) {
+    var input = document.getElementById(inputId);
+    var list = document.getElementById(listId);
+    var timer;
+    if (!input || !list) {
+        return;
+    }
+
+    input.addEventListener("input", function() {
+        /* Wait for a pause in typing before asking the server */
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            if (input.value.length < 2) {
+                list.innerHTML = "";
+                return;
+            }
+            fetch("/users/search?q=" + encodeURIComponent(input.value))
+                .then(function(response) { return response.json(); })
+                .then(function(users) {
+                    list.innerHTML = "";
+                    users.forEach(function(user) {
+                        var option = document.createElement("option");
+                        option.value = user.email;
+                        option.label = user.firstname + " " + user.lastname;
+                        list.appendChild(option);
+                    });
+                });
+        }, 200);
+    });
+}
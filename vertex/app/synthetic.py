@@ -0,0 +1,199 @@
+# vertex/app/synthetic.py
+"""
+Synthetic data at realistic volumes, for load testing and query tuning.
+
+Rows are written with bulk INSERTs (one executemany per batch) in a single
+transaction, rather than through the ORM unit of work, so millions of rows take
+minutes, not hours.
+Bookings never take a class or facility hour over its capacity.
+
+Run from the vertex directory, after populate_database() (for the facilities):
+	flask generate-data --users 100000 --years 3 --class-bookings 2000000 --facility-bookings 3000000
+"""
+
+from bisect import bisect_right
+from itertools import accumulate
+import datetime
+import random
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, func
+
+from .models import (
+	db,
+	database_reset,
+	bulk_insert,
+	fixture_hashes,
+	Users,
+	Classes,
+	ClassBookings,
+	Facilities,
+	FacilityBookings,
+)
+from .rollups import rebuild_rollups
+
+# Password every synthetic user logs in with
+PASSWORD = "Lemonade!1"
+
+FIRST_NAMES = ["Oliver", "Amelia", "George", "Isla", "Harry", "Ava", "Noah", "Mia", "Jack", "Ivy", "Leo", "Lily", "Arthur", "Grace", "Muhammad", "Freya", "Oscar", "Emily", "Charlie", "Sophia", "Aisha", "Ravi", "Priya", "Wei", "Chen", "Sofia"]
+LAST_NAMES = ["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Johnson", "Davies", "Patel", "Robinson", "Wright", "Thompson", "Evans", "Walker", "White", "Roberts", "Green", "Hall", "Khan", "Singh", "Wood", "Clarke", "Lewis", "Hughes"]
+
+# (name, start hour, price) of the classes run each day
+CLASS_TIMETABLE = [
+	("Spin", 7, 15), ("Pilates", 9, 25), ("Aerobics", 10, 20), ("Yoga", 12, 10),
+	("Boxfit", 13, 15), ("Aqua aerobics", 16, 20), ("Pilates", 18, 25), ("Yoga", 19, 10),
+]
+
+def _sample_slots(capacities, count: int, rng: random.Random):
+	"""
+	Pick count distinct places among slots with the given capacities, without
+	building a list of every place. Yields slot indexes in order.
+	"""
+	ends = list(accumulate(capacities))
+	total = ends[-1] if ends else 0
+	for place in sorted(rng.sample(range(total), min(count, total))):
+		yield bisect_right(ends, place)
+
+def generate_users(count: int, rng: random.Random, batch_size: int):
+	"""
+	Customers named synthetic.<n>@example.com. One password hash is shared by
+	all of them, as hashing each would take longer than everything else.
+	"""
+	password = fixture_hashes([PASSWORD])[PASSWORD]
+	start = (db.session.execute(select(func.max(Users.id))).scalar() or 0) + 1
+	today = datetime.date.today()
+
+	def rows():
+		for n in range(start, start + count):
+			yield {
+				"email": f"synthetic.{n}@example.com",
+				"password": password,
+				"firstname": rng.choice(FIRST_NAMES),
+				"lastname": rng.choice(LAST_NAMES),
+				"date_of_birth": today - datetime.timedelta(days=rng.randint(16 * 365, 80 * 365)),
+				"user_type": "user",
+				"is_member": rng.random() < 0.2,
+				"is_confirmed": True,
+				"confirmed_on": today,
+			}
+
+	return bulk_insert(Users, rows(), batch_size)
+
+def generate_classes(years: int, rng: random.Random, batch_size: int):
+	"""
+	The daily timetable, from years ago until ten weeks from now.
+	"""
+	until = datetime.date.today() + datetime.timedelta(weeks=10)
+	first = until - datetime.timedelta(days=365 * years)
+
+	def rows():
+		for day in range((until - first).days):
+			date = first + datetime.timedelta(days=day)
+			for name, hour, price in CLASS_TIMETABLE:
+				yield {
+					"name": name,
+					"start": datetime.time(hour),
+					"duration": 1,
+					"date": date,
+					"price": price,
+					"capacity": rng.choice([15, 20, 25, 30]),
+				}
+
+	return bulk_insert(Classes, rows(), batch_size)
+
+def generate_class_bookings(count: int, user_ids, rng: random.Random, batch_size: int):
+	"""
+	Class bookings by random customers, spread over every class.
+	"""
+	classes = db.session.execute(select(Classes.id, Classes.date, Classes.start, Classes.capacity)).all()
+	now = datetime.datetime.now()
+
+	def rows():
+		for slot in _sample_slots([c.capacity for c in classes], count, rng):
+			c = classes[slot]
+			booked = datetime.datetime.combine(c.date, c.start) - datetime.timedelta(days=rng.randint(0, 14), minutes=rng.randint(0, 1439))
+			yield {
+				"user_id": rng.choice(user_ids),
+				"class_id": c.id,
+				"timestamp": min(booked, now),
+			}
+
+	return bulk_insert(ClassBookings, rows(), batch_size)
+
+def generate_facility_bookings(count: int, years: int, user_ids, rng: random.Random, batch_size: int):
+	"""
+	One hour facility bookings by random customers, over the same dates as the
+	classes, at random activities of each facility.
+	"""
+	facilities = db.session.execute(select(Facilities)).scalars().all()
+	until = datetime.date.today() + datetime.timedelta(weeks=10)
+	first = until - datetime.timedelta(days=365 * years)
+	now = datetime.datetime.now()
+
+	# Every (facility, date, hour) the facility is open, with its capacity
+	slots = []
+	for day in range((until - first).days):
+		date = first + datetime.timedelta(days=day)
+		for facility in facilities:
+			for hour in range(facility.open.hour, facility.close.hour):
+				slots.append((facility, date, hour))
+
+	def rows():
+		for slot in _sample_slots([facility.capacity for facility, date, hour in slots], count, rng):
+			facility, date, hour = slots[slot]
+			activity, price = rng.choice(list(facility.activities.items()))
+			booked = datetime.datetime.combine(date, datetime.time(hour)) - datetime.timedelta(days=rng.randint(0, 14), minutes=rng.randint(0, 1439))
+			yield {
+				"user_id": rng.choice(user_ids),
+				"facility_id": facility.id,
+				"activity": activity,
+				"price": price,
+				"date": date,
+				"start": datetime.time(hour),
+				"end": datetime.time(hour + 1),
+				"timestamp": min(booked, now),
+			}
+
+	return bulk_insert(FacilityBookings, rows(), batch_size)
+
+def generate(users: int = 1000, years: int = 1, class_bookings: int = 10000, facility_bookings: int = 10000, seed: int = 0, batch_size: int = 10000):
+	"""
+	Add synthetic customers, classes and bookings to the database. Returns the
+	number of rows added to each table.
+	"""
+	rng = random.Random(seed)
+	counts = {}
+	counts["users"] = generate_users(users, rng, batch_size)
+	counts["classes"] = generate_classes(years, rng, batch_size)
+
+	user_ids = db.session.execute(select(Users.id).where(Users.user_type == "user")).scalars().all()
+	counts["class bookings"] = generate_class_bookings(class_bookings, user_ids, rng, batch_size)
+	counts["facility bookings"] = generate_facility_bookings(facility_bookings, years, user_ids, rng, batch_size)
+
+	# Bulk inserts skip the ORM events that keep the rollups, booking index and
+	# caches up to date. Rebuild the rollups, bump the facility versions so other
+	# processes rebuild their indexes, and drop this process's caches.
+	rebuild_rollups()
+	db.session.execute(update(Facilities).values(booking_version=Facilities.booking_version + 1))
+	db.session.commit() # Everything at once
+	database_reset.send()
+	return counts
+
+@click.command("generate-data")
+@click.option("--users", default=100000, show_default=True, help="Customers to add.")
+@click.option("--years", default=3, show_default=True, help="Years of classes to add, ending ten weeks from today.")
+@click.option("--class-bookings", default=1000000, show_default=True, help="Class bookings to add (at most the classes' total capacity).")
+@click.option("--facility-bookings", default=2000000, show_default=True, help="Facility bookings to add (at most the facilities' total capacity).")
+@click.option("--seed", default=0, show_default=True, help="Random seed, for repeatable data.")
+@click.option("--batch-size", default=10000, show_default=True, help="Rows per INSERT.")
+@with_appcontext
+def generate_data_command(users, years, class_bookings, facility_bookings, seed, batch_size):
+	"""
+	Add synthetic customers, classes and bookings for load testing.
+	"""
+	if not db.session.execute(select(Facilities)).first():
+		raise click.ClickException("No facilities yet. Populate the database first.")
+
+	for table, count in generate(users, years, class_bookings, facility_bookings, seed, batch_size).items():
+		click.echo(f"Added {count} {table}")
@@ -0,0 +1,124 @@
+# vertex/app/user_search.py
+"""
+Prefix search over customers' emails and names, for employees booking a class
+or facility on a customer's behalf.
+
+Searches are case insensitive range queries on the indexed lower case email,
+firstname and lastname columns. With USER_SEARCH_CACHE on, they are answered from an in-process
+sorted index of customers instead, rebuilt when users change.
+"""
+
+from bisect import bisect_left
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, and_, event, func
+
+from .models import db, database_reset, Users
+
+# Sorts after every character, so [prefix, prefix + END) holds every string starting with prefix
+END = "\U0010ffff"
+
+def _prefix_range(column, prefix: str):
+	return and_(column >= prefix, column < prefix + END)
+
+def _as_dict(id, email, firstname, lastname):
+	return {"id": id, "email": email, "firstname": firstname, "lastname": lastname}
+
+def user_search_query(prefix: str, limit: int = 10):
+	"""
+	Statement selecting customers whose email, first name or last name starts with
+	prefix (case insensitive), ordered by email.
+	"""
+	# One range query per (user_type, lower(column)) index, so each is an index
+	# search. Each keeps its first matches by email, as only those can be among
+	# the first of the union
+	matches = []
+	for column in (Users.email, Users.firstname, Users.lastname):
+		matches.append(
+			select(Users.id)
+			.where(Users.user_type == "user", _prefix_range(func.lower(column), prefix.lower()))
+			.order_by(Users.email)
+			.limit(limit)
+			.subquery().select()
+		)
+
+	return select(Users.id, Users.email, Users.firstname, Users.lastname) \
+		.where(Users.id.in_(matches[0].union(*matches[1:]))) \
+		.order_by(Users.email) \
+		.limit(limit)
+
+def query_users(prefix: str, limit: int = 10):
+	"""
+	Customers whose email or name starts with prefix, from the database.
+	"""
+	return [_as_dict(*row) for row in db.session.execute(user_search_query(prefix, limit))]
+
+class UserPrefixIndex:
+	"""
+	Sorted array of (lower case key, user id) pairs for every customer, where the
+	keys are their email, first name, last name and full name. Everything starting
+	with a prefix is one binary search away.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._entries = None
+		self._users = {}
+		self._built_at = 0
+
+	def invalidate(self, *args, **kwargs):
+		"""
+		Drop the index. It is rebuilt on the next search.
+		"""
+		with self._lock:
+			self._entries = None
+
+	def _build(self):
+		rows = db.session.execute(
+			select(Users.id, Users.email, Users.firstname, Users.lastname).where(Users.user_type == "user")
+		)
+		entries = []
+		users = {}
+		for id, email, firstname, lastname in rows:
+			users[id] = (id, email, firstname, lastname)
+			for key in (email, firstname, lastname, f"{firstname} {lastname}"):
+				entries.append((key.lower(), id))
+		entries.sort()
+		return entries, users
+
+	def search(self, prefix: str, limit: int = 10, ttl: int = None):
+		"""
+		Customers with a key starting with prefix (case insensitive), ordered by email.
+		The index is rebuilt if it is older than ttl seconds, to pick up changes
+		made by other processes.
+		"""
+		with self._lock:
+			if self._entries is None or (ttl and time.time() - self._built_at > ttl):
+				self._entries, self._users = self._build()
+				self._built_at = time.time()
+			entries, users = self._entries, self._users
+
+		prefix = prefix.lower()
+		found = set()
+		for key, id in entries[bisect_left(entries, (prefix,)):]:
+			if not key.startswith(prefix):
+				break
+			found.add(id)
+
+		return [_as_dict(*users[id]) for id in sorted(found, key=lambda id: users[id][1])][:limit]
+
+user_index = UserPrefixIndex()
+
+for mapper_event in ("after_insert", "after_update", "after_delete"):
+	event.listen(Users, mapper_event, user_index.invalidate)
+database_reset.connect(user_index.invalidate, weak=False)
+
+def search_users(prefix: str, limit: int = 10):
+	"""
+	Customers whose email or name starts with prefix, from the in-process index if
+	USER_SEARCH_CACHE is on, otherwise from the database.
+	"""
+	if current_app.config.get("USER_SEARCH_CACHE"):
+		return user_index.search(prefix, limit, ttl=current_app.config.get("USER_SEARCH_CACHE_TTL"))
+	return query_users(prefix, limit)
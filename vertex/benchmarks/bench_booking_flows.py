@@ -0,0 +1,156 @@
+# vertex/benchmarks/bench_booking_flows.py
+"""
+Load benchmark for the customer and manager flows, against a throwaway SQLite
+database filled with synthetic data (see app/synthetic.py).
+
+Each flow is requested repeatedly through the Flask test client. Reported per
+flow: p50, p95 and p99 latency, and queries per request (from the Server-Timing
+header the query profiler adds).
+
+Every flow but "book class" only reads. That one books a class per request, so
+it is given a fresh class for each, which no earlier request has filled up, and
+its bookings and classes are deleted before the next flow runs.
+
+Run from the vertex directory:
+	python benchmarks/bench_booking_flows.py [iterations] [users] [years] [class bookings] [facility bookings]
+
+The defaults run in under a minute. For production-like volumes, try
+	python benchmarks/bench_booking_flows.py 200 100000 3 1000000 2000000
+"""
+
+import datetime
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select, func
+
+from app import create_app, models
+from app.catalogue import catalogue_cache
+from app.models import db, Users, Classes, ClassBookings, Facilities, FacilityBookings
+from app.synthetic import generate, PASSWORD
+
+def percentile(timings, fraction):
+	"""
+	The given percentile (0-1) of a sorted list.
+	"""
+	return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+def login(app, path, email):
+	"""
+	A test client logged in through the given login page.
+	"""
+	client = app.test_client()
+	client.post(path, data={"email": email, "password": PASSWORD})
+	return client
+
+def fresh_classes(app, count: int):
+	"""
+	Adds count classes tomorrow for the "book class" flow to book. Returns their
+	ids, and a function deleting them and their bookings.
+	"""
+	with app.app_context():
+		classes = [Classes("Benchmark", datetime.time(10), 1, datetime.date.today() + datetime.timedelta(days=1), 10) for _ in range(count)]
+		db.session.add_all(classes)
+		db.session.commit()
+		ids = [class_.id for class_ in classes]
+		catalogue_cache.invalidate("classes")
+
+	def delete():
+		with app.app_context():
+			# Through the session, so the analytics rollups are taken back down too
+			for booking in db.session.execute(select(ClassBookings).where(ClassBookings.class_id.in_(ids))).scalars():
+				db.session.delete(booking)
+			for class_ in db.session.execute(select(Classes).where(Classes.id.in_(ids))).scalars():
+				db.session.delete(class_)
+			db.session.commit()
+			catalogue_cache.invalidate("classes")
+
+	return ids, delete
+
+def flows(app, rng, iterations: int):
+	"""
+	Returns (name, function making one request, function undoing its writes or
+	None) triples. Customers are the synthetic users with the most facility
+	bookings, so their pages are the heaviest.
+	"""
+	with app.app_context():
+		busiest = db.session.execute(
+			select(Users.email).join(FacilityBookings, FacilityBookings.user_id == Users.id)
+			.where(Users.email.like("synthetic.%"))
+			.group_by(Users.id).order_by(func.count(FacilityBookings.id).desc()).limit(5)
+		).scalars().all()
+		facilities = db.session.execute(select(Facilities.id)).scalars().all()
+
+	customers = [login(app, "/login", email) for email in busiest]
+	manager = login(app, "/admin/login", "rick@jordan.com") # Same password as the synthetic users
+
+	# One class per request, and one for the warm up
+	unbooked, delete_classes = fresh_classes(app, iterations + 1)
+
+	customer = lambda: rng.choice(customers)
+	return [
+		("login", lambda: app.test_client().post("/login", data={"email": rng.choice(busiest), "password": PASSWORD}), None),
+		("classes", lambda: customer().get("/classes"), None),
+		("book class", lambda: customer().get(f"/classes/{unbooked.pop()}"), delete_classes),
+		("facility", lambda: customer().get(f"/facility/{rng.choice(facilities)}"), None),
+		("bookings", lambda: customer().get("/bookings"), None),
+		("payment", lambda: customer().get("/payment/20"), None),
+		("plot", lambda: manager.get(f"/plots/{rng.randint(1, 14)}"), None),
+	]
+
+def measure(request, iterations):
+	"""
+	Returns (sorted seconds, queries per request, errors) for a flow.
+	"""
+	request() # Warm up
+	timings, queries, errors = [], [], 0
+	for _ in range(iterations):
+		start = time.perf_counter()
+		response = request()
+		timings.append(time.perf_counter() - start)
+		errors += response.status_code >= 400
+		match = re.search(r'db;desc="(\d+) queries"', response.headers.get("Server-Timing", ""))
+		if match:
+			queries.append(int(match[1]))
+	timings.sort()
+	return timings, statistics.mean(queries) if queries else float("nan"), errors
+
+def main():
+	args = [int(arg) for arg in sys.argv[1:]]
+	iterations, users, years, class_bookings, facility_bookings = args + [100, 5000, 1, 50000, 100000][len(args):]
+
+	with tempfile.TemporaryDirectory() as tmp:
+		app = create_app({
+			"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "bench.db"),
+			"SECRET_KEY": os.getenv("SECRET_KEY") or "benchmark",
+			"WTF_CSRF_ENABLED": False,
+			"SLOW_REQUEST_MS": None,
+			"SLOW_REQUEST_QUERIES": None,
+		})
+		with app.app_context():
+			models.reset_database()
+			models.populate_database()
+			start = time.perf_counter()
+			counts = generate(users, years, class_bookings, facility_bookings, seed=1)
+			print(", ".join(f"{count} {table}" for table, count in counts.items()) + f" generated in {time.perf_counter() - start:.1f} s")
+
+		print(f"{'flow':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'errors':>8}")
+		for name, request, undo in flows(app, random.Random(1), iterations):
+			timings, queries, errors = measure(request, iterations)
+			if undo is not None:
+				undo()
+			print(f"{name:<12}{percentile(timings, 0.5) * 1000:>10.1f}{percentile(timings, 0.95) * 1000:>10.1f}{percentile(timings, 0.99) * 1000:>10.1f}{queries:>10.1f}{errors:>8}")
+
+		with app.app_context():
+			db.session.close()
+			db.engine.dispose()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,100 @@
+# vertex/benchmarks/bench_plot_render.py
+"""
+Benchmark for rendering the manager analytics plots.
+
+Compares the old pipeline (render at the default size, save a second copy
+with savefig, decode with PIL, resize and re-encode) with the current one
+(size the figure to the bounding box up front and render once).
+
+Run from the vertex directory:
+	python benchmarks/bench_plot_render.py [iterations]
+"""
+
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+from PIL import Image
+
+from app.admin.plots import plot_figure, PLOT_MAX_WIDTH, PLOT_MAX_HEIGHT
+
+XS = ["SP", "FR", "SC1", "SC2", "SH", "CW", "S"]
+YS = [120, 85, 40, 38, 150, 60, 75]
+
+def old_render(path):
+	"""
+	The render-then-resize pipeline plot() used before.
+	"""
+	fig = Figure()
+	axis = fig.add_subplot(1, 1, 1)
+	axis.bar(XS, YS, width=0.3)
+	fig.savefig(path)
+
+	output = io.BytesIO()
+	FigureCanvas(fig).print_png(output)
+	img = Image.open(io.BytesIO(output.getvalue()))
+
+	width, height = img.size
+	ratio = min(1, PLOT_MAX_WIDTH / width, PLOT_MAX_HEIGHT / height)
+	img = img.resize((int(width * ratio), int(height * ratio)), Image.LANCZOS)
+
+	output = io.BytesIO()
+	img.save(output, format="PNG")
+	return output.getvalue()
+
+def new_render(path):
+	"""
+	The single-pass pipeline plot() uses now.
+	"""
+	fig = plot_figure()
+	axis = fig.add_subplot(1, 1, 1)
+	axis.bar(XS, YS, width=0.3)
+
+	output = io.BytesIO()
+	FigureCanvas(fig).print_png(output)
+	png = output.getvalue()
+	with open(path, "wb") as f:
+		f.write(png)
+	return png
+
+def measure(render, path, iterations):
+	"""
+	Returns (median seconds, p95 seconds, peak traced bytes, image size) for a render function.
+	"""
+	render(path) # Warm up font caches etc.
+
+	timings = []
+	for _ in range(iterations):
+		start = time.perf_counter()
+		render(path)
+		timings.append(time.perf_counter() - start)
+
+	tracemalloc.start()
+	png = render(path)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	timings.sort()
+	p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+	return statistics.median(timings), p95, peak, Image.open(io.BytesIO(png)).size
+
+def main():
+	iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, "plot.png")
+		print(f"{'pipeline':<10}{'median ms':>12}{'p95 ms':>10}{'peak KiB':>12}{'size':>12}")
+		for name, render in [("old", old_render), ("new", new_render)]:
+			median, p95, peak, size = measure(render, path, iterations)
+			print(f"{name:<10}{median * 1000:>12.1f}{p95 * 1000:>10.1f}{peak / 1024:>12.0f}{size[0]:>7}x{size[1]}")
+
+if __name__ == "__main__":
+	main()
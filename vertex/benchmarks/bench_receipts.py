@@ -0,0 +1,77 @@
+# vertex/benchmarks/bench_receipts.py
+"""
+Benchmark of PDF receipt downloads (/download/<price>/<discount>), against a
+throwaway SQLite database and receipt cache directory.
+
+Reported: receipts per second when every receipt is rendered, when they come
+from the in-memory cache, and when they come from the disk cache (as they do
+for a worker process that hasn't served them yet).
+
+Run from the vertex directory:
+	python benchmarks/bench_receipts.py [receipts]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app, models
+from app.models import db
+from app.extensions import receipt_cache
+
+def rate(client, receipts, before_each=None):
+	"""
+	Returns receipts per second, and the number of failed requests, for
+	downloading each (price, discount) once.
+	"""
+	errors = 0
+	elapsed = 0
+	for price, discount in receipts:
+		if before_each:
+			before_each()
+		start = time.perf_counter()
+		response = client.get(f"/download/{price}/{discount}")
+		elapsed += time.perf_counter() - start
+		errors += response.status_code != 200 or response.headers["Content-Type"] != "application/pdf"
+	return len(receipts) / elapsed, errors
+
+def main():
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+	receipts = [(10 + n % 90, (n // 90) % 50) for n in range(count)]
+
+	with tempfile.TemporaryDirectory() as tmp:
+		app = create_app({
+			"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "bench.db"),
+			"SECRET_KEY": os.getenv("SECRET_KEY") or "benchmark",
+			"WTF_CSRF_ENABLED": False,
+			"RECEIPT_CACHE_SIZE": count,
+			"RECEIPT_DISK_CACHE_DIR": os.path.join(tmp, "receipts"),
+			"SLOW_REQUEST_MS": None,
+			"SLOW_REQUEST_QUERIES": None,
+		})
+		with app.app_context():
+			models.reset_database()
+			models.populate_database()
+
+		client = app.test_client()
+		client.post("/login", data={"email": "john@doe.com", "password": "Lemonade!1"})
+		client.get("/download/1/0") # Warm up, importing xhtml2pdf
+
+		print(f"{'receipts':<12}{'per second':>12}{'errors':>8}")
+		for name, before_each in [
+			("rendered", None), # Every receipt is new
+			("disk", receipt_cache.clear),
+			("memory", None),
+		]:
+			per_second, errors = rate(client, receipts, before_each)
+			print(f"{name:<12}{per_second:>12.1f}{errors:>8}")
+
+		with app.app_context():
+			db.session.close()
+			db.engine.dispose()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,124 @@
+# vertex/benchmarks/bench_sqlite_profile.py
+"""
+Concurrency benchmark of mixed read/write booking traffic, comparing SQLite's
+default settings with the tuned profile in config.py (see app/sqlite.py).
+
+Each profile gets a fresh throwaway database. Threads then repeatedly either
+book a facility (a write) or read a customer's bookings and a class's head
+count (reads). Reported per profile: operations per second, p50 and p95
+latency of reads and writes, and failed operations (e.g. "database is locked").
+
+Run from the vertex directory:
+	python benchmarks/bench_sqlite_profile.py [threads] [operations per thread] [write fraction]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, models
+from app.models import db, ClassBookings, FacilityBookings, Facilities
+from app.booking import book_facility, CapacityError, BookingContentionError
+
+PROFILES = {
+	"default": {"SQLITE_PRAGMAS": {}, "DATABASE_POOL": {}, "SQLALCHEMY_ENGINE_OPTIONS": {}},
+	"tuned": {},
+}
+
+def percentile(timings, fraction):
+	"""
+	The given percentile (0-1) of a list, in milliseconds.
+	"""
+	if not timings:
+		return float("nan")
+	timings = sorted(timings)
+	return timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000
+
+def run(app, threads: int, operations: int, write_fraction: float):
+	"""
+	Returns (operations per second, read timings, write timings, failures).
+	"""
+	with app.app_context():
+		facilities = db.session.execute(select(Facilities.id, Facilities.activities)).all()
+	reads, writes = [], []
+	failures = []
+	barrier = threading.Barrier(threads)
+
+	def worker(seed):
+		rng = random.Random(seed)
+		with app.app_context():
+			barrier.wait()
+			for _ in range(operations):
+				user_id = rng.randint(1, 8)
+				start = time.perf_counter()
+				try:
+					if rng.random() < write_fraction:
+						facility_id, activities = rng.choice(facilities)
+						activity, price = rng.choice(list(activities.items()))
+						hour = rng.randint(8, 20)
+						book_facility(
+							user_id=user_id, facility_id=facility_id, activity=activity, price=price,
+							date=datetime.date.today() + datetime.timedelta(days=rng.randint(1, 60)),
+							start=datetime.time(hour), end=datetime.time(hour + 1),
+						)
+						writes.append(time.perf_counter() - start)
+					else:
+						db.session.execute(select(FacilityBookings).where(FacilityBookings.user_id == user_id)).all()
+						db.session.execute(select(func.count(ClassBookings.id)).where(ClassBookings.class_id == rng.randint(1, 10))).scalar()
+						db.session.commit()
+						reads.append(time.perf_counter() - start)
+				except (OperationalError, BookingContentionError, CapacityError) as e:
+					db.session.rollback()
+					failures.append(type(e).__name__)
+				finally:
+					db.session.remove()
+
+	workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+	start = time.perf_counter()
+	for thread in workers:
+		thread.start()
+	for thread in workers:
+		thread.join()
+	elapsed = time.perf_counter() - start
+	return threads * operations / elapsed, reads, writes, failures
+
+def main():
+	args = sys.argv[1:]
+	threads = int(args[0]) if len(args) > 0 else 16
+	operations = int(args[1]) if len(args) > 1 else 200
+	write_fraction = float(args[2]) if len(args) > 2 else 0.2
+
+	print(f"{threads} threads, {operations} operations each, {write_fraction:.0%} writes")
+	print(f"{'profile':<10}{'ops/s':>10}{'read p50':>10}{'read p95':>10}{'write p50':>11}{'write p95':>11}{'failed':>8}")
+	for name, options in PROFILES.items():
+		with tempfile.TemporaryDirectory() as tmp:
+			app = create_app({
+				"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "bench.db"),
+				"SECRET_KEY": os.getenv("SECRET_KEY") or "benchmark",
+				"SLOW_REQUEST_MS": None,
+				"SLOW_REQUEST_QUERIES": None,
+				**options,
+			})
+			with app.app_context():
+				models.reset_database()
+				models.populate_database()
+
+			per_second, reads, writes, failures = run(app, threads, operations, write_fraction)
+			print(f"{name:<10}{per_second:>10.1f}{percentile(reads, 0.5):>10.1f}{percentile(reads, 0.95):>10.1f}"
+				f"{percentile(writes, 0.5):>11.1f}{percentile(writes, 0.95):>11.1f}{len(failures):>8}")
+
+			with app.app_context():
+				db.session.close()
+				db.engine.dispose()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,62 @@
+# vertex/benchmarks/bench_startup.py
+"""
+Benchmark for app startup: time to import the app package and run create_app(),
+and the resident memory of the process afterwards.
+
+Each run is a fresh interpreter, so nothing is already imported. The "eager"
+runs also import the plotting and PDF modules up front, as the views used to;
+the "lazy" runs leave them to the first request that needs them.
+
+Run from the vertex directory:
+	python benchmarks/bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+VERTEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+HEAVY = ["matplotlib", "numpy", "PIL", "xhtml2pdf", "reportlab"]
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+from app import create_app
+if sys.argv[1] == "eager":
+	import app.admin.plots, app.pdf
+create_app()
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+	"seconds": elapsed,
+	"rss_kib": rss // 1024 if sys.platform == "darwin" else rss,
+	"heavy": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY,)
+
+def run(mode):
+	"""
+	Start a fresh interpreter, create the app, and return its measurements.
+	"""
+	output = subprocess.run(
+		[sys.executable, "-c", CHILD, mode],
+		cwd=VERTEX, capture_output=True, text=True, check=True,
+	).stdout
+	return json.loads(output.strip().splitlines()[-1])
+
+def main():
+	runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+	print(f"{'mode':<8}{'median ms':>12}{'max RSS MiB':>14}  heavy modules loaded")
+	for mode in ["eager", "lazy"]:
+		results = [run(mode) for _ in range(runs)]
+		median = statistics.median(result["seconds"] for result in results)
+		rss = statistics.median(result["rss_kib"] for result in results)
+		heavy = ", ".join(results[-1]["heavy"]) or "none"
+		print(f"{mode:<8}{median * 1000:>12.0f}{rss / 1024:>14.1f}  {heavy}")
+
+if __name__ == "__main__":
+	main()
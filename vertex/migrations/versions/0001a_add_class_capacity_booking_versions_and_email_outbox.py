@@ -0,0 +1,61 @@
+"""Add class capacity, booking versions and the email outbox
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 14:02:41.517093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('emailoutbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(length=100), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('html', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.Column('claim', sa.String(length=32), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Existing classes get the default capacity, and existing rows start at
+    # booking version 0
+    with op.batch_alter_table('classes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity', sa.Integer(), nullable=False, server_default='25'))
+        batch_op.add_column(sa.Column('booking_version', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('facilities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('booking_version', sa.Integer(), nullable=False, server_default='0'))
+
+    # The models set these defaults themselves
+    with op.batch_alter_table('classes', schema=None) as batch_op:
+        batch_op.alter_column('capacity', server_default=None)
+        batch_op.alter_column('booking_version', server_default=None)
+
+    with op.batch_alter_table('facilities', schema=None) as batch_op:
+        batch_op.alter_column('booking_version', server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('facilities', schema=None) as batch_op:
+        batch_op.drop_column('booking_version')
+
+    with op.batch_alter_table('classes', schema=None) as batch_op:
+        batch_op.drop_column('booking_version')
+        batch_op.drop_column('capacity')
+
+    op.drop_table('emailoutbox')
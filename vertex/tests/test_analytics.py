@@ -1,7 +1,10 @@
 # vertex/tests/test_analytics.py
 
-from app import create_app, models
+import datetime
+
+from app import create_app, models, analytics
 from app.models import db
+from app.cache import LRUCache
 
 class TestAnalytics:
 	"""
@@ -77,4 +80,111 @@ class TestAnalytics:
 				assert b"Logged in as 3" in response.data
 		
 				response = self.client.get("/admin/analytics_membership")
-				assert response.status_code == 200
\ No newline at end of file
+				assert response.status_code == 200
+
+	def test_facility_totals(self):
+		"""
+		Test that facility bookings are counted and summed per facility in one query.
+		"""
+		with self.app.app_context():
+			today = datetime.date.today()
+			self.db.session.add(self.models.FacilityBookings(user_id=1, facility_id=1, activity="lessons", price=5, date=today, start=datetime.time(8), end=datetime.time(9)))
+			self.db.session.add(self.models.FacilityBookings(user_id=2, facility_id=1, activity="general use", price=10, date=today, start=datetime.time(9), end=datetime.time(10)))
+			self.db.session.add(self.models.FacilityBookings(user_id=1, facility_id=3, activity="1 hour sessions", price=5, date=today - datetime.timedelta(days=30), start=datetime.time(8), end=datetime.time(9)))
+			self.db.session.commit()
+
+			totals = analytics.facility_totals(since=today - datetime.timedelta(days=7))
+			assert totals[1] == (2, 15)
+			assert 3 not in totals # Booking is older than a week
+
+			assert analytics.facility_totals()[3] == (1, 5)
+			assert analytics.activity_counts(1) == {"lessons": 1, "general use": 1}
+
+	def test_class_and_membership_totals(self):
+		"""
+		Test that class sessions and memberships are aggregated as intended.
+		"""
+		with self.app.app_context():
+			self.db.session.add(self.models.ClassBookings(user_id=1, class_id=1))
+			self.db.session.add(self.models.ClassBookings(user_id=2, class_id=1))
+			self.db.session.commit()
+
+			labels, counts = analytics.class_session_counts("Pilates")
+			assert len(labels) == 10 # Ten weeks of pilates classes
+			assert counts[0] == 2
+			assert sum(counts) == 2
+
+			assert analytics.class_revenue()["Pilates"] == 50
+
+			labels, counts = analytics.membership_counts()
+			assert labels == ["The Monthly Membership", "The Annual Membership"]
+			assert counts == [1, 0]
+
+	def test_plots_render(self):
+		"""
+		Test that every analytics plot renders as a PNG.
+		"""
+		with self.app.app_context():
+			with self.client:
+				self.client.post("/admin/login", follow_redirects=True, data = self.admin_login)
+
+				for plot_id in range(1, 15):
+					response = self.client.get(f"/plots/{plot_id}")
+					assert response.status_code == 200
+					assert response.mimetype == "image/png"
+
+	def test_plot_cache_etags(self):
+		"""
+		Test that plots are served from cache with ETags, and invalidated when bookings change.
+		"""
+		with self.app.app_context():
+			with self.client:
+				self.client.post("/admin/login", follow_redirects=True, data = self.admin_login)
+
+				response = self.client.get("/plots/5")
+				assert response.status_code == 200
+				etag = response.headers["ETag"]
+
+				# Unchanged data gives a 304 with no body
+				response = self.client.get("/plots/5", headers={"If-None-Match": etag})
+				assert response.status_code == 304
+				assert response.data == b""
+
+				# A new booking changes the data version, so the plot is re-rendered
+				self.db.session.add(self.models.FacilityBookings(user_id=1, facility_id=3, activity="1 hour sessions", price=5, date=datetime.date.today(), start=datetime.time(10), end=datetime.time(11)))
+				self.db.session.commit()
+
+				response = self.client.get("/plots/5", headers={"If-None-Match": etag})
+				assert response.status_code == 200
+				assert response.headers["ETag"] != etag
+
+	def test_data_version_on_commit(self):
+		"""
+		Test that the data version only moves on once a change is committed, and
+		not for changes rolled back.
+		"""
+		with self.app.app_context():
+			version = str(analytics.data_version)
+			booking = self.models.FacilityBookings(user_id=2, facility_id=3, activity="1 hour sessions", price=5, date=datetime.date.today(), start=datetime.time(12), end=datetime.time(13))
+			self.db.session.add(booking)
+			self.db.session.flush()
+			assert str(analytics.data_version) == version
+			self.db.session.rollback()
+			assert str(analytics.data_version) == version
+
+			self.db.session.add(booking)
+			self.db.session.commit()
+			assert str(analytics.data_version) != version
+
+	def test_lru_cache_eviction(self):
+		"""
+		Test that the LRU cache evicts the least recently used entry when full.
+		"""
+		cache = LRUCache(max_entries=2)
+		cache.set("a", 1)
+		cache.set("b", 2)
+		assert cache.get("a") == 1 # "a" is now the most recently used
+		cache.set("c", 3)
+		assert cache.get("b") is None
+		assert cache.get("a") == 1
+		assert cache.get("c") == 3
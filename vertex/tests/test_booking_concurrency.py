@@ -0,0 +1,104 @@
+# vertex/tests/test_booking_concurrency.py
+
+import datetime
+import threading
+
+from app import create_app, models
+from app.models import db
+from app.booking import book_class, book_facility, CapacityError, BookingContentionError
+
+class TestBookingConcurrency:
+	"""
+	Class for stress testing concurrent bookings of the same class or facility slot.
+	"""
+
+	THREADS = 16
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app({
+			"BOOKING_MAX_ATTEMPTS": 50,
+		})
+		self.db = db
+		self.models = models
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def hammer(self, book):
+		"""
+		Call book() from many threads at once. Returns the outcome of each call.
+		"""
+		barrier = threading.Barrier(self.THREADS)
+		outcomes = []
+
+		def worker(user_id):
+			with self.app.app_context():
+				barrier.wait()
+				try:
+					book(user_id)
+					outcomes.append("booked")
+				except CapacityError:
+					outcomes.append("full")
+				except BookingContentionError:
+					outcomes.append("contention")
+				finally:
+					self.db.session.remove()
+
+		threads = [threading.Thread(target=worker, args=(1 + i % 2,)) for i in range(self.THREADS)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		return outcomes
+
+	def test_facility_slot_never_overbooked(self):
+		"""
+		Test that the last places in a facility slot can't be taken twice.
+		"""
+		date = datetime.date(2023, 12, 1)
+		outcomes = self.hammer(lambda user_id: book_facility(
+			user_id=user_id, facility_id=4, activity="1 hour sessions", price=5,
+			date=date, start=datetime.time(18), end=datetime.time(19)
+		))
+
+		with self.app.app_context():
+			booked = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 4, models.FacilityBookings.date == date).count()
+			capacity = models.Facilities.query.where(models.Facilities.id == 4).first().capacity
+
+		assert len(outcomes) == self.THREADS
+		assert booked <= capacity
+		assert outcomes.count("booked") == booked
+		assert booked == capacity # With enough retries every place is filled
+
+	def test_class_never_overbooked(self):
+		"""
+		Test that the last places in a class can't be taken twice.
+		"""
+		with self.app.app_context():
+			small_class = models.Classes("Spin", datetime.time(7), 1, datetime.date(2023, 12, 2), price=10, capacity=5)
+			self.db.session.add(small_class)
+			self.db.session.commit()
+			class_id = small_class.id
+
+		outcomes = self.hammer(lambda user_id: book_class(user_id=user_id, class_id=class_id))
+
+		with self.app.app_context():
+			booked = models.ClassBookings.query.where(models.ClassBookings.class_id == class_id).count()
+
+		assert len(outcomes) == self.THREADS
+		assert booked == 5
+		assert outcomes.count("booked") == 5
+		assert outcomes.count("full") + outcomes.count("contention") == self.THREADS - 5
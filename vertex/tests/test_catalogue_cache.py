@@ -0,0 +1,153 @@
+# vertex/tests/test_catalogue_cache.py
+
+import datetime
+import os
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, models
+from app.models import db
+from app.cache import RedisCache
+from app.catalogue import catalogue_cache
+
+class TestCatalogueCache:
+	"""
+	Class for testing the class and facility catalogue cache.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app({
+			"WTF_CSRF_ENABLED": False,
+			# Catalogue versions otherwise also move on every TTL seconds, which
+			# could happen between two requests of a test
+			"CATALOGUE_CACHE_TTL": None,
+		})
+		self.client = self.app.test_client()
+		self.db = db
+		self.models = models
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+		self.admin_login = {
+			"email": "rick@jordan.com",
+			"password": "Lemonade!1",
+		}
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def catalogue_queries(self, url):
+		"""
+		Fetch a page, and return it with the number of catalogue queries it ran.
+		"""
+		statements = []
+		def count(conn, cursor, statement, parameters, context, executemany):
+			if "FROM facilities" in statement or "FROM classes" in statement:
+				statements.append(statement)
+
+		with self.app.app_context():
+			engine = self.db.engine
+		event.listen(engine, "before_cursor_execute", count)
+		try:
+			response = self.client.get(url)
+		finally:
+			event.remove(engine, "before_cursor_execute", count)
+		assert response.status_code == 200
+		return response, len(statements)
+
+	def test_listings_cached(self):
+		"""
+		Test that the listings are only read from the database once.
+		"""
+		for url in ("/facilities", "/classes", "/classes?from=2100-01-01"):
+			first, queries = self.catalogue_queries(url)
+			assert queries == 1
+			second, queries = self.catalogue_queries(url)
+			assert queries == 0
+			assert second.data == first.data
+
+	def test_facility_changes(self):
+		"""
+		Test that editing or adding a facility drops the cached facility listing,
+		and not the class listing.
+		"""
+		self.client.post("/admin/login", follow_redirects=True, data = self.admin_login)
+		self.catalogue_queries("/facilities")
+		self.catalogue_queries("/classes")
+
+		self.client.post("/admin/edit_facility/2", follow_redirects=True, data = {"new_name": "Renamed Studio"})
+		response, queries = self.catalogue_queries("/facilities")
+		assert queries == 1
+		assert b"Renamed Studio" in response.data
+		assert self.catalogue_queries("/classes")[1] == 0
+
+		self.client.post("/admin/new_facility", follow_redirects=True, data = {
+			"name": "Brand New Court",
+			"open": "08:00",
+			"close": "20:00",
+			"capacity": 10,
+			"session_duration": 1,
+		})
+		assert b"Brand New Court" in self.catalogue_queries("/facilities")[0].data
+		self.client.get("/admin/logout")
+
+	def test_class_changes(self):
+		"""
+		Test that adding, editing and deleting classes drops the cached class listing.
+		"""
+		self.client.post("/admin/login", follow_redirects=True, data = self.admin_login)
+		date = datetime.date.today() + datetime.timedelta(days=1)
+		self.catalogue_queries("/classes")
+
+		response = self.client.post("/admin/new_class", follow_redirects=True, data = {
+			"name": "Cached Yoga",
+			"start": "10:00",
+			"duration": 1,
+			"date": date,
+			"price": "10",
+		})
+		assert b"New class created" in response.data
+		assert b"Cached Yoga" in self.catalogue_queries("/classes")[0].data
+
+		with self.app.app_context():
+			id = self.db.session.execute(db.select(models.Classes.id).where(models.Classes.name == "Cached Yoga")).scalar()
+		self.client.post(f"/admin/edit_class/{id}", follow_redirects=True, data = {"new_name": "Cached Pilates"})
+		response = self.catalogue_queries("/classes")[0]
+		assert b"Cached Pilates" in response.data and b"Cached Yoga" not in response.data
+
+		self.client.get(f"/admin/delete_class/{id}?confirm=True", follow_redirects=True)
+		assert b"Cached Pilates" not in self.catalogue_queries("/classes")[0].data
+		self.client.get("/admin/logout")
+
+	def test_redis_backend(self):
+		"""
+		Test the Redis backend, when the tests are given a server in REDIS_URL.
+		"""
+		if not os.getenv("REDIS_URL"):
+			pytest.skip("REDIS_URL isn't set")
+		pytest.importorskip("redis")
+		create_app({"CATALOGUE_CACHE_URL": os.getenv("REDIS_URL")})
+		try:
+			assert isinstance(catalogue_cache.backend, RedisCache)
+			version = catalogue_cache.version("classes")
+			assert catalogue_cache.get_or_load("classes", "test", lambda: [1, 2]) == [1, 2]
+			assert catalogue_cache.get_or_load("classes", "test", lambda: [3]) == [1, 2]
+			catalogue_cache.invalidate("classes")
+			assert catalogue_cache.version("classes") != version
+			assert catalogue_cache.get_or_load("classes", "test", lambda: [3]) == [3]
+		finally:
+			catalogue_cache.backend.clear()
+			# Back to the in-memory cache for the other tests
+			catalogue_cache.init_app(self.app)
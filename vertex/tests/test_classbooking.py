@@ -1,5 +1,7 @@
 # vertex/tests/test_classbooking.py
 
+import datetime
+import re
 from unittest.mock import patch
 from app import create_app, models
 from app.models import db
@@ -47,6 +49,60 @@ class TestClassBooking:
 		with self.app.app_context():
 			response = self.client.get("/classes")
 			assert response.status_code == 200
+
+	def listed_classes(self, url):
+		"""
+		Returns the ids of the classes on a listing page, and the link to the next page.
+		"""
+		response = self.client.get(url)
+		assert response.status_code == 200
+		html = response.data.decode()
+		next_url = re.search(r'href="([^"]*)" class="btn btn-outline-primary btn-sm">Later classes', html)
+		return [int(id) for id in re.findall(r"url: '/classes/(\d+)'", html)], next_url and next_url.group(1).replace("&amp;", "&")
+
+	def test_classes_pagination(self):
+		"""
+		Test that the class listing pages through upcoming classes in date order.
+		"""
+		with self.app.app_context():
+			# A class in the past is never listed
+			past = models.Classes("Yoga", datetime.time(9), 1, datetime.date.today() - datetime.timedelta(days=1), price=10)
+			self.db.session.add(past)
+			self.db.session.commit()
+
+			self.app.config["CLASSES_PAGE_SIZE"] = 25
+			try:
+				ids, next_url = self.listed_classes("/classes")
+				pages = 1
+				while next_url:
+					page, next_url = self.listed_classes(next_url)
+					ids += page
+					pages += 1
+			finally:
+				self.app.config["CLASSES_PAGE_SIZE"] = 100
+
+			upcoming = models.Classes.query.where(models.Classes.date >= datetime.date.today()) \
+				.order_by(models.Classes.date, models.Classes.start, models.Classes.id).all()
+			assert pages == 3
+			assert ids == [c.id for c in upcoming]
+			assert past.id not in ids
+
+	def test_classes_date_range(self):
+		"""
+		Test the from and to parameters of the class listing.
+		"""
+		with self.app.app_context():
+			first = models.Classes.query.where(models.Classes.date >= datetime.date.today()).order_by(models.Classes.date).first().date
+			week = [first, first + datetime.timedelta(days=6)]
+			ids, next_url = self.listed_classes(f"/classes?from={week[0]}&to={week[1]}")
+
+			in_range = models.Classes.query.where(models.Classes.date.between(*week)).all()
+			assert sorted(ids) == sorted(c.id for c in in_range)
+			assert len(ids) == 6 # One week of classes
+			assert next_url is None
+
+			assert self.client.get("/classes?from=notadate").status_code == 400
+			assert self.client.get("/classes?after=garbage").status_code == 400
 			
 	def test_valid_class_booking_customer(self):
 		"""
@@ -116,4 +172,24 @@ class TestClassBooking:
 				assert response.status_code == 200
 				new_booking = models.ClassBookings.query.where(models.ClassBookings.class_id == 2).first()
 				user = models.Users.query.where(models.Users.email == 'john@doe.com').first()
-				assert new_booking in user.class_bookings
\ No newline at end of file
+				assert new_booking in user.class_bookings
+
+	def test_full_class_booking_employee(self):
+		"""
+		Test that an employee booking a full class is told so plainly.
+		"""
+		with self.app.app_context():
+			target = self.db.session.get(models.Classes, 3)
+			target.capacity = 0
+			self.db.session.commit()
+
+			self.client.post("/employee-login", follow_redirects=True, data = {
+				"email": "lily@poole.com",
+				"password": "Lemonade!1",
+			})
+			response = self.client.post('/classes/3', follow_redirects=True, data={
+				"user_class_booked": "john@doe.com"
+			})
+			assert b"is fully booked" in response.data
+			assert b"CapacityError" not in response.data
+			self.client.get("/logout")
@@ -0,0 +1,169 @@
+# vertex/tests/test_conditional_get.py
+
+import datetime
+from unittest import mock
+
+from flask import render_template
+
+from app import create_app, models
+from app.models import db
+
+class TestConditionalGet:
+	"""
+	Class for testing ETags and 304 responses on the catalogue, bookings and
+	membership pages.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app({
+			"WTF_CSRF_ENABLED": False,
+			# Catalogue versions otherwise also move on every TTL seconds, which
+			# could happen between two requests of a test
+			"CATALOGUE_CACHE_TTL": None,
+		})
+		self.client = self.app.test_client()
+		self.db = db
+		self.models = models
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+		self.valid_login = {
+			"email": "john@doe.com",
+			"password": "Lemonade!1",
+		}
+		self.admin_login = {
+			"email": "rick@jordan.com",
+			"password": "Lemonade!1",
+		}
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def revalidate(self, client, url):
+		"""
+		Fetch a page, then fetch it again with its ETag. Returns the ETag and the
+		second response.
+		"""
+		first = client.get(url)
+		assert first.status_code == 200
+		assert first.headers["Cache-Control"] == "private, no-cache"
+		etag = first.headers["ETag"]
+		return etag, client.get(url, headers={"If-None-Match": etag})
+
+	def test_not_modified(self):
+		"""
+		Test that every page answers a request for the version the browser has
+		with a 304, without rendering it.
+		"""
+		client = self.app.test_client()
+		client.post("/login", follow_redirects=True, data = self.valid_login)
+		for url in ("/classes", "/facilities", "/bookings", "/my_memberships", "/new_membership"):
+			first = client.get(url)
+			with mock.patch("app.public.views.render_template", wraps=render_template) as render:
+				second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+				assert render.call_count == 0
+			assert second.status_code == 304
+			assert second.data == b""
+			assert second.headers["ETag"] == first.headers["ETag"]
+
+			# A different version is sent in full
+			assert client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+	def test_per_user(self):
+		"""
+		Test that users don't share ETags, as the pages show who is logged in.
+		"""
+		anonymous = self.client.get("/facilities").headers["ETag"]
+		client = self.app.test_client()
+		client.post("/login", follow_redirects=True, data = self.valid_login)
+		assert client.get("/facilities").headers["ETag"] != anonymous
+
+	def test_catalogue_changes(self):
+		"""
+		Test that a manager's changes to a facility change the facilities page's ETag.
+		"""
+		etag, response = self.revalidate(self.client, "/facilities")
+		assert response.status_code == 304
+
+		admin = self.app.test_client()
+		admin.post("/admin/login", follow_redirects=True, data = self.admin_login)
+		admin.post("/admin/edit_facility/3", follow_redirects=True, data = {"new_name": "Conditional Hall"})
+
+		response = self.client.get("/facilities", headers={"If-None-Match": etag})
+		assert response.status_code == 200
+		assert b"Conditional Hall" in response.data
+
+	def test_bookings_changes(self):
+		"""
+		Test that booking and cancelling change the bookings page's ETag.
+		"""
+		client = self.app.test_client()
+		client.post("/login", follow_redirects=True, data = self.valid_login)
+		etag, response = self.revalidate(client, "/bookings")
+		assert response.status_code == 304
+
+		client.post("/facility/4", data = {
+			"activity": "1 hour sessions",
+			"date_chosen": datetime.date.today() + datetime.timedelta(days=5),
+			"start_time": datetime.time(10),
+			"end_time": datetime.time(11),
+		})
+		client.get("/bookings") # Shows the flashed message
+		booked, response = self.revalidate(client, "/bookings")
+		assert booked != etag
+		assert response.status_code == 304
+
+		with self.app.app_context():
+			booking = self.db.session.execute(
+				db.select(models.FacilityBookings.id).where(models.FacilityBookings.facility_id == 4).order_by(models.FacilityBookings.id.desc())
+			).scalar()
+		client.post(f"/facilities/remove/{booking}")
+		client.get("/bookings") # Shows the flashed message
+		assert client.get("/bookings", headers={"If-None-Match": booked}).status_code == 200
+
+	def test_membership_changes(self):
+		"""
+		Test that joining a membership changes the membership page's ETag.
+		"""
+		client = self.app.test_client()
+		client.post("/login", follow_redirects=True, data = {"email": "alice@doe.com", "password": "Lemonade!1"})
+		etag, response = self.revalidate(client, "/my_memberships")
+		assert response.status_code == 304
+
+		with self.app.app_context():
+			user = self.db.session.execute(db.select(models.Users).where(models.Users.email == "alice@doe.com")).scalar()
+			today = datetime.date.today()
+			self.db.session.add(models.ActiveMemberships(user.id, 1, today, today + datetime.timedelta(days=30)))
+			self.db.session.commit()
+
+		response = client.get("/my_memberships", headers={"If-None-Match": etag})
+		assert response.status_code == 200
+		assert b"Cancel Membership" in response.data
+
+	def test_pending_flashes(self):
+		"""
+		Test that pages with messages waiting to be shown are always sent in full.
+		"""
+		client = self.app.test_client()
+		etag = client.get("/facilities").headers["ETag"]
+		with client.session_transaction() as session:
+			session["_flashes"] = [("success", "Flashed before the listing")]
+
+		response = client.get("/facilities", headers={"If-None-Match": etag})
+		assert response.status_code == 200
+		assert b"Flashed before the listing" in response.data
+		assert "ETag" not in response.headers
+
+		# Once shown, the page is cached again
+		assert client.get("/facilities", headers={"If-None-Match": etag}).status_code == 304
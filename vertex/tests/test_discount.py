@@ -1,7 +1,10 @@
 # vertex/tests/test_discount.py
 
+import datetime
+
 from app import create_app, models
 from app.models import db
+from app.discounts import session_count, discount_table
 
 class TestDiscount:
 	"""
@@ -62,3 +65,48 @@ class TestDiscount:
 				assert response.status_code == 200
 				booked_class = models.Classes.query.where(models.Classes.id == 6).first()
 				assert str(int(booked_class.price * 0.35)).encode() in response.data
+
+	def test_session_count(self):
+		"""
+		Test that only bookings in the next two weeks count as sessions.
+		"""
+		with self.app.app_context():
+			user = models.Users.query.where(models.Users.email == "john@doe.com").first()
+			today = datetime.date.today()
+			in_window = lambda date: today <= date < today + datetime.timedelta(weeks=2)
+
+			expected = len([b for b in models.ClassBookings.query.where(models.ClassBookings.user_id == user.id) if in_window(b.class_.date)]) \
+				+ len([b for b in models.FacilityBookings.query.where(models.FacilityBookings.user_id == user.id) if in_window(b.date)])
+			assert session_count(user.id) == expected
+
+			# A booking a month away doesn't count
+			self.db.session.add(models.FacilityBookings(user.id, 1, "general use", 10, today + datetime.timedelta(days=30), datetime.time(9), datetime.time(10)))
+			self.db.session.commit()
+			assert session_count(user.id) == expected
+
+	def test_discount_tiers(self):
+		"""
+		Test that the scheme with the highest threshold reached applies, and that
+		managers' changes are picked up straight away.
+		"""
+		with self.app.app_context():
+			assert discount_table.resolve(2) is None
+			assert discount_table.resolve(3)["value"] == 35
+			assert discount_table.resolve(10)["value"] == 35
+
+			self.client.post("/admin/login", follow_redirects=True, data = {
+				"email": "rick@jordan.com",
+				"password": "Lemonade!1",
+			})
+			self.client.post("/admin/new_discount", follow_redirects=True, data = {
+				"name": "Five Sessions, 50 off",
+				"value": 50,
+				"session_number": 5,
+			})
+			assert discount_table.resolve(4)["value"] == 35
+			assert discount_table.resolve(5)["value"] == 50
+
+			scheme = discount_table.resolve(5)["id"]
+			self.client.get(f"/admin/delete_discount/{scheme}?confirm=True", follow_redirects=True)
+			assert discount_table.resolve(5)["value"] == 35
+			self.client.get("/logout")
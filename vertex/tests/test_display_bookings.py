@@ -1,6 +1,8 @@
 # vertex/tests/test_display_bookings.py
 
+import datetime
 from unittest.mock import patch
+from sqlalchemy import event
 from app import create_app, models
 from app.models import db
 from flask_login import current_user
@@ -55,4 +57,33 @@ class TestDisplayBooking:
 				})
 
 				response = self.client.get('bookings')
-				assert response.status_code == 200
\ No newline at end of file
+				assert response.status_code == 200
+
+	def test_booking_page_query_count(self):
+		"""
+		Test that the booking page issues a fixed number of queries, however many bookings there are.
+		"""
+		with self.app.app_context():
+			for class_id in range(1, 31):
+				self.db.session.add(self.models.ClassBookings(user_id=1, class_id=class_id))
+			for facility_id in range(1, 8):
+				self.db.session.add(self.models.FacilityBookings(user_id=1, facility_id=facility_id, activity="general use", price=5, date=datetime.date(2023, 10, 1), start=datetime.time(8), end=datetime.time(9)))
+			self.db.session.commit()
+
+			self.client.post("/login", follow_redirects=True, data = self.valid_login)
+
+			statements = []
+			def count_statement(conn, cursor, statement, parameters, context, executemany):
+				statements.append(statement)
+
+			event.listen(self.db.engine, "before_cursor_execute", count_statement)
+			try:
+				response = self.client.get('/bookings')
+			finally:
+				event.remove(self.db.engine, "before_cursor_execute", count_statement)
+
+			assert response.status_code == 200
+			assert b"Pilates" in response.data
+			assert b"Climbing wall" in response.data
+			# Loading the user, their class bookings and their facility bookings
+			assert len(statements) <= 3
@@ -0,0 +1,241 @@
+# vertex/tests/test_email_outbox.py
+
+import contextlib
+import datetime
+import socketserver
+import threading
+import time
+
+from app import create_app, models
+from app.models import db
+from app.email import queue_email, email_sender
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+	"""
+	Just enough of an SMTP server to accept mail from smtplib, in the spirit of aiosmtpd.
+	"""
+	def reply(self, line):
+		self.wfile.write(line.encode() + b"\r\n")
+
+	def handle(self):
+		self.server.connections += 1
+		self.reply("220 localhost test SMTP")
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			command = line.decode().strip().upper()
+			if command.startswith("DATA"):
+				self.reply("354 End data with <CR><LF>.<CR><LF>")
+				data = []
+				while True:
+					line = self.rfile.readline()
+					if line in (b".\r\n", b""):
+						break
+					data.append(line)
+				self.server.messages.append(b"".join(data).decode())
+				self.reply("250 OK")
+			elif command.startswith("QUIT"):
+				self.reply("221 Bye")
+				return
+			else: # EHLO, MAIL, RCPT, RSET, NOOP...
+				self.reply("250 OK")
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self):
+		super().__init__(("localhost", 0), SMTPHandler)
+		self.connections = 0
+		self.messages = []
+
+class TestEmailOutbox:
+	"""
+	Class for testing the email outbox and background sender.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database and a local SMTP server...
+		"""
+		self.smtp = SMTPServer()
+		threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+
+		self.mail_settings = {
+			"MAIL_SERVER": "localhost",
+			"MAIL_PORT": self.smtp.server_address[1],
+			"MAIL_USE_SSL": False,
+			"MAIL_USERNAME": None,
+		}
+		self.app = create_app({**self.mail_settings, "EMAIL_OUTBOX_WORKER": False})
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		email_sender.stop()
+		self.smtp.shutdown()
+		self.smtp.server_close()
+
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def clear_outbox(self):
+		self.db.session.execute(self.db.delete(models.EmailOutbox))
+		self.db.session.commit()
+		self.smtp.connections = 0
+		self.smtp.messages.clear()
+
+	def test_signup_only_queues(self):
+		"""
+		Test that signing up queues the confirmation email instead of sending it.
+		"""
+		with self.app.app_context():
+			self.clear_outbox()
+			response = self.client.post('/customer-signup', follow_redirects=True, data = {
+				"email": "outbox@testing.com",
+				"first_name": "Out",
+				"last_name": "Box",
+				"password1": "Outbox12345",
+				"password2": "Outbox12345",
+				"date_of_birth": datetime.date(1990, 1, 1),
+			})
+			assert b"Account created!" in response.data
+
+			queued = models.EmailOutbox.query.all()
+			assert len(queued) == 1
+			assert queued[0].recipient == "outbox@testing.com"
+			assert queued[0].status == "pending"
+			assert self.smtp.connections == 0
+
+	def test_batch_uses_one_connection(self):
+		"""
+		Test that a batch of emails is delivered over a single SMTP connection.
+		"""
+		with self.app.app_context():
+			self.clear_outbox()
+			for i in range(5):
+				queue_email(f"person{i}@testing.com", "Hello", "<p>Hello</p>")
+
+			assert email_sender.drain_all() == (5, 0)
+			assert self.smtp.connections == 1
+			assert len(self.smtp.messages) == 5
+			assert all(email.status == "sent" for email in models.EmailOutbox.query.all())
+
+			# Nothing left to send
+			assert email_sender.drain_all() == (0, 0)
+			assert self.smtp.connections == 1
+
+	@contextlib.contextmanager
+	def smtp_down(self):
+		"""
+		Point the mail settings at a port nothing listens on.
+		"""
+		self.app.extensions["mail"].port = 1
+		try:
+			yield
+		finally:
+			self.app.extensions["mail"].port = self.smtp.server_address[1]
+
+	def test_failed_send_backs_off(self):
+		"""
+		Test that emails are retried later, with a growing delay, when the server is down.
+		"""
+		with self.app.app_context():
+			self.clear_outbox()
+			queue_email("retry@testing.com", "Hello", "<p>Hello</p>")
+
+			with self.smtp_down():
+				assert email_sender.drain() == (0, 1)
+				email = models.EmailOutbox.query.first()
+				assert email.status == "pending"
+				assert email.attempts == 1
+				first_delay = email.next_attempt_at - datetime.datetime.now()
+				assert first_delay > datetime.timedelta(0)
+
+				# Not due yet, so not attempted again
+				assert email_sender.drain() == (0, 0)
+
+				email.next_attempt_at = datetime.datetime.now()
+				self.db.session.commit()
+				assert email_sender.drain() == (0, 1)
+				assert email.attempts == 2
+				assert email.next_attempt_at - datetime.datetime.now() > first_delay
+
+				# Gives up after EMAIL_OUTBOX_MAX_ATTEMPTS
+				email.attempts = self.app.config["EMAIL_OUTBOX_MAX_ATTEMPTS"] - 1
+				email.next_attempt_at = datetime.datetime.now()
+				self.db.session.commit()
+				assert email_sender.drain() == (0, 1)
+				assert email.status == "failed"
+
+			# Once the server is back, only emails still pending are sent
+			queue_email("later@testing.com", "Hello", "<p>Hello</p>")
+			assert email_sender.drain_all() == (1, 0)
+			assert len(self.smtp.messages) == 1
+
+	def test_background_sender(self):
+		"""
+		Test that the background thread delivers queued emails.
+		"""
+		with self.app.app_context():
+			self.clear_outbox()
+			self.app.config["EMAIL_OUTBOX_WORKER"] = True
+			try:
+				queue_email("background@testing.com", "Hello", "<p>Hello</p>")
+
+				deadline = time.time() + 10
+				while not self.smtp.messages and time.time() < deadline:
+					time.sleep(0.05)
+			finally:
+				self.app.config["EMAIL_OUTBOX_WORKER"] = False
+				email_sender.stop()
+
+			assert len(self.smtp.messages) == 1
+			assert "background@testing.com" in self.smtp.messages[0]
+
+	def test_sender_starts_on_first_request(self):
+		"""
+		Test that emails left in the outbox (e.g. by a restart) are sent once an
+		app running the sender handles a request, without another email being queued.
+		"""
+		with self.app.app_context():
+			self.clear_outbox()
+			self.db.session.add(models.EmailOutbox("restart@testing.com", "Hello", "<p>Hello</p>"))
+			self.db.session.commit()
+
+		app = create_app({**self.mail_settings, "EMAIL_OUTBOX_WORKER": True})
+		try:
+			app.test_client().get("/")
+			deadline = time.time() + 10
+			while not self.smtp.messages and time.time() < deadline:
+				time.sleep(0.05)
+		finally:
+			email_sender.stop()
+
+		assert len(self.smtp.messages) == 1
+		assert "restart@testing.com" in self.smtp.messages[0]
+
+	def test_sender_off_in_tests(self):
+		"""
+		Test that apps which don't turn the sender on never start it under pytest,
+		even without TESTING set.
+		"""
+		app = create_app()
+		assert not app.testing
+		app.test_client().get("/")
+		with self.app.app_context():
+			queue_email("nobody@testing.com", "Hello", "<p>Hello</p>")
+			self.clear_outbox()
+		assert email_sender._thread is None
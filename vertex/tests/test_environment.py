@@ -1,6 +1,8 @@
 # vertex/tests/test_environment.py
 
 import os
+import subprocess
+import sys
 
 class TestEnvironment:
 	"""
@@ -12,4 +14,15 @@ class TestEnvironment:
 	
 	def test_email_variables(self):
 		assert len(os.getenv("TOKEN_SALT")) > 5
-		assert len(os.getenv("EMAIL_PASSWORD")) > 5
\ No newline at end of file
+		assert len(os.getenv("EMAIL_PASSWORD")) > 5
+	
+	def test_heavy_libraries_not_imported_at_startup(self):
+		"""
+		Plotting and PDF libraries should only be imported by the routes that use them.
+		"""
+		heavy = ["matplotlib", "numpy", "xhtml2pdf", "reportlab"]
+		result = subprocess.run(
+			[sys.executable, "-c", f"import sys; from app import create_app; create_app(); print([m for m in {heavy!r} if m in sys.modules])"],
+			cwd=os.path.join(os.path.dirname(__file__), ".."), capture_output=True, text=True, check=True,
+		)
+		assert result.stdout.strip() == "[]"
@@ -0,0 +1,102 @@
+# vertex/tests/test_facility_capacity.py
+
+import datetime
+
+from app import create_app, models
+from app.models import db
+from app.booking import DayIndex, booking_engine
+
+class TestFacilityCapacity:
+	"""
+	Class for testing facility capacity checks and the booking index.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+		self.valid_login = {
+			"email": "john@doe.com",
+			"password": "Lemonade!1",
+		}
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def book_squash(self, start, end):
+		"""
+		Book squash court 1 (capacity 4) on a fixed day, following redirects.
+		"""
+		return self.client.post('/facility/3', follow_redirects=True, data = {
+			"activity" : "1 hour sessions",
+			"date_chosen": datetime.date(2023, 11, 1),
+			"start_time" : start,
+			"end_time" : end,
+		})
+
+	def test_day_index(self):
+		"""
+		Test overlap counts and peak occupancy of the interval index.
+		"""
+		index = DayIndex()
+		index.add(1, 480, 540) # 8:00 - 9:00
+		index.add(2, 510, 570) # 8:30 - 9:30
+		index.add(3, 600, 660) # 10:00 - 11:00
+
+		assert index.overlapping(540, 600) == 1 # Only booking 2 is still there at 9:00
+		assert index.overlapping(480, 660) == 3
+		assert index.peak(480, 660) == 2 # Bookings 1 and 3 never meet
+		assert index.peak(570, 600) == 0
+
+		index.add(1, 480, 540) # Adding twice has no effect
+		assert len(index) == 3
+
+		index.remove(2)
+		assert index.overlapping(480, 660) == 2
+		assert index.peak(480, 660) == 1
+
+	def test_overbooking_rejected(self):
+		"""
+		Test that a facility can't be booked past its capacity, and that cancelling frees a place.
+		"""
+		with self.app.app_context():
+			self.client.post("/login", follow_redirects=True, data = self.valid_login)
+
+			for _ in range(4):
+				response = self.book_squash(datetime.time(8), datetime.time(9))
+				assert b"fully booked" not in response.data
+
+			# Fifth person in the same hour is rejected
+			response = self.book_squash(datetime.time(8, 30), datetime.time(9, 30))
+			assert b"Squash court 1 is fully booked at that time" in response.data
+
+			# A later slot is still free
+			response = self.book_squash(datetime.time(9), datetime.time(10))
+			assert b"fully booked" not in response.data
+
+			bookings = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 3, models.FacilityBookings.date == datetime.date(2023, 11, 1)).all()
+			assert len(bookings) == 5
+
+			# Cancelling an 8:00 booking updates the index, so 8:30 has room again
+			self.client.post(f"/facilities/remove/{bookings[0].id}", follow_redirects=True)
+			assert booking_engine.occupancy(3, datetime.date(2023, 11, 1), datetime.time(8), datetime.time(9)) == 3
+
+			response = self.book_squash(datetime.time(8, 30), datetime.time(9, 30))
+			assert b"fully booked" not in response.data
@@ -0,0 +1,127 @@
+# vertex/tests/test_hashing.py
+
+import threading
+
+import pytest
+
+from app import create_app, models
+from app.models import db
+from app.extensions import hashing
+from app.hashing import HashingService, HashingBusyError
+
+class TestHashing:
+	"""
+	Class for testing the password hashing pool.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app({
+			"HASHING_WORKERS": 1,
+			"HASHING_MAX_QUEUE": 0,
+		})
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def occupy(self, service):
+		"""
+		Keep one of service's workers busy until the returned event is set.
+		"""
+		started = threading.Event()
+		release = threading.Event()
+
+		def block():
+			started.set()
+			release.wait(10)
+
+		thread = threading.Thread(target=service._call, args=(block,))
+		thread.start()
+		started.wait(10)
+		return release, thread
+
+	def test_hash_and_verify(self):
+		"""
+		Test hashing and verifying work without init_app.
+		"""
+		service = HashingService(max_workers=2)
+		hashed = service.hash("Lemonade!1")
+		assert service.verify(hashed, "Lemonade!1")
+		assert not service.verify(hashed, "wrong")
+
+		metrics = service.metrics()
+		assert metrics["completed"] == 3
+		assert metrics["rejected"] == 0
+		assert metrics["hash_latency"]["p50"] > 0
+		assert metrics["queue_wait"]["max"] >= 0
+
+	def test_hash_many(self):
+		"""
+		Test hashing several passwords at once gives each its own hash, in order.
+		"""
+		service = HashingService(max_workers=2)
+		hashes = service.hash_many(["Lemonade!1", "Member12345", "Lemonade!1"])
+		assert len(set(hashes)) == 3 # Salted separately
+		assert service.verify(hashes[0], "Lemonade!1")
+		assert service.verify(hashes[1], "Member12345")
+		assert service.verify(hashes[2], "Lemonade!1")
+
+	def test_back_pressure(self):
+		"""
+		Test that a full pool and queue rejects work instead of piling it up.
+		"""
+		service = HashingService(max_workers=1, max_queue=1)
+		release, running = self.occupy(service)
+
+		queued = threading.Thread(target=service.hash, args=("queued",))
+		queued.start()
+		try:
+			with pytest.raises(HashingBusyError):
+				service.hash("rejected")
+			assert service.metrics()["rejected"] == 1
+			assert service.metrics()["in_flight"] == 2
+		finally:
+			release.set()
+			running.join()
+			queued.join()
+
+		assert service.metrics()["in_flight"] == 0
+		service.hash("accepted")
+
+	def test_login_busy_is_503(self):
+		"""
+		Test that a login is turned away with a 503 while the pool is full.
+		"""
+		login = {
+			"email": "john@doe.com",
+			"password": "Lemonade!1",
+		}
+
+		release, running = self.occupy(hashing)
+		try:
+			response = self.client.post("/login", data=login)
+			assert response.status_code == 503
+			assert response.headers["Retry-After"] == "1"
+		finally:
+			release.set()
+			running.join()
+
+		response = self.client.post("/login", data=login, follow_redirects=True)
+		assert b"Logged in successfully!" in response.data
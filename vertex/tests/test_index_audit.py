@@ -0,0 +1,97 @@
+# vertex/tests/test_index_audit.py
+
+import os
+import tempfile
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade, downgrade
+
+from app import create_app, models
+from app.models import db
+from app.index_audit import audit
+
+class TestIndexAudit:
+	"""
+	Class for testing the database indexes, their migrations and the index audit.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		# The audit reads SQLite query plans, whatever database the other tests use
+		self.tmp = tempfile.TemporaryDirectory()
+		self.app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmp.name, "audit.db")})
+		self.db = db
+		self.models = models
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+			self.db.engine.dispose()
+		self.tmp.cleanup()
+
+	def test_no_full_scans(self):
+		"""
+		Test that none of the hot queries scan a whole table.
+		"""
+		with self.app.app_context():
+			flagged = [name for name, plan, full_scan in audit() if full_scan]
+			assert flagged == []
+
+	def test_cli(self):
+		"""
+		Test the flask index-audit command.
+		"""
+		result = self.app.test_cli_runner().invoke(args=["index-audit"])
+		assert result.exit_code == 0
+		assert "No full table scans" in result.output
+
+	def test_migrations_match_models(self):
+		"""
+		Test that upgrading an empty database gives the schema the models declare,
+		and that the index migration flags scans again when downgraded.
+		"""
+		with tempfile.TemporaryDirectory() as tmp:
+			app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "migrated.db")})
+			with app.app_context():
+				upgrade()
+				with db.engine.connect() as connection:
+					# Indexes on expressions, such as lower(email), aren't reflected from
+					# SQLite, so those are checked by name
+					indexes = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+					diffs = compare_metadata(MigrationContext.configure(connection), db.metadata)
+					assert [diff for diff in diffs if not (diff[0] == "add_index" and diff[1].name in indexes)] == []
+
+				downgrade(revision="0001")
+				assert any(full_scan for name, plan, full_scan in audit())
+				db.session.close()
+				db.engine.dispose()
+
+	def test_upgrade_original_schema(self):
+		"""
+		Test that a database with the original schema (stamped 0001) and existing
+		classes upgrades to the current schema.
+		"""
+		with tempfile.TemporaryDirectory() as tmp:
+			app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "original.db")})
+			with app.app_context():
+				upgrade(revision="0001")
+				db.session.execute(db.text("INSERT INTO classes (name, start, duration, date, price) VALUES ('Yoga', '10:00:00.000000', 1, '2100-01-01', 10)"))
+				db.session.commit()
+
+				upgrade()
+				yoga = db.session.execute(db.select(models.Classes)).scalar()
+				assert (yoga.capacity, yoga.booking_version) == (25, 0)
+				db.session.close()
+				db.engine.dispose()
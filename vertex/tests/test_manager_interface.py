@@ -92,6 +92,11 @@ class TestManager:
 		with self.app.app_context():
 			# Login as admin first
 			self.client.post("/admin/login", follow_redirects=True, data = self.admin_login)
+
+			# Memberships go with the user (SQLite checks foreign keys)
+			today = datetime.date.today()
+			self.db.session.add(models.ActiveMemberships(user_id=1, membership_id=1, member_from=today, member_till=today))
+			self.db.session.commit()
 			
 			response = self.client.get("/admin/delete_user/1?confirm=True", follow_redirects=True)
 			assert response.status_code == 200
@@ -99,6 +104,7 @@ class TestManager:
 
 			user = models.Users.query.where(models.Users.id == 1).first()
 			assert not user
+			assert not models.ActiveMemberships.query.where(models.ActiveMemberships.user_id == 1).first()
 	
 	def test_reset_password(self):
 		"""
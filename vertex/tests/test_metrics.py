@@ -0,0 +1,119 @@
+# vertex/tests/test_metrics.py
+
+import re
+import threading
+
+from app import create_app, models
+from app.models import db
+from app.metrics import Metrics
+
+def sample(text, name, labels=""):
+	"""
+	Value of one sample in a Prometheus text exposition, or 0 if it's missing.
+	"""
+	match = re.search("^" + re.escape(name + labels) + r" (\S+)$", text, re.MULTILINE)
+	return float(match[1]) if match else 0
+
+class TestMetrics:
+	"""
+	Class for testing the Prometheus metrics.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		# Scraped from this machine, as by a local Prometheus
+		self.app = create_app({"METRICS_ALLOW_LOCALHOST": True})
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def test_counters_across_threads(self):
+		"""
+		Test that per-thread counters add up, including those of finished threads.
+		"""
+		metrics = Metrics(buckets=(0.1, 1))
+
+		def work():
+			for _ in range(1000):
+				metrics.inc("jobs_total", kind="a")
+				metrics.observe("job_seconds", 0.5)
+
+		threads = [threading.Thread(target=work) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		metrics.inc("jobs_total", kind="b")
+
+		text = metrics.render()
+		assert sample(text, "jobs_total", '{kind="a"}') == 8000
+		assert sample(text, "jobs_total", '{kind="b"}') == 1
+		assert sample(text, "job_seconds_bucket", '{le="0.1"}') == 0
+		assert sample(text, "job_seconds_bucket", '{le="1"}') == 8000
+		assert sample(text, "job_seconds_bucket", '{le="+Inf"}') == 8000
+		assert sample(text, "job_seconds_sum") == 4000
+		assert len(metrics._shards) == 1 # Only this thread's shard is still live
+
+		# Retired totals are kept
+		assert sample(metrics.render(), "jobs_total", '{kind="a"}') == 8000
+
+	def test_access(self):
+		"""
+		Test that only managers and local requests can read the metrics.
+		"""
+		remote = {"REMOTE_ADDR": "203.0.113.5"}
+		self.client.get("/logout")
+		assert self.client.get("/metrics").status_code == 200
+		assert self.client.get("/metrics", environ_base=remote).status_code == 401
+
+		# Local requests need to be let in
+		assert create_app().test_client().get("/metrics").status_code == 401
+
+		self.client.post("/login", follow_redirects=True, data = {"email": "john@doe.com", "password": "Lemonade!1"})
+		assert self.client.get("/metrics", environ_base=remote).status_code == 401
+
+		self.client.get("/logout")
+		self.client.post("/admin/login", follow_redirects=True, data = {"email": "rick@jordan.com", "password": "Lemonade!1"})
+		assert self.client.get("/metrics", environ_base=remote).status_code == 200
+		self.client.get("/logout")
+
+	def test_app_metrics(self):
+		"""
+		Test that requests, bookings and the app's gauges are reported.
+		"""
+		self.client.post("/login", follow_redirects=True, data = {"email": "john@doe.com", "password": "Lemonade!1"})
+		before = self.client.get("/metrics").get_data(as_text=True)
+		self.client.get("/classes/7", follow_redirects=True)
+		self.client.get("/bookings")
+		after = self.client.get("/metrics").get_data(as_text=True)
+		self.client.get("/logout")
+
+		bookings = 'vertex_bookings_created_total', '{kind="class"}'
+		assert sample(after, *bookings) == sample(before, *bookings) + 1
+
+		requests = 'vertex_http_requests_total', '{endpoint="public.bookings",method="GET",status="200"}'
+		assert sample(after, *requests) == sample(before, *requests) + 1
+		assert 'vertex_http_request_duration_seconds_bucket{endpoint="public.bookings",method="GET",le="+Inf"}' in after
+		assert sample(after, "vertex_http_requests_in_flight") == 1 # The scrape itself
+
+		assert "# TYPE vertex_email_outbox gauge" in after
+		assert 'vertex_email_outbox{status="pending"}' in after
+		assert 'vertex_hashing{stat="workers"}' in after
+		assert 'vertex_hashing{quantile="p50",stat="hash_latency"}' in after
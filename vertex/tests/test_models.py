@@ -79,7 +79,7 @@ class TestModels:
 			self.db.session.add(self.invalid_user)
 			with pytest.raises(sqlalchemy_exc.IntegrityError) as ex:
 				self.db.session.commit()
-			assert "UNIQUE constraint failed" in str(ex.value)
+			assert "email" in str(ex.value) # The unique constraint on emails, on any database
 			self.db.session.rollback()
 	
 	def test_class_booking(self):
@@ -102,4 +102,21 @@ class TestModels:
 			self.db.session.commit()
 			booking = models.FacilityBookings.query.where(models.FacilityBookings.facility_id == 1, models.FacilityBookings.user_id == 2).first()
 			user = models.Users.query.where(models.Users.id == 2).first()
-			assert booking in user.facility_bookings
\ No newline at end of file
+			assert booking in user.facility_bookings
+
+	def test_repopulate(self):
+		"""
+		Test that repopulating gives the same fixtures, reusing the password hashes.
+		"""
+		with self.app.app_context():
+			# Only the fixture users, other tests add more
+			before = [(u.email, u.password, u.user_type, u.is_confirmed) for u in models.Users.query.order_by(models.Users.id).limit(8)]
+			self.models.reset_database()
+			self.models.populate_database()
+			after = [(u.email, u.password, u.user_type, u.is_confirmed) for u in models.Users.query.order_by(models.Users.id)]
+			assert before == after
+
+			john, alice = models.Users.query.where(models.Users.id.in_([1, 2])).order_by(models.Users.id)
+			assert john.password == alice.password # Same password, same hash
+			assert alice.verify_password("Lemonade!1")
+			assert models.Facilities.query.where(models.Facilities.name == "Squash court 1").first().activities == {"1 hour sessions": 5}
@@ -1,7 +1,17 @@
 # vertex/tests/test_pdf_receipt.py
 
+import os
+import tempfile
+import time
+from unittest import mock
+
 from app import create_app, models
 from app.models import db
+from app.cache import DiskCache
+from app.extensions import receipt_cache
+from app.pdf import html_to_pdf
+from app.public.views import receipt_key, _template_digests
+from app.reports import report_worker
 
 class TestPDFReceipts:
 	"""
@@ -12,7 +22,10 @@ class TestPDFReceipts:
 		"""
 		Set up the test class. Instantiate app, database...
 		"""
-		self.app = create_app()
+		self.receipts = tempfile.TemporaryDirectory()
+		self.app = create_app({
+			"RECEIPT_DISK_CACHE_DIR": self.receipts.name,
+		})
 		self.db = db
 		self.models = models
 		self.app.config['WTF_CSRF_ENABLED'] = False
@@ -36,6 +49,7 @@ class TestPDFReceipts:
 		with self.app.app_context():
 			self.db.session.rollback()
 			self.db.session.close()
+		self.receipts.cleanup()
 			
 	def test_pdf_receipt(self):
 		"""
@@ -81,10 +95,80 @@ class TestPDFReceipts:
 				self.client.get('/admin/analytics_membership')
 
 				# Simulate manager clicking 'Download PDF Report' button
-				response = self.client.get('/download_memberships')
+				response = self.client.get('/download_memberships', follow_redirects=True)
+				assert response.status_code == 200
+				assert b"Your report is being prepared" in response.data
+
+				# The report is rendered in the background
+				assert report_worker.run_all() == (1, 0)
+				job = models.ReportJobs.query.order_by(models.ReportJobs.id.desc()).first()
+
+				response = self.client.get(f'/admin/reports/{job.id}')
+				assert f'/admin/reports/{job.id}/download'.encode() in response.data
 
+				response = self.client.get(f'/admin/reports/{job.id}/download')
 				assert response.status_code == 200
 				assert response.headers['Content-Type'] == 'application/pdf'
 				assert response.headers['Content-Disposition'] == 'attachment; filename="report_memberships.pdf"'
 				assert len(response.data) > 0
 
+	def test_receipt_cache(self):
+		"""
+		Test that receipts are rendered once, then served from memory or disk.
+		"""
+		self.client.post("/login", follow_redirects=True, data = self.valid_login)
+		with mock.patch("app.pdf.html_to_pdf", wraps=html_to_pdf) as render:
+			first = self.client.get('/download/40/10')
+			assert first.headers['Content-Type'] == 'application/pdf'
+			assert first.data.startswith(b"%PDF")
+			assert self.client.get('/download/40/10').data == first.data
+			assert render.call_count == 1
+
+			# Another worker process only has the copy on disk
+			receipt_cache.clear()
+			assert self.client.get('/download/40/10').data == first.data
+			assert render.call_count == 1
+
+			# Different inputs are a different receipt
+			assert self.client.get('/download/15/0').data != first.data
+			assert render.call_count == 2
+		self.client.get("/logout")
+
+	def test_receipt_template_digest(self):
+		"""
+		Test that the receipt template is hashed again when its file changes,
+		keeping one digest per file.
+		"""
+		with self.app.test_request_context():
+			key = receipt_key(40, 10)
+			filename = self.app.jinja_env.get_template('receipt_template.html').filename
+			stat = os.stat(filename)
+			try:
+				os.utime(filename, (stat.st_atime, stat.st_mtime + 60))
+				assert receipt_key(40, 10) == key # Same contents
+				assert _template_digests[filename][0] == stat.st_mtime + 60
+				assert len(_template_digests) == 1
+			finally:
+				os.utime(filename, (stat.st_atime, stat.st_mtime))
+
+	def test_disk_cache_eviction(self):
+		"""
+		Test that the disk cache deletes the least recently used files when full.
+		"""
+		with tempfile.TemporaryDirectory() as directory:
+			cache = DiskCache(directory, max_bytes=250)
+			cache.set("a", b"a" * 100)
+			cache.set("b", b"b" * 100)
+			# Make "a" the most recently used
+			os.utime(cache._path("b"), (time.time() - 60, time.time() - 60))
+			assert cache.get("a") == b"a" * 100
+			cache.set("c", b"c" * 100)
+			assert cache.get("b") is None
+			assert cache.get("a") == b"a" * 100
+			assert cache.get("c") == b"c" * 100
+			assert len(os.listdir(directory)) == 2
+
+			# Without a directory nothing is cached
+			cache = DiskCache()
+			cache.set("a", b"a")
+			assert cache.get("a") is None
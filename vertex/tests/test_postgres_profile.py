@@ -0,0 +1,56 @@
+# vertex/tests/test_postgres_profile.py
+
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app, models
+from app.models import db
+
+class TestPostgresProfile:
+	"""
+	Class for testing the PostgreSQL settings and types. Only runs when the tests
+	are pointed at PostgreSQL with DATABASE_URL.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+
+		with self.app.app_context():
+			if self.db.engine.dialect.name != "postgresql":
+				pytest.skip("DATABASE_URL isn't a PostgreSQL database")
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def test_settings(self):
+		"""
+		Test that connections get the configured timeouts.
+		"""
+		with self.app.app_context():
+			connection = self.db.session.connection()
+			for name, value in self.app.config["POSTGRES_SETTINGS"].items():
+				# Compared as intervals, as PostgreSQL shows 60s as 1min
+				assert connection.exec_driver_sql(f"SELECT current_setting('{name}')::interval = '{value}'::interval").scalar()
+
+	def test_jsonb(self):
+		"""
+		Test that facility activities are stored as JSONB and read back as dicts.
+		"""
+		with self.app.app_context():
+			columns = {column["name"]: column for column in inspect(self.db.engine).get_columns("facilities")}
+			assert type(columns["activities"]["type"]).__name__ == "JSONB"
+			facility = self.db.session.get(models.Facilities, 1)
+			assert isinstance(facility.activities, dict)
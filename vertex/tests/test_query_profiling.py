@@ -0,0 +1,110 @@
+# vertex/tests/test_query_profiling.py
+
+import logging
+import re
+import time
+
+from flask import g
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import create_app, models
+from app.models import db
+from app.profiling import RequestProfile
+
+class TestQueryProfiling:
+	"""
+	Class for testing the per-request query counts, Server-Timing header and slow request log.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+		self.client.post("/login", follow_redirects=True, data = {
+			"email": "john@doe.com",
+			"password": "Lemonade!1",
+		})
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def server_timing(self, response):
+		match = re.fullmatch(r'db;desc="(\d+) queries";dur=([\d.]+), app;dur=([\d.]+)', response.headers["Server-Timing"])
+		assert match
+		return int(match[1]), float(match[2]), float(match[3])
+
+	def test_server_timing(self):
+		"""
+		Test that responses report their query count and timings.
+		"""
+		queries, db_ms, app_ms = self.server_timing(self.client.get("/bookings"))
+		assert queries > 0
+		assert 0 < db_ms <= app_ms
+
+		# Static files don't touch the database
+		queries, db_ms, app_ms = self.server_timing(self.client.get("/static/css/styles.css"))
+		assert queries == 0
+
+	def test_slow_request_log(self):
+		"""
+		Test that requests over the thresholds are logged with their statements, and others aren't.
+		"""
+		records = []
+		handler = logging.Handler(logging.WARNING)
+		handler.emit = lambda record: records.append(record.getMessage())
+		self.app.logger.addHandler(handler)
+		try:
+			self.client.get("/bookings")
+			assert not any("Slow request" in record for record in records)
+
+			self.app.config["SLOW_REQUEST_QUERIES"] = 0
+			self.client.get("/bookings")
+		finally:
+			self.app.config["SLOW_REQUEST_QUERIES"] = 50
+			self.app.logger.removeHandler(handler)
+
+		assert "Slow request GET /bookings" in records[-1]
+		assert "FROM users" in records[-1]
+
+	def test_failed_statement(self):
+		"""
+		Test that a statement that raises leaves nothing behind to skew the
+		timings of the next ones.
+		"""
+		with self.app.test_request_context():
+			g.query_profile = RequestProfile()
+			with self.db.engine.connect() as connection:
+				with pytest.raises(SQLAlchemyError):
+					connection.exec_driver_sql("SELECT * FROM no_such_table")
+				connection.rollback() # PostgreSQL ignores anything else in a failed transaction
+				time.sleep(0.2)
+				connection.exec_driver_sql("SELECT 1")
+				assert not connection.info.get("query_start")
+
+			assert [statement for statement, duration in g.query_profile.queries] == ["SELECT 1"]
+			assert g.query_profile.db_time < 0.2
+
+	def test_disabled(self):
+		"""
+		Test that profiling can be turned off.
+		"""
+		app = create_app({"QUERY_PROFILING": False})
+		assert "Server-Timing" not in app.test_client().get("/").headers
@@ -0,0 +1,148 @@
+# vertex/tests/test_replica_routing.py
+
+import datetime
+import os
+import tempfile
+
+from app import create_app, models
+from app.models import db
+from app.routing import STICKY_KEY
+
+class TestReplicaRouting:
+	"""
+	Class for testing that read-only views read from the replica, using two SQLite
+	files for the main database and the replica.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.tmp = tempfile.TemporaryDirectory()
+		primary_url = "sqlite:///" + os.path.join(self.tmp.name, "primary.db")
+		replica_url = "sqlite:///" + os.path.join(self.tmp.name, "replica.db")
+		self.db = db
+		self.models = models
+
+		# The replica starts as a copy, with one facility renamed to tell them apart
+		self.replica_app = create_app({"SQLALCHEMY_DATABASE_URI": replica_url})
+		with self.replica_app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+			self.db.session.get(models.Facilities, 1).name = "Replica Studio"
+			self.db.session.commit()
+
+		self.app = create_app({
+			"SQLALCHEMY_DATABASE_URI": primary_url,
+			"SQLALCHEMY_BINDS": {"replica": replica_url},
+			"WTF_CSRF_ENABLED": False,
+			"TESTING": True,
+			# Stickiness is kept in the session, which needs a key to sign it
+			"SECRET_KEY": os.getenv("SECRET_KEY") or "testing",
+		})
+		self.client = self.app.test_client()
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+			self.primary_name = self.db.session.get(models.Facilities, 1).name
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		for app in (self.app, self.replica_app):
+			with app.app_context():
+				self.db.session.rollback()
+				self.db.session.close()
+				for engine in self.db.engines.values():
+					engine.dispose()
+		self.tmp.cleanup()
+
+	def login_manager(self):
+		"""
+		A test client logged in as a manager.
+		"""
+		client = self.app.test_client()
+		client.post("/admin/login", data={"email": "rick@jordan.com", "password": "Lemonade!1"})
+		return client
+
+	def test_listing_reads_replica(self):
+		"""
+		Test that the manager's facility listing is read from the replica.
+		"""
+		response = self.login_manager().get("/admin/facilities")
+		assert response.status_code == 200
+		assert b"Replica Studio" in response.data
+		assert self.primary_name.encode() not in response.data
+
+	def test_cached_listing_reads_primary(self):
+		"""
+		Test that the cached facility listing is loaded from the main database,
+		though the page is read-only, so a lagging replica's listing isn't kept
+		as the current one.
+		"""
+		response = self.client.get("/facilities")
+		assert response.status_code == 200
+		assert self.primary_name.encode() in response.data
+		assert b"Replica Studio" not in response.data
+
+	def test_other_reads_use_primary(self):
+		"""
+		Test that queries outside read-only views use the main database.
+		"""
+		with self.app.app_context():
+			assert self.db.session.get(models.Facilities, 1).name == self.primary_name
+		response = self.client.get("/facility/1")
+		assert self.primary_name.encode() in response.data
+
+	def test_booking_writes_primary(self):
+		"""
+		Test that bookings are written to the main database.
+		"""
+		client = self.app.test_client()
+		client.post("/login", data={"email": "john@doe.com", "password": "Lemonade!1"})
+		response = client.post("/facility/4", data={
+			"activity": "1 hour sessions",
+			"date_chosen": datetime.date.today() + datetime.timedelta(days=3),
+			"start_time": datetime.time(8),
+			"end_time": datetime.time(9),
+		})
+		assert response.status_code == 302
+
+		with self.app.app_context():
+			assert self.db.session.query(models.FacilityBookings).filter_by(facility_id=4).count() == 1
+		with self.replica_app.app_context():
+			assert self.db.session.query(models.FacilityBookings).filter_by(facility_id=4).count() == 0
+
+	def test_read_your_writes(self):
+		"""
+		Test that after a change, the user reads from the main database until the
+		sticky window is over.
+		"""
+		client = self.login_manager()
+		response = client.post("/admin/edit_facility/2", data={"new_name": "Sticky Court"})
+		assert b"Edited facility 2" in response.data
+
+		# Straight after the change, the listing comes from the main database
+		response = client.get("/admin/facilities")
+		assert b"Sticky Court" in response.data
+		assert self.primary_name.encode() in response.data
+
+		# Once the window is over, back to the replica
+		with client.session_transaction() as session:
+			session[STICKY_KEY] = 0
+		response = client.get("/admin/facilities")
+		assert b"Replica Studio" in response.data
+		assert b"Sticky Court" not in response.data
+
+	def test_no_replica(self):
+		"""
+		Test that without a replica, read-only views use the main database.
+		"""
+		with self.app.app_context():
+			assert "replica" in self.db.engines
+		app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmp.name, "primary.db")})
+		with app.app_context():
+			assert "replica" not in self.db.engines
+		response = app.test_client().get("/facilities")
+		assert self.primary_name.encode() in response.data
@@ -0,0 +1,180 @@
+# vertex/tests/test_reports.py
+
+import datetime
+import os
+from unittest import mock
+
+from app import create_app, models
+from app.models import db
+from app.reports import report_worker, render_report
+
+class TestReports:
+	"""
+	Class for testing the background PDF report queue.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+		self.client.post("/admin/login", follow_redirects=True, data = {
+			"email": "rick@jordan.com",
+			"password": "Lemonade!1",
+		})
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		self.client.get("/logout")
+
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def status(self, job_id):
+		"""
+		A report's status, as polled with JSON.
+		"""
+		return self.client.get(f"/admin/reports/{job_id}", headers={"Accept": "application/json"}).get_json()
+
+	def test_dedup(self):
+		"""
+		Test that asking for the same report again reuses the job, until the
+		window has passed.
+		"""
+		with self.app.app_context():
+			first = self.client.get("/download_sales").location
+			assert self.client.get("/download_sales").location == first
+			assert self.client.get("/download_classes").location != first
+
+			job_id = int(first.rsplit("/", 1)[1])
+			assert self.status(job_id)["status"] == "pending"
+			assert self.client.get(f"/admin/reports/{job_id}/download").status_code == 404
+
+			assert report_worker.run_all() == (2, 0)
+			status = self.status(job_id)
+			assert status["status"] == "done"
+			assert status["download"] == f"/admin/reports/{job_id}/download"
+
+			response = self.client.get(status["download"])
+			assert response.headers['Content-Type'] == 'application/pdf'
+			assert response.headers['Content-Disposition'] == 'attachment; filename="report_sales.pdf"'
+			assert response.data.startswith(b"%PDF")
+
+			# Finished reports are reused too, until they are older than the window
+			assert self.client.get("/download_sales").location == first
+			job = self.db.session.get(models.ReportJobs, job_id)
+			job.created_at -= datetime.timedelta(seconds=self.app.config["REPORT_DEDUP_WINDOW"] + 1)
+			self.db.session.commit()
+			assert self.client.get("/download_sales").location != first
+
+	def test_wakes_worker(self):
+		"""
+		Test that every request for a report wakes the worker, including ones
+		reusing a job, so a worker that has died is started again.
+		"""
+		with self.app.app_context():
+			with mock.patch.object(report_worker, "wake") as wake:
+				first = self.client.get("/download_memberships").location
+				assert self.client.get("/download_memberships").location == first
+				assert wake.call_count == 2
+
+	def test_images_found_from_any_directory(self):
+		"""
+		Test that the reports point at the plot images by their path on disk, not
+		relative to the working directory.
+		"""
+		with self.app.app_context():
+			with mock.patch("app.pdf.html_to_pdf", return_value=b"%PDF") as html_to_pdf:
+				with self.app.test_request_context():
+					render_report("memberships")
+			html = html_to_pdf.call_args[0][0]
+			image = os.path.join(self.app.static_folder, "gen", "membership.png")
+			assert f'src="{image}"' in html
+			assert os.path.exists(image)
+
+	def test_failure(self):
+		"""
+		Test that a report that can't be rendered is marked failed, and isn't reused.
+		"""
+		with self.app.app_context():
+			report_worker.run_all()
+			first = self.client.get("/download_facilities").location
+			job_id = int(first.rsplit("/", 1)[1])
+
+			with mock.patch("app.reports.render_report", side_effect=RuntimeError("out of ink")):
+				assert report_worker.run_all() == (0, 1)
+
+			status = self.status(job_id)
+			assert status["status"] == "failed"
+			assert "out of ink" in status["error"]
+			assert b"Try Again" in self.client.get(first).data
+
+			assert self.client.get("/download_facilities").location != first
+
+	def test_claims(self):
+		"""
+		Test that running reports are left to their worker unless it has gone quiet.
+		"""
+		with self.app.app_context():
+			report_worker.run_all()
+			job_id = int(self.client.get("/download_memberships").location.rsplit("/", 1)[1])
+			job = self.db.session.get(models.ReportJobs, job_id)
+			job.status = "running"
+			job.claimed_at = datetime.datetime.now()
+			self.db.session.commit()
+			assert report_worker.run_all() == (0, 0)
+
+			job.claimed_at -= datetime.timedelta(hours=1)
+			self.db.session.commit()
+			assert report_worker.run_all() == (1, 0)
+
+	def test_purge(self):
+		"""
+		Test that old finished reports are deleted.
+		"""
+		with self.app.app_context():
+			job = models.ReportJobs("sales")
+			job.status = "done"
+			job.finished_at = datetime.datetime.now() - datetime.timedelta(seconds=self.app.config["REPORT_RETENTION"] + 1)
+			self.db.session.add(job)
+			self.db.session.commit()
+			job_id = job.id
+
+			report_worker.run_all()
+			assert self.db.session.get(models.ReportJobs, job_id) is None
+
+	def test_access(self):
+		"""
+		Test that only managers can ask for or download reports.
+		"""
+		client = self.app.test_client()
+		assert client.get("/download_sales").status_code == 401
+		assert client.get("/admin/reports/1").status_code == 401
+		assert client.get("/admin/reports/1/download").status_code == 401
+
+	def test_cli(self):
+		"""
+		Test the flask run-reports command.
+		"""
+		with self.app.app_context():
+			# Clear out earlier reports, so this one isn't a duplicate
+			self.db.session.execute(self.db.delete(models.ReportJobs))
+			self.db.session.commit()
+			self.client.get("/download_classes")
+		result = self.app.test_cli_runner().invoke(args=["run-reports"])
+		assert result.exit_code == 0
+		assert "Rendered 1 reports, 0 failed" in result.output
@@ -0,0 +1,135 @@
+# vertex/tests/test_rollups.py
+
+import datetime
+
+from sqlalchemy import select
+
+from app import create_app, models
+from app.models import db
+from app.rollups import rebuild_rollups
+
+class TestRollups:
+	"""
+	Class for testing the daily analytics rollups.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def snapshot(self):
+		"""
+		Every non-empty rollup row.
+		"""
+		rows = set()
+		for model in (models.FacilityDailyTotals, models.ClassDailyTotals, models.MembershipTotals):
+			for row in self.db.session.execute(select(model.__table__)):
+				if any(row[-2:] if model is not models.MembershipTotals else row[-1:]):
+					rows.add((model.__tablename__,) + tuple(row))
+		return rows
+
+	def assert_matches_rebuild(self):
+		"""
+		Check the incrementally maintained rollups equal ones rebuilt from scratch.
+		"""
+		incremental = self.snapshot()
+		rebuild_rollups()
+		assert self.snapshot() == incremental
+		self.db.session.rollback()
+
+	def test_bookings(self):
+		"""
+		Test that making and removing bookings updates the rollups.
+		"""
+		with self.app.app_context():
+			today = datetime.date.today()
+			self.db.session.add_all([
+				models.FacilityBookings(1, 1, "general use", 5, today, datetime.time(8), datetime.time(9)),
+				models.FacilityBookings(2, 1, "general use", 5, today, datetime.time(9), datetime.time(10)),
+				models.FacilityBookings(1, 1, "lessons", 10, today, datetime.time(9), datetime.time(10)),
+				models.ClassBookings(1, 1),
+				models.ClassBookings(2, 1),
+				models.ClassBookings(1, 2),
+			])
+			self.db.session.commit()
+
+			totals = self.db.session.get(models.FacilityDailyTotals, (1, "general use", today))
+			assert (totals.bookings, totals.revenue) == (2, 10)
+			pilates = self.db.session.get(models.Classes, 1)
+			totals = self.db.session.get(models.ClassDailyTotals, (pilates.name, pilates.date))
+			assert (totals.bookings, totals.revenue) == (2, 2 * pilates.price)
+			self.assert_matches_rebuild()
+
+			booking = models.FacilityBookings.query.where(models.FacilityBookings.activity == "lessons").first()
+			self.db.session.delete(booking)
+			self.db.session.delete(models.ClassBookings.query.first())
+			self.db.session.commit()
+			self.assert_matches_rebuild()
+
+	def test_class_changes(self):
+		"""
+		Test that changing a booked class's price or date moves its totals.
+		"""
+		with self.app.app_context():
+			target = self.db.session.get(models.Classes, 2)
+			self.db.session.add(models.ClassBookings(1, 2))
+			self.db.session.commit()
+
+			target.price += 5
+			target.date += datetime.timedelta(days=1)
+			self.db.session.commit()
+			self.assert_matches_rebuild()
+
+	def test_memberships(self):
+		"""
+		Test that active membership counts follow memberships being added and cancelled.
+		"""
+		with self.app.app_context():
+			membership = models.ActiveMemberships(user_id=1, membership_id=2, member_from=datetime.date.today(), member_till=datetime.date.today())
+			self.db.session.add(membership)
+			self.db.session.commit()
+			assert self.db.session.get(models.MembershipTotals, 2).active == 1
+
+			self.db.session.delete(membership)
+			self.db.session.commit()
+			assert self.db.session.get(models.MembershipTotals, 2).active == 0
+			self.assert_matches_rebuild()
+
+	def test_rollback(self):
+		"""
+		Test that rolled back bookings leave the rollups alone.
+		"""
+		with self.app.app_context():
+			before = self.snapshot()
+			self.db.session.add(models.FacilityBookings(1, 2, "general use", 5, datetime.date.today(), datetime.time(8), datetime.time(9)))
+			self.db.session.flush()
+			self.db.session.rollback()
+			assert self.snapshot() == before
+
+	def test_cli(self):
+		"""
+		Test the flask rebuild-rollups command.
+		"""
+		result = self.app.test_cli_runner().invoke(args=["rebuild-rollups"])
+		assert result.exit_code == 0
+		assert "membershiptotals: 1 rows" in result.output # Only membership types with members
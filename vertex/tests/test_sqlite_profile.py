@@ -0,0 +1,105 @@
+# vertex/tests/test_sqlite_profile.py
+
+import datetime
+import os
+import tempfile
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app, models
+from app.models import db
+
+class TestSQLiteProfile:
+	"""
+	Class for testing the pragmas set on SQLite connections.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.tmp = tempfile.TemporaryDirectory()
+		self.app = create_app({
+			"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmp.name, "profile.db"),
+		})
+		self.db = db
+		self.models = models
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+			self.db.engine.dispose()
+		self.tmp.cleanup()
+
+	def pragma(self, name):
+		return self.db.session.connection().exec_driver_sql(f"PRAGMA {name}").scalar()
+
+	def test_pragmas(self):
+		"""
+		Test that connections get the configured pragmas and pool size.
+		"""
+		with self.app.app_context():
+			assert self.pragma("journal_mode") == "wal"
+			assert self.pragma("synchronous") == 1 # NORMAL
+			assert self.pragma("busy_timeout") == 5000
+			assert self.pragma("foreign_keys") == 1
+			assert self.pragma("cache_size") == -16000
+			assert self.db.engine.pool.size() == 10
+
+	def test_foreign_keys(self):
+		"""
+		Test that SQLite refuses bookings of users that don't exist.
+		"""
+		with self.app.app_context():
+			self.db.session.add(models.FacilityBookings(9999, 1, "general use", 5, datetime.date.today(), datetime.time(8), datetime.time(9)))
+			with pytest.raises(IntegrityError):
+				self.db.session.commit()
+			self.db.session.rollback()
+
+	def test_readers_not_blocked(self):
+		"""
+		Test that the database can be read while a write is in progress.
+		"""
+		with self.app.app_context():
+			with self.db.engine.connect() as writer, self.db.engine.connect() as reader:
+				writer.exec_driver_sql("BEGIN IMMEDIATE")
+				writer.exec_driver_sql("UPDATE users SET firstname = 'Writer' WHERE id = 1")
+				# Readers see the last committed data, without waiting for the writer
+				assert reader.exec_driver_sql("SELECT firstname FROM users WHERE id = 1").scalar() != "Writer"
+				writer.rollback()
+
+	def test_default_profile(self):
+		"""
+		Test that SQLite's defaults are kept when no pragmas are configured.
+		"""
+		with tempfile.TemporaryDirectory() as tmp:
+			app = create_app({
+				"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "default.db"),
+				"SQLITE_PRAGMAS": {},
+			})
+			with app.app_context():
+				assert self.pragma("journal_mode") == "delete"
+				assert self.pragma("foreign_keys") == 0
+				self.db.session.close()
+				self.db.engine.dispose()
+
+	def test_in_memory_database(self):
+		"""
+		Test that an in-memory database, which has no pool to size, still works.
+		"""
+		app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+		with app.app_context():
+			assert "pool_size" not in app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+			self.models.reset_database()
+			self.models.populate_database()
+			assert self.db.session.execute(self.db.select(models.Users).where(models.Users.email == "john@doe.com")).scalar()
+			self.db.session.close()
@@ -0,0 +1,73 @@
+# vertex/tests/test_synthetic.py
+
+from sqlalchemy import select, func
+
+from app import create_app, models
+from app.models import db
+from app.synthetic import generate
+
+class TestSynthetic:
+	"""
+	Class for testing the synthetic data generator.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def count(self, model):
+		return self.db.session.execute(select(func.count(model.id))).scalar()
+
+	def test_generate(self):
+		"""
+		Test that the requested rows are added, within capacity, and synthetic users can log in.
+		"""
+		with self.app.app_context():
+			users, classes = self.count(models.Users), self.count(models.Classes)
+			counts = generate(users=200, years=1, class_bookings=3000, facility_bookings=5000, seed=1)
+			assert counts == {"users": 200, "classes": 365 * 8, "class bookings": 3000, "facility bookings": 5000}
+			assert self.count(models.Users) == users + 200
+			assert self.count(models.Classes) == classes + 365 * 8
+
+			# No class or facility hour is over capacity
+			over = select(models.ClassBookings.class_id).join(models.Classes) \
+				.group_by(models.ClassBookings.class_id).having(func.count(models.ClassBookings.id) > func.max(models.Classes.capacity))
+			assert self.db.session.execute(over).first() is None
+			over = select(models.FacilityBookings.facility_id).join(models.Facilities) \
+				.group_by(models.FacilityBookings.facility_id, models.FacilityBookings.date, models.FacilityBookings.start) \
+				.having(func.count(models.FacilityBookings.id) > func.max(models.Facilities.capacity))
+			assert self.db.session.execute(over).first() is None
+
+			email = self.db.session.execute(select(models.Users.email).where(models.Users.email.like("synthetic.%"))).scalars().first()
+
+		response = self.client.post("/login", follow_redirects=True, data = {"email": email, "password": "Lemonade!1"})
+		assert b"Logged in successfully!" in response.data
+		self.client.get("/logout")
+
+	def test_cli(self):
+		"""
+		Test the flask generate-data command.
+		"""
+		result = self.app.test_cli_runner().invoke(args=["generate-data", "--users", "10", "--years", "1", "--class-bookings", "50", "--facility-bookings", "50"])
+		assert result.exit_code == 0
+		assert "Added 50 facility bookings" in result.output
@@ -0,0 +1,130 @@
+# vertex/tests/test_user_search.py
+
+import datetime
+
+from sqlalchemy import event
+
+from app import create_app, models
+from app.models import db
+from app.user_search import query_users, user_index
+
+class TestUserSearch:
+	"""
+	Class for testing the customer search used by employees booking on a customer's behalf.
+	"""
+
+	def setup_class(self):
+		"""
+		Set up the test class. Instantiate app, database...
+		"""
+		self.app = create_app()
+		self.db = db
+		self.models = models
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		self.app.config['TESTING'] = True
+		self.client = self.app.test_client()
+
+		with self.app.app_context():
+			self.models.reset_database()
+			self.models.populate_database()
+
+	def teardown_class(self):
+		"""
+		Deconstruct the test class.
+		"""
+		# Roll back any un-committed changes to the database and close it
+		with self.app.app_context():
+			self.db.session.rollback()
+			self.db.session.close()
+
+	def login(self, email):
+		self.client.get("/logout")
+		login_page = "/employee-login" if email == "lily@poole.com" else "/login"
+		self.client.post(login_page, follow_redirects=True, data = {
+			"email": email,
+			"password": "Lemonade!1",
+		})
+
+	def emails(self, prefix):
+		response = self.client.get(f"/users/search?q={prefix}")
+		assert response.status_code == 200
+		return [user["email"] for user in response.json]
+
+	def test_employees_only(self):
+		"""
+		Test that only employees and managers can search customers.
+		"""
+		self.client.get("/logout")
+		assert self.client.get("/users/search?q=jo").status_code == 401
+
+		self.login("john@doe.com")
+		assert self.client.get("/users/search?q=jo").status_code == 401
+
+	def test_search(self):
+		"""
+		Test searching by the start of an email or name.
+		"""
+		self.login("lily@poole.com")
+		assert self.emails("jo") == ["john@doe.com"]
+		assert self.emails("JOHN") == ["john@doe.com"]
+		assert self.emails("doe") == ["alice@doe.com", "john@doe.com"] # By last name
+		assert self.emails("lily") == [] # Employees aren't customers
+		assert self.emails("j") == [] # Too short to search
+
+	def test_cache_matches_database(self):
+		"""
+		Test that the in-process index gives the same answers as the database, and
+		picks up new customers.
+		"""
+		with self.app.app_context():
+			for prefix in ["jo", "doe", "al", "member", "zz"]:
+				assert user_index.search(prefix) == query_users(prefix)
+
+			self.db.session.add(models.Users("joanna@testing.com", "Lemonade!1", "Joanna", "Smith", datetime.date(1990, 1, 1)))
+			self.db.session.commit()
+			assert [user["email"] for user in user_index.search("jo")] == ["joanna@testing.com", "john@doe.com"]
+			assert user_index.search("jo") == query_users("jo")
+
+			# Names stored in any case are found by prefixes in any case
+			self.db.session.add(models.Users("mcd@testing.com", "Lemonade!1", "ANNE", "McDonald", datetime.date(1990, 1, 1)))
+			self.db.session.commit()
+			for prefix in ["anne", "Anne", "mcd", "MCDON", "mcdonald"]:
+				assert [user["email"] for user in query_users(prefix)] == ["mcd@testing.com"]
+				assert user_index.search(prefix) == query_users(prefix)
+
+	def test_first_matches_by_email(self):
+		"""
+		Test that with more matches than the limit, the first ones by email are
+		returned, whatever order the matching rows are stored in.
+		"""
+		with self.app.app_context():
+			emails = [f"zedd{i:02}@testing.com" for i in range(15)]
+			models.bulk_insert(models.Users, [
+				dict(email=email, password="x", firstname="Zed", lastname="Zedson", date_of_birth=datetime.date(1990, 1, 1), user_type="user", is_member=False)
+				for email in reversed(emails)
+			])
+			self.db.session.commit()
+			user_index.invalidate()
+
+			for prefix in ["zed", "zedson"]:
+				assert [user["email"] for user in query_users(prefix)] == emails[:10]
+				assert user_index.search(prefix) == query_users(prefix)
+
+	def test_facility_page_skips_users_table(self):
+		"""
+		Test that the facility booking page doesn't load the users table.
+		"""
+		self.login("john@doe.com")
+		with self.app.app_context():
+			statements = []
+			def record(conn, cursor, statement, parameters, context, executemany):
+				statements.append(statement)
+
+			event.listen(self.db.engine, "before_cursor_execute", record)
+			try:
+				assert self.client.get("/facility/3").status_code == 200
+			finally:
+				event.remove(self.db.engine, "before_cursor_execute", record)
+
+			# Only the logged in user is loaded
+			assert len([s for s in statements if "FROM users" in s]) == 1